@@ -0,0 +1,313 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+from ripencc_agent import db, rankings, timeseries
+from ripencc_agent.cache import tool_cache
+from ripencc_agent.sub_agents.ipv6.tools import (
+    get_country_ipv6_adoption_rate, get_ipv6_adoption_ranking, get_ipv6_adoption_rate_batch, get_ipv6_adoption_trend,
+)
+from ripencc_agent.sub_agents.market.tools import get_asn_concentration_series, get_asn_hhi_ranking, get_country_asn_hhi, get_top_four_asns
+from ripencc_agent.sub_agents.rpki.tools import (
+    get_monthly_roa_coverage, get_monthly_roa_coverage_batch, get_roa_coverage_ranking, get_roa_coverage_trend,
+)
+
+# Benchmark harness for the data tools.
+#
+#   python -m benchmarks.synthetic /tmp/bench.db --countries 100 --years 10
+#   python -m benchmarks.harness run --db /tmp/bench.db --concurrency 1 8 --out report.json
+#   python -m benchmarks.harness compare before.json after.json
+#
+# Every workload (a tool plus a way of sampling its arguments) is measured in
+# these phases:
+#   cold          result cache, pooled connections and the time-series engine
+#                 are reset before every call (the OS page cache stays warm)
+#   warm          the tool body without the result cache, connections and engine loaded
+#   cached        the same few argument sets over and over, served by the result cache
+#   concurrent_N  the warm path from N threads at once
+# The report holds p50/p95/p99 latency, throughput and peak RSS per phase.
+
+BATCH_COUNTRIES = 5
+
+
+class Dataset:
+    '''
+    What the benchmark DB holds, so arguments can be sampled from real keys.
+    '''
+
+    def __init__(self, db_path: str):
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            self.countries = [row[0] for row in conn.execute("SELECT DISTINCT country_code FROM ROA_MONTHLY ORDER BY 1")]
+            self.sources = [row[0] for row in conn.execute("SELECT DISTINCT source FROM Country_IPv6_Adoption ORDER BY 1")]
+            first, last = conn.execute("SELECT MIN(date), MAX(date) FROM ROA_MONTHLY").fetchone()
+            self.rows = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("ROA_MONTHLY", "Country_IPv6_Adoption", "Top_4_ASNs", "Herfindahl_Hirschman_Index")
+            }
+        finally:
+            conn.close()
+        if not self.countries or not self.sources:
+            raise ValueError(f"{db_path} holds no ROA or IPv6 adoption data")
+        self.first_year = int(first[:4])
+        self.last_year = int(last[:4])
+
+    def country(self, rng: random.Random) -> str:
+        return rng.choice(self.countries)
+
+    def window(self, rng: random.Random, years: int) -> tuple:
+        start = rng.randint(self.first_year, max(self.first_year, self.last_year - years + 1))
+        return f"{start}-01-01", f"{start + years - 1}-12-31"
+
+
+def workloads(data: Dataset) -> dict:
+    '''
+    name -> (tool, argument sampler). Samplers take a `random.Random` and return keyword arguments.
+    '''
+    def roa_range(rng):
+        start, end = data.window(rng, 2)
+        return {"country_code": data.country(rng), "ip_family": rng.choice("46"), "start_date": start, "end_date": end}
+
+    def roa_batch(rng):
+        start, end = data.window(rng, 2)
+        return {
+            "country_codes": rng.sample(data.countries, min(BATCH_COUNTRIES, len(data.countries))),
+            "ip_families": ["4", "6"],
+            "start_date": start,
+            "end_date": end,
+        }
+
+    def ipv6_range(rng):
+        start, end = data.window(rng, 1)
+        return {"country_code": data.country(rng), "start_date": start, "end_date": end}
+
+    def concentration_range(rng):
+        start, end = data.window(rng, 2)
+        return {"country_code": data.country(rng), "start_date": start, "end_date": end}
+
+    def ipv6_batch(rng):
+        return {"country_codes": rng.sample(data.countries, min(BATCH_COUNTRIES, len(data.countries)))}
+
+    return {
+        "get_monthly_roa_coverage": (get_monthly_roa_coverage, roa_range),
+        "get_monthly_roa_coverage_batch": (get_monthly_roa_coverage_batch, roa_batch),
+        "get_roa_coverage_trend": (get_roa_coverage_trend, lambda rng: {"country_code": data.country(rng), "ip_family": rng.choice("46")}),
+        "get_country_ipv6_adoption_rate (latest)": (get_country_ipv6_adoption_rate, lambda rng: {"country_code": data.country(rng)}),
+        "get_country_ipv6_adoption_rate (range)": (get_country_ipv6_adoption_rate, ipv6_range),
+        "get_ipv6_adoption_rate_batch": (get_ipv6_adoption_rate_batch, ipv6_batch),
+        "get_ipv6_adoption_trend": (get_ipv6_adoption_trend, lambda rng: {"country_code": data.country(rng)}),
+        "get_top_four_asns": (get_top_four_asns, lambda rng: {"country_code": data.country(rng)}),
+        "get_country_asn_hhi": (get_country_asn_hhi, lambda rng: {"country_code": data.country(rng)}),
+        "get_roa_coverage_ranking": (get_roa_coverage_ranking, lambda rng: {"ip_family": rng.choice("46"), "date": data.window(rng, 1)[1]}),
+        "get_ipv6_adoption_ranking": (get_ipv6_adoption_ranking, lambda rng: {"source": rng.choice(data.sources), "country_code": data.country(rng)}),
+        "get_asn_hhi_ranking": (get_asn_hhi_ranking, lambda rng: {"order": rng.choice(["top", "bottom"])}),
+        "get_asn_concentration_series": (get_asn_concentration_series, concentration_range),
+    }
+
+
+def reset_state():
+    tool_cache.clear()
+    db.close_all()
+    timeseries._engine = None
+    rankings.ranking_index = rankings.RankingIndex()
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize_latencies(latencies: list, errors: int, seconds: float) -> dict:
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_per_sec": round(len(latencies) / seconds, 1) if seconds else None,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def _timed_calls(tool: Callable, arguments: list, before_each: Callable = None) -> tuple:
+    latencies, errors = [], 0
+    for kwargs in arguments:
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        result = tool(**kwargs)
+        latencies.append(time.perf_counter() - started)
+        errors += result.get("status") != "success"
+    return latencies, errors
+
+
+def run_phase(phase: str, tool: Callable, sampler: Callable, rng: random.Random, iterations: int, concurrency: int = 1) -> dict:
+    uncached = getattr(tool, "__wrapped__", tool)
+
+    if phase == "cold":
+        arguments = [sampler(rng) for _ in range(iterations)]
+        started = time.perf_counter()
+        latencies, errors = _timed_calls(tool, arguments, reset_state)
+        return summarize_latencies(latencies, errors, time.perf_counter() - started)
+
+    if phase == "cached":
+        arguments = [sampler(rng) for _ in range(min(8, iterations))]
+        _timed_calls(tool, arguments)  # fill the cache
+        arguments = [arguments[i % len(arguments)] for i in range(iterations)]
+        started = time.perf_counter()
+        latencies, errors = _timed_calls(tool, arguments)
+        return summarize_latencies(latencies, errors, time.perf_counter() - started)
+
+    # warm / concurrent_N: the tool body with connections and engine already loaded.
+    uncached(**sampler(rng))
+    arguments = [sampler(rng) for _ in range(iterations)]
+    if concurrency == 1:
+        started = time.perf_counter()
+        latencies, errors = _timed_calls(uncached, arguments)
+        return summarize_latencies(latencies, errors, time.perf_counter() - started)
+
+    chunks = [arguments[i::concurrency] for i in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(chunk):
+        uncached(**chunk[0])  # open this thread's pooled connection
+        barrier.wait()
+        return _timed_calls(uncached, chunk)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, chunk) for chunk in chunks if chunk]
+        barrier.wait()
+        started = time.perf_counter()
+        results = [future.result() for future in futures]
+        seconds = time.perf_counter() - started
+    latencies = [latency for chunk_latencies, _ in results for latency in chunk_latencies]
+    return summarize_latencies(latencies, sum(errors for _, errors in results), seconds)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(db_path: str, iterations: int = 200, cold_iterations: int = 5, concurrency: list = (1, 8),
+        only: list = None, seed: int = 1) -> dict:
+    '''
+    Benchmarks every workload (or those named in `only`) against `db_path` and returns the report.
+    '''
+    db.DB_PATH = db_path
+    reset_state()
+    data = Dataset(db_path)
+    rng = random.Random(seed)
+
+    phases = ["cold", "warm", "cached"] + [f"concurrent_{n}" for n in concurrency if n > 1]
+    results = {}
+    for name, (tool, sampler) in workloads(data).items():
+        if only and name not in only:
+            continue
+        results[name] = {}
+        for phase in phases:
+            if phase == "cold":
+                results[name][phase] = run_phase(phase, tool, sampler, rng, cold_iterations)
+            elif phase.startswith("concurrent_"):
+                results[name][phase] = run_phase(phase, tool, sampler, rng, iterations, int(phase.split("_")[1]))
+            else:
+                results[name][phase] = run_phase(phase, tool, sampler, rng, iterations)
+            print(f"{name:45} {phase:14} p50 {results[name][phase]['p50_ms']:9.3f} ms  "
+                  f"p99 {results[name][phase]['p99_ms']:9.3f} ms  {results[name][phase]['throughput_per_sec']:>9} /s",
+                  file=sys.stderr)
+    reset_state()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db": {"path": db_path, "bytes": os.path.getsize(db_path), "countries": len(data.countries), "rows": data.rows},
+            "iterations": iterations,
+            "cold_iterations": cold_iterations,
+            "seed": seed,
+        },
+        "results": results,
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def compare(before: dict, after: dict) -> list:
+    '''
+    Lines comparing the p50 and p99 latency of every workload and phase present in both reports.
+    '''
+    lines = [f"{before['meta']['commit']} -> {after['meta']['commit']}"]
+    for name, phases in after["results"].items():
+        for phase, stats in phases.items():
+            old = before["results"].get(name, {}).get(phase)
+            if old is None:
+                continue
+            ratios = [
+                f"{key[:3]} {old[key]:9.3f} -> {stats[key]:9.3f} ms ({stats[key] / old[key] if old[key] else float('nan'):5.2f}x)"
+                for key in ("p50_ms", "p99_ms")
+            ]
+            lines.append(f"{name:45} {phase:14} " + "  ".join(ratios))
+    lines.append(f"peak RSS {before['peak_rss_mib']} -> {after['peak_rss_mib']} MiB")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data tools against an insights.db.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark and write a JSON report")
+    run_parser.add_argument("--db", default=db.DB_PATH, help="Database to benchmark (see benchmarks.synthetic)")
+    run_parser.add_argument("--iterations", type=int, default=200, help="Calls per warm, cached and concurrent phase")
+    run_parser.add_argument("--cold-iterations", type=int, default=5, help="Calls in the cold phase")
+    run_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="Thread counts for the concurrent phases")
+    run_parser.add_argument("--only", nargs="+", help="Workload names to run (default: all)")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--out", help="Report path (default: stdout)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before) as f_before, open(args.after) as f_after:
+            print(*compare(json.load(f_before), json.load(f_after)), sep="\n")
+        return
+
+    report = run(args.db, args.iterations, args.cold_iterations, args.concurrency, args.only, args.seed)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
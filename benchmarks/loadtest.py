@@ -0,0 +1,617 @@
+import argparse
+import asyncio
+import contextvars
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from typing import AsyncGenerator, Optional
+
+import httpx
+import numpy as np
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.plugins import BasePlugin
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, InMemorySessionService
+from google.genai import types
+from pydantic import Field
+
+from benchmarks.harness import Dataset, _git_commit, peak_rss_mib, reset_state, summarize_latencies
+from ripencc_agent import answer_cache, db
+from ripencc_agent.agent import root_agent
+from ripencc_agent.countries import country_name
+from ripencc_agent.router import routing_stats
+
+# Load test for the whole agent pipeline, without Gemini.
+#
+#   python -m benchmarks.synthetic /tmp/bench.db --countries 100 --years 10
+#   python -m benchmarks.loadtest run --db /tmp/bench.db --sessions 200 --turns 2 --out load.json
+#
+# `root_agent`'s model (and so every sub-agent's) is replaced by
+# `ScriptedModel`, a local BaseLlm that plays a script: for every scripted
+# question it knows which sub-agent to transfer to, which tool to call with
+# which arguments, and answers with a short text once the tool result is in.
+# Everything else is the real pipeline: the Runner, the pre-router, callbacks,
+# the answer and result caches, the tools, the DB and the session service.
+#
+# N sessions run concurrently on one event loop, each a first question plus
+# follow-ups, once per session service (caches start empty for each). The
+# report holds turns/sec, turn latency, a per-stage breakdown and RSS growth.
+# Stages:
+#   routing      turn start until a sub-agent is transferred to (pre-router or root model call)
+#   model        time inside the model (`--model-latency-ms` simulates Gemini)
+#   tool         data tool calls (the profile agent's fetchers call tools directly and count as framework)
+#   persistence  session service calls (get_session, append_event)
+#   framework    the rest of the turn: ADK, callbacks, caches
+# Routing overlaps the model and persistence time spent before the transfer;
+# the other four add up to the turn. Under load every stage also includes the
+# time its coroutine waits for the event loop, as it would in production.
+#
+#   python -m benchmarks.loadtest serve --db /tmp/bench.db --workers 1 2 4 --out serve.json
+#
+# `serve` load-tests the multi-process server (`ripencc_agent.serve`) instead:
+# per worker count it starts the server with the script installed through
+# `serve_scripted`, times startup until the server answers, and drives the
+# same sessions over HTTP. It reports turns/sec, turns/sec per core in use
+# and the server's own startup breakdown. The client shares the machine.
+
+APP_NAME = "ripencc_loadtest"
+BACKENDS = ("memory", "database")
+STAGES = ("routing", "model", "tool", "persistence", "framework")
+SCRIPT_ENV = "RIPENCC_LOADTEST_SCRIPT"  # script file handed to `serve_scripted` in the server
+SERVER_START_TIMEOUT_SECONDS = 120
+
+# The stage times of the turn being run; each turn runs in its own task.
+_stages = contextvars.ContextVar("loadtest_stages", default=None)
+
+# One scripted turn: the question, the sub-agent it belongs to, and the tool
+# call the model makes there (`tool` is None for the profile agent).
+ScriptedTurn = namedtuple("ScriptedTurn", "question agent tool arguments")
+
+
+def _add_stage(stage: str, seconds: float):
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def question_types(data: Dataset, rng: random.Random) -> list:
+    '''
+    Functions that make a `ScriptedTurn` of one question type for a country code.
+
+    The last type has no routing keywords, so the pre-router leaves it to the root model.
+    '''
+    def roa_range(cc):
+        start, end = data.window(rng, 2)
+        family = rng.choice("46")
+        return ScriptedTurn(
+            f"What is the ROA coverage of {country_name(cc)} for IPv{family} between {start} and {end}?",
+            "rpki_agent", "get_monthly_roa_coverage",
+            {"country_code": cc, "ip_family": family, "start_date": start, "end_date": end},
+        )
+
+    return [
+        roa_range,
+        lambda cc: ScriptedTurn(f"What is the latest IPv6 adoption in {country_name(cc)}?",
+                                "ipv6_agent", "get_country_ipv6_adoption_rate", {"country_code": cc}),
+        lambda cc: ScriptedTurn(f"Who are the top 4 ISPs in {country_name(cc)}?",
+                                "market_agent", "get_top_four_asns", {"country_code": cc}),
+        lambda cc: ScriptedTurn(f"How competitive is the ISP market in {country_name(cc)}?",
+                                "market_agent", "get_country_asn_hhi", {"country_code": cc}),
+        lambda cc: ScriptedTurn(f"Give me an overview of the internet in {country_name(cc)}",
+                                "profile_agent", None, {"country_code": cc}),
+        lambda cc: ScriptedTurn(f"How is {country_name(cc)} doing?",
+                                "rpki_agent", "get_latest_roa_coverage", {"country_code": cc}),
+    ]
+
+
+def session_plans(data: Dataset, rng: random.Random, sessions: int, turns: int) -> list:
+    '''
+    The turns of every session: question types in rotation, each session asking its type about `turns` countries.
+    '''
+    types_ = question_types(data, rng)
+    return [[types_[i % len(types_)](data.country(rng)) for _ in range(turns)] for i in range(sessions)]
+
+
+class ScriptedModel(BaseLlm):
+    '''
+    A deterministic stand-in for Gemini that plays `script` (question -> `ScriptedTurn`).
+
+    Per agent (ADK labels every request with the agent's name) it answers:
+    the root agent and agents that do not own the question with a transfer,
+    the profile country extractor with the country code, a data agent with
+    the scripted tool call and, once the tool result is in, with a final text.
+    '''
+
+    model: str = "scripted"
+    script: dict = Field(default_factory=dict)
+    latency_seconds: float = 0.0
+    calls: dict = Field(default_factory=dict)  # agent name -> model calls
+
+    def _turn(self, llm_request: LlmRequest) -> Optional[ScriptedTurn]:
+        for content in reversed(llm_request.contents):
+            for part in content.parts or []:
+                if content.role == "user" and part.text in self.script:
+                    return self.script[part.text]
+        return None
+
+    def _respond(self, llm_request: LlmRequest) -> types.Content:
+        agent_name = (llm_request.config.labels or {}).get("adk_agent_name")
+        self.calls[agent_name] = self.calls.get(agent_name, 0) + 1
+        turn = self._turn(llm_request)
+        last = llm_request.contents[-1] if llm_request.contents else None
+
+        if turn is None:
+            parts = [types.Part(text="I can only help with RPKI, IPv6 and ISP market data.")]
+        elif last is not None and any(part.function_response for part in last.parts or []):
+            response = next(part.function_response for part in last.parts if part.function_response)
+            parts = [types.Part(text=f"{response.name} returned {(response.response or {}).get('status')}.")]
+        elif agent_name == "profile_country_extractor":
+            parts = [types.Part(text=turn.arguments["country_code"])]
+        elif agent_name == "profile_summarizer":
+            parts = [types.Part(text=f"Profile of {turn.arguments['country_code']}.")]
+        elif agent_name != turn.agent and "transfer_to_agent" in llm_request.tools_dict:
+            parts = [types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": turn.agent}))]
+        elif turn.tool in llm_request.tools_dict:
+            parts = [types.Part(function_call=types.FunctionCall(name=turn.tool, args=dict(turn.arguments)))]
+        else:
+            parts = [types.Part(text=f"{agent_name} cannot call {turn.tool}.")]
+        return types.Content(role="model", parts=parts)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        started = time.perf_counter()
+        content = self._respond(llm_request)
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        _add_stage("model", time.perf_counter() - started)
+        yield LlmResponse(content=content)
+
+
+class StagePlugin(BasePlugin):
+    '''
+    Times routing and tool calls of the current turn.
+    '''
+
+    def __init__(self):
+        super().__init__(name="loadtest_stages")
+        self._tool_started = {}  # function call id -> perf_counter
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        stages = _stages.get()
+        if tool.name == "transfer_to_agent":
+            if stages is not None and "routing" not in stages:
+                stages["routing"] = time.perf_counter() - stages["started"]
+        else:
+            self._tool_started[tool_context.function_call_id] = time.perf_counter()
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        started = self._tool_started.pop(tool_context.function_call_id, None)
+        if started is not None:
+            _add_stage("tool", time.perf_counter() - started)
+            if isinstance(result, dict) and result.get("status") != "success":
+                _add_stage("tool_errors", 1)
+        return None
+
+
+class TimedSessionService(BaseSessionService):
+    '''
+    Delegates to a session service and adds the time of every call to the turn's persistence stage.
+    '''
+
+    def __init__(self, service: BaseSessionService):
+        self.service = service
+
+    async def _timed(self, call):
+        started = time.perf_counter()
+        try:
+            return await call
+        finally:
+            _add_stage("persistence", time.perf_counter() - started)
+
+    async def create_session(self, **kwargs):
+        return await self._timed(self.service.create_session(**kwargs))
+
+    async def get_session(self, **kwargs):
+        return await self._timed(self.service.get_session(**kwargs))
+
+    async def list_sessions(self, **kwargs):
+        return await self._timed(self.service.list_sessions(**kwargs))
+
+    async def delete_session(self, **kwargs):
+        return await self._timed(self.service.delete_session(**kwargs))
+
+    async def append_event(self, session, event):
+        return await self._timed(self.service.append_event(session, event))
+
+
+def rss_mib() -> float:
+    '''
+    Current resident set size (the peak where /proc is not available).
+    '''
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        return peak_rss_mib()
+
+
+def session_service(backend: str, directory: str):
+    if backend == "memory":
+        return InMemorySessionService()
+    return DatabaseSessionService(db_url=f"sqlite:///{os.path.join(directory, 'sessions.db')}")
+
+
+async def run_turn(runner: Runner, user_id: str, session_id: str, question: str) -> dict:
+    stages = {"started": time.perf_counter()}
+    _stages.set(stages)
+    final, error = None, None
+    try:
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session_id,
+            new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                final = event.content.parts[0].text
+    except Exception as e:  # a load test reports failures instead of stopping
+        error = repr(e)
+    stages["seconds"] = time.perf_counter() - stages.pop("started")
+    stages["error"] = error or (None if final else "no final response")
+    return stages
+
+
+async def run_session(runner: Runner, service, user_id: str, turns: list, semaphore: asyncio.Semaphore) -> list:
+    async with semaphore:
+        session = await service.create_session(app_name=APP_NAME, user_id=user_id)
+        return [await run_turn(runner, user_id, session.id, turn.question) for turn in turns]
+
+
+def _stage_summary(values: list) -> Optional[dict]:
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "turns": len(values),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+async def run_backend(backend: str, model: ScriptedModel, data: Dataset, sessions: int, turns: int,
+                      concurrency: int, rng: random.Random, directory: str) -> dict:
+    reset_state()
+    answer_cache.answer_cache.clear()
+    service = session_service(backend, directory)
+    runner = Runner(app_name=APP_NAME, agent=root_agent, session_service=TimedSessionService(service), plugins=[StagePlugin()])
+    plans = session_plans(data, rng, sessions, turns)
+    model.script.update((turn.question, turn) for plan in plans for turn in plan)
+
+    # Warm up imports, pooled connections and the time-series engine outside the measurement.
+    warmup = await run_session(runner, service, "warmup", plans[0], asyncio.Semaphore(1))
+    if warmup[0]["error"]:
+        raise RuntimeError(f"Warm-up turn failed: {warmup[0]['error']}")
+    gc.collect()
+    rss_before = rss_mib()
+    model_calls_before = sum(model.calls.values())
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_session(runner, service, f"user{i}", plan, semaphore) for i, plan in enumerate(plans)
+    ))
+    seconds = time.perf_counter() - started
+    gc.collect()
+    rss_after = rss_mib()
+
+    turn_stats = [stats for session_stats in results for stats in session_stats]
+    for stats in turn_stats:
+        stats["framework"] = max(0.0, stats["seconds"] - sum(stats.get(stage, 0.0) for stage in ("model", "tool", "persistence")))
+    errors = [stats["error"] for stats in turn_stats if stats["error"]]
+    return {
+        "sessions": sessions,
+        "turns": len(turn_stats),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "turns_per_sec": round(len(turn_stats) / seconds, 1),
+        "errors": len(errors),
+        "error_examples": sorted(set(errors))[:5],
+        "tool_errors": int(sum(stats.get("tool_errors", 0) for stats in turn_stats)),
+        "model_calls_per_turn": round((sum(model.calls.values()) - model_calls_before) / len(turn_stats), 2),
+        "turn": summarize_latencies([stats["seconds"] for stats in turn_stats], len(errors), seconds),
+        "stages": {
+            stage: _stage_summary([stats[stage] for stats in turn_stats if stage in stats])
+            for stage in STAGES
+        },
+        "memory": {
+            "rss_before_mib": rss_before,
+            "rss_after_mib": rss_after,
+            "growth_mib": round(rss_after - rss_before, 1),
+            "growth_kib_per_turn": round((rss_after - rss_before) * 1024 / len(turn_stats), 2),
+        },
+    }
+
+
+def run(db_path: str, sessions: int = 200, turns: int = 2, concurrency: Optional[int] = None,
+        backends: list = BACKENDS, model_latency_ms: float = 0.0, answer_cache_enabled: bool = True, seed: int = 1) -> dict:
+    '''
+    Load-tests the agent pipeline against `db_path` once per session service backend and returns the report.
+    '''
+    db.DB_PATH = db_path
+    answer_cache.ANSWER_CACHE_ENABLED = answer_cache_enabled
+    data = Dataset(db_path)
+    rng = random.Random(seed)
+    model = ScriptedModel(latency_seconds=model_latency_ms / 1000)
+    root_agent.model = model
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends:
+            results[backend] = asyncio.run(run_backend(
+                backend, model, data, sessions, turns, concurrency or sessions, rng, directory,
+            ))
+            result = results[backend]
+            print(f"{backend:9} {result['turns']:6} turns  {result['turns_per_sec']:>8} turns/s  "
+                  f"p50 {result['turn']['p50_ms']:9.3f} ms  p99 {result['turn']['p99_ms']:9.3f} ms  "
+                  f"errors {result['errors']}  RSS +{result['memory']['growth_mib']} MiB", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db": {"path": db_path, "bytes": os.path.getsize(db_path), "countries": len(data.countries)},
+            "sessions": sessions,
+            "turns_per_session": turns,
+            "model_latency_ms": model_latency_ms,
+            "answer_cache": answer_cache_enabled,
+            "seed": seed,
+        },
+        "results": results,
+        "model_calls": dict(model.calls),
+        "routing": routing_stats.snapshot(),
+        "answer_cache": answer_cache.answer_cache_stats(),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+
+def serve_scripted(agent):
+    '''
+    `--prepare` hook of `ripencc_agent.serve`: installs a `ScriptedModel` playing the script in `SCRIPT_ENV`.
+    '''
+    with open(os.environ[SCRIPT_ENV]) as f:
+        script = json.load(f)
+    agent.model = ScriptedModel(
+        script={turn[0]: ScriptedTurn(*turn) for turn in script["turns"]},
+        latency_seconds=script["latency_seconds"],
+    )
+    answer_cache.ANSWER_CACHE_ENABLED = script["answer_cache"]
+
+
+async def post_turn(client: httpx.AsyncClient, user_id: str, session_id: Optional[str], question: str) -> dict:
+    started = time.perf_counter()
+    try:
+        response = await client.post("/run", json={"user_id": user_id, "session_id": session_id, "message": question})
+        body = response.json()
+        error = None if response.status_code == 200 else f"HTTP {response.status_code}: {body.get('detail')}"
+    except (httpx.HTTPError, ValueError) as e:
+        body, error = {}, repr(e)
+    return {
+        "seconds": time.perf_counter() - started,
+        "error": error or (None if body.get("reply") else "no final response"),
+        "session_id": body.get("session_id", session_id),
+        "worker": body.get("worker"),
+    }
+
+
+async def post_session(client: httpx.AsyncClient, user_id: str, turns: list, semaphore: asyncio.Semaphore) -> list:
+    async with semaphore:
+        results, session_id = [], None
+        for turn in turns:
+            results.append(await post_turn(client, user_id, session_id, turn.question))
+            session_id = results[-1]["session_id"]
+        return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def drive_server(url: str, workers: int, plans: list, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=SERVER_START_TIMEOUT_SECONDS, limits=limits) as client:
+        # Warm up every worker (a new session lands on any of them) outside the measurement.
+        warmed = set()
+        for i in range(20 * workers):
+            if len(warmed) == workers:
+                break
+            result = await post_turn(client, "warmup", None, plans[i % len(plans)][0].question)
+            if result["error"]:
+                raise RuntimeError(f"Warm-up turn failed: {result['error']}")
+            warmed.add(result["worker"])
+
+        semaphore = asyncio.Semaphore(concurrency)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            post_session(client, f"user{i}", plan, semaphore) for i, plan in enumerate(plans)
+        ))
+        seconds = time.perf_counter() - started
+        health = (await client.get("/health")).json()
+
+    turn_stats = [stats for session_stats in results for stats in session_stats]
+    errors = [stats["error"] for stats in turn_stats if stats["error"]]
+    turns_per_worker = [0] * workers
+    for stats in turn_stats:
+        if stats["worker"] is not None:
+            turns_per_worker[stats["worker"]] += 1
+    cores = min(workers, os.cpu_count() or 1)
+    return {
+        "workers": workers,
+        "turns": len(turn_stats),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "turns_per_sec": round(len(turn_stats) / seconds, 1),
+        "turns_per_sec_per_core": round(len(turn_stats) / seconds / cores, 1),
+        "cores_used": cores,
+        "errors": len(errors),
+        "error_examples": sorted(set(errors))[:5],
+        "turns_per_worker": turns_per_worker,
+        # Every follow-up must land on the worker that served the session's first turn.
+        "sessions_pinned": all(len({stats["worker"] for stats in session_stats}) == 1 for session_stats in results),
+        "turn": summarize_latencies([stats["seconds"] for stats in turn_stats], len(errors), seconds),
+        "server": {"restarts": health["restarts"], "startup": health["startup"]},
+    }
+
+
+def run_server(db_path: str, workers: int, plans: list, concurrency: int, model_latency_ms: float,
+               answer_cache_enabled: bool, directory: str) -> dict:
+    '''
+    Starts `ripencc_agent.serve` with `workers` workers playing `plans`, times its startup and drives it.
+    '''
+    script_path = os.path.join(directory, "script.json")
+    with open(script_path, "w") as f:
+        json.dump({
+            "turns": [list(turn) for plan in plans for turn in plan],
+            "latency_seconds": model_latency_ms / 1000,
+            "answer_cache": answer_cache_enabled,
+        }, f)
+    port = _free_port()
+    env = {
+        **os.environ,
+        SCRIPT_ENV: script_path,
+        "RIPENCC_DB_PATH": db_path,
+        "RIPENCC_METRICS_PATH": os.path.join(directory, "metrics.prom"),
+        "RIPENCC_TRACE_PATH": "",
+        "PYTHONWARNINGS": "ignore",
+    }
+    log_path = os.path.join(directory, f"serve-{workers}.log")
+    with open(log_path, "w") as log:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "ripencc_agent.serve", "--workers", str(workers), "--port", str(port),
+             "--prepare", "benchmarks.loadtest:serve_scripted"],
+            env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            # The listening socket exists before the workers do; connections wait in its backlog until they are ready.
+            while True:
+                if server.poll() is not None or time.perf_counter() - started > SERVER_START_TIMEOUT_SECONDS:
+                    raise RuntimeError(f"Server did not start, see {log_path}")
+                try:
+                    httpx.get(f"http://127.0.0.1:{port}/health", timeout=SERVER_START_TIMEOUT_SECONDS).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.05)
+            startup_seconds = time.perf_counter() - started
+            result = asyncio.run(drive_server(f"http://127.0.0.1:{port}", workers, plans, concurrency))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+    result["startup_seconds"] = round(startup_seconds, 3)
+    return result
+
+
+def run_serving(db_path: str, workers: list, sessions: int = 200, turns: int = 2, concurrency: Optional[int] = None,
+                model_latency_ms: float = 0.0, answer_cache_enabled: bool = True, seed: int = 1) -> dict:
+    '''
+    Load-tests `ripencc_agent.serve` against `db_path` once per worker count and returns the report.
+    '''
+    data = Dataset(db_path)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in workers:
+            # The same sessions for every worker count.
+            plans = session_plans(data, random.Random(seed), sessions, turns)
+            result = results[str(count)] = run_server(
+                db_path, count, plans, concurrency or sessions, model_latency_ms, answer_cache_enabled, directory,
+            )
+            print(f"{count:3} workers  start {result['startup_seconds']:6.2f} s  {result['turns']:6} turns  "
+                  f"{result['turns_per_sec']:>8} turns/s  {result['turns_per_sec_per_core']:>8} per core  "
+                  f"p50 {result['turn']['p50_ms']:9.3f} ms  p99 {result['turn']['p99_ms']:9.3f} ms  "
+                  f"errors {result['errors']}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "db": {"path": db_path, "bytes": os.path.getsize(db_path), "countries": len(data.countries)},
+            "sessions": sessions,
+            "turns_per_session": turns,
+            "model_latency_ms": model_latency_ms,
+            "answer_cache": answer_cache_enabled,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the agent pipeline with a scripted local model.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the load test and write a JSON report")
+    run_parser.add_argument("--db", default=db.DB_PATH, help="Database to query (see benchmarks.synthetic)")
+    run_parser.add_argument("--sessions", type=int, default=200, help="Concurrent sessions per backend")
+    run_parser.add_argument("--turns", type=int, default=2, help="Turns per session: a first question plus follow-ups")
+    run_parser.add_argument("--concurrency", type=int, help="Sessions in flight at once (default: all)")
+    run_parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Session services to test")
+    run_parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Simulated latency of every model call")
+    run_parser.add_argument("--no-answer-cache", action="store_true", help="Disable the answer cache")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--out", help="Report path (default: stdout)")
+
+    serve_parser = commands.add_parser("serve", help="Load-test the multi-process server and write a JSON report")
+    serve_parser.add_argument("--db", default=db.DB_PATH, help="Database to query (see benchmarks.synthetic)")
+    serve_parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}), help="Worker counts to test")
+    serve_parser.add_argument("--sessions", type=int, default=200, help="Sessions per worker count")
+    serve_parser.add_argument("--turns", type=int, default=2, help="Turns per session: a first question plus follow-ups")
+    serve_parser.add_argument("--concurrency", type=int, help="Sessions in flight at once (default: all)")
+    serve_parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Simulated latency of every model call")
+    serve_parser.add_argument("--no-answer-cache", action="store_true", help="Disable the answer cache")
+    serve_parser.add_argument("--seed", type=int, default=1)
+    serve_parser.add_argument("--out", help="Report path (default: stdout)")
+    args = parser.parse_args()
+
+    # ADK's ParallelAgent (profile_agent) ends its tracing spans in another
+    # context; OpenTelemetry logs a harmless traceback for each one.
+    logging.getLogger("opentelemetry.context").setLevel(logging.CRITICAL)
+    if args.command == "serve":
+        report = run_serving(
+            args.db, args.workers, args.sessions, args.turns, args.concurrency,
+            args.model_latency_ms, not args.no_answer_cache, args.seed,
+        )
+    else:
+        report = run(
+            args.db, args.sessions, args.turns, args.concurrency, args.backends,
+            args.model_latency_ms, not args.no_answer_cache, args.seed,
+        )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import time
+from typing import Iterator
+
+from ripencc_agent.concentration import install_concentration, update_concentration
+from ripencc_agent.countries import COUNTRIES
+from ripencc_agent.db import ensure_indexes
+from ripencc_agent.ingest import TABLES
+from ripencc_agent.materialized import install_latest_snapshots
+
+# Synthetic insights.db generator.
+#
+#   python -m benchmarks.synthetic /tmp/insights-100x10.db --countries 100 --years 10
+#
+# Writes the tables the tools read, with the same columns as the real
+# database, at a chosen scale. Values are bounded random walks so trend and
+# downsampling code sees realistic curves instead of noise.
+
+SOURCES = ["google", "facebook", "akamai", "cisco", "cloudflare"]
+LAST_YEAR = 2025
+TOP_ASNS = 4
+MAX_ASNS = 60  # per country in ASN_Subscribers
+
+
+def country_codes(count: int) -> list:
+    '''
+    The first `count` country codes in alphabetical order, AD, AE, ... (up to 250).
+
+    They have to be real codes: the tools reject codes that are not countries.
+    '''
+    if not 0 < count <= len(COUNTRIES):
+        raise ValueError(f"countries must be between 1 and {len(COUNTRIES)}")
+    return sorted(COUNTRIES)[:count]
+
+
+def source_names(count: int) -> list:
+    return SOURCES[:count] + [f"source{i}" for i in range(len(SOURCES) + 1, count + 1)]
+
+
+def months(years: int) -> list:
+    return [f"{year}-{month:02d}-01" for year in range(LAST_YEAR - years + 1, LAST_YEAR + 1) for month in range(1, 13)]
+
+
+def days(years: int, interval_days: int) -> list:
+    day = datetime.date(LAST_YEAR - years + 1, 1, 1)
+    end = datetime.date(LAST_YEAR, 12, 31)
+    dates = []
+    while day <= end:
+        dates.append(day.isoformat())
+        day += datetime.timedelta(days=interval_days)
+    return dates
+
+
+def random_walk(rng: random.Random, steps: int, low: float, high: float, drift: float, noise: float) -> list:
+    value = rng.uniform(low, (low + high) / 2)
+    values = []
+    for _ in range(steps):
+        value = min(high, max(low, value + drift + rng.gauss(0, noise)))
+        values.append(round(value, 2))
+    return values
+
+
+def roa_rows(rng: random.Random, countries: list, dates: list) -> Iterator[tuple]:
+    for cc in countries:
+        for ip_version in (4, 6):
+            for date, value in zip(dates, random_walk(rng, len(dates), 0, 100, 0.4, 1.5)):
+                yield (date, cc, ip_version, value)
+
+
+def ipv6_rows(rng: random.Random, countries: list, sources: list, dates: list) -> Iterator[tuple]:
+    for cc in countries:
+        for source in sources:
+            for date, value in zip(dates, random_walk(rng, len(dates), 0, 90, 0.02, 0.4)):
+                yield (cc, date, value, source)
+
+
+def top_asn_rows(rng: random.Random, countries: list, dates: list) -> Iterator[tuple]:
+    for cc in countries:
+        asns = [str(rng.randint(1000, 400000)) for _ in range(TOP_ASNS)]
+        for date in dates:
+            shares = sorted((rng.uniform(2, 40) for _ in asns), reverse=True)
+            users = rng.randint(10 ** 5, 10 ** 8)
+            for asn, share in zip(asns, shares):
+                yield (date, cc, f"AS{asn} {cc} Telecom", asn, int(users * share / 100), round(share, 2))
+
+
+def asn_subscriber_rows(rng: random.Random, countries: list, dates: list) -> Iterator[tuple]:
+    for cc in countries:
+        # Heavy-tailed market shares that drift from month to month.
+        asns = [str(rng.randint(1000, 400000)) for _ in range(rng.randint(5, MAX_ASNS))]
+        weights = [rng.paretovariate(1.2) for _ in asns]
+        users = rng.randint(10 ** 5, 10 ** 8)
+        for date in dates:
+            weights = [weight * rng.lognormvariate(0, 0.05) for weight in weights]
+            total = sum(weights)
+            for asn, weight in zip(asns, weights):
+                yield (date, cc, asn, f"AS{asn} {cc} Networks", int(users * weight / total))
+
+
+def hhi_rows(rng: random.Random, countries: list) -> Iterator[tuple]:
+    for cc in countries:
+        yield (cc, rng.randint(10 ** 5, 10 ** 8), rng.randint(5, 2000), round(rng.uniform(300, 6000), 2))
+
+
+def generate(path: str, countries: int = 50, years: int = 8, sources: int = 5, ipv6_interval_days: int = 7,
+             seed: int = 1, optimize: bool = True) -> dict:
+    '''
+    Writes a synthetic insights.db to `path`, replacing any existing file.
+
+    With `optimize`, the indexes, latest-snapshot and concentration tables are
+    created and ANALYZE is run, as `explore_db.py optimize` does for the real database.
+
+    Returns the scale, the row count of every table, the file size and the build time.
+    '''
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    codes = country_codes(countries)
+    month_dates = months(years)
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for table, spec in TABLES.items():
+            columns = ", ".join(f"{name} {type_}" for name, type_ in spec["columns"].items())
+            conn.execute(f"CREATE TABLE {table} ({columns})")
+
+        # Column order follows `TABLES`.
+        rows = {
+            "ROA_MONTHLY": roa_rows(rng, codes, month_dates),
+            "Country_IPv6_Adoption": ipv6_rows(rng, codes, source_names(sources), days(years, ipv6_interval_days)),
+            "Top_4_ASNs": top_asn_rows(rng, codes, month_dates),
+            "Herfindahl_Hirschman_Index": hhi_rows(rng, codes),
+            # Last, so the other tables stay the same for a given seed.
+            "ASN_Subscribers": asn_subscriber_rows(rng, codes, month_dates),
+        }
+        with conn:
+            for table, table_rows in rows.items():
+                placeholders = ", ".join("?" for _ in TABLES[table]["columns"])
+                conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", table_rows)
+
+        if optimize:
+            ensure_indexes(conn)
+            install_latest_snapshots(conn)
+            install_concentration(conn)
+            update_concentration(conn)
+            conn.execute("ANALYZE")
+            conn.commit()
+
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    finally:
+        conn.close()
+
+    return {
+        "path": path,
+        "countries": countries,
+        "years": years,
+        "sources": sources,
+        "ipv6_interval_days": ipv6_interval_days,
+        "seed": seed,
+        "optimized": optimize,
+        "rows": counts,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic insights.db.")
+    parser.add_argument("path", help="Where to write the database (replaced if it exists)")
+    parser.add_argument("--countries", type=int, default=50)
+    parser.add_argument("--years", type=int, default=8)
+    parser.add_argument("--sources", type=int, default=5, help="IPv6 adoption sources per country")
+    parser.add_argument("--ipv6-interval-days", type=int, default=7, help="Days between IPv6 adoption measurements")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--raw", action="store_true", help="Skip indexes, snapshots and ANALYZE (the unoptimized schema)")
+    args = parser.parse_args()
+
+    stats = generate(args.path, args.countries, args.years, args.sources, args.ipv6_interval_days, args.seed, not args.raw)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,152 @@
-# import sqlite3
+import argparse
+import json
+import sqlite3
 
-# db_path = "ripencc_agent/data/insights.db"
+from ripencc_agent.concentration import CONCENTRATION_TABLE, SUBSCRIBERS_BY_COUNTRY_SQL, SUBSCRIBERS_TABLE, install_concentration, update_concentration
+from ripencc_agent.db import DB_PATH, INDEXES, ensure_indexes, table_columns, writable_copy
+from ripencc_agent.materialized import LATEST_IPV6_ADOPTION_TABLE, LATEST_ROA_DATE_TABLE, LATEST_TOP_ASN_DATE_TABLE, install_latest_snapshots
 
-# conn = sqlite3.connect(db_path)
-# cur = conn.cursor()
 
-# SQL = "SELECT name FROM sqlite_master WHERE type='table';"
-# cur.execute(SQL)
+def list_tables(conn: sqlite3.Connection) -> list:
+    SQL = "SELECT name FROM sqlite_master WHERE type='table';"
+    return [row[0] for row in conn.execute(SQL)]
 
-# tables = [row[0] for row in cur.fetchall()]
-# print("Tables:", tables)
 
-# conn.close()
+def tool_queries(conn: sqlite3.Connection) -> dict:
+    '''
+    The SQL every tool runs, with sample parameters taken from the data itself.
+    '''
+    from ripencc_agent.sub_agents.ipv6.tools import ADOPTION_BATCH_LATEST_SNAPSHOT_SQL, ADOPTION_BATCH_LATEST_SQL, ADOPTION_BATCH_RANGE_SQL, _build_adoption_query
+    from ripencc_agent.sub_agents.market.tools import ASN_HHI_SQL, CONCENTRATION_SERIES_SQL, TOP_ASN_LATEST_SQL, TOP_ASN_SQL
+    from ripencc_agent.sub_agents.rpki.tools import ROA_COVERAGE_BATCH_SQL, ROA_COVERAGE_SQL, ROA_LATEST_SNAPSHOT_SQL, ROA_LATEST_SQL
 
-import sqlite3
+    def sample(sql, default):
+        row = conn.execute(sql).fetchone()
+        return row if row else default
+
+    roa_cc, roa_ipv, roa_date = sample("SELECT country_code, ip_version, date FROM ROA_MONTHLY LIMIT 1", ("NL", "4", "2023-01-01"))
+    v6_cc, v6_source, v6_date = sample("SELECT cc, source, date FROM Country_IPv6_Adoption LIMIT 1", ("NL", "google", "2023-01-01"))
+    top_cc, = sample("SELECT cc FROM Top_4_ASNs LIMIT 1", ("NL",))
+    hhi_cc, = sample("SELECT Country_Code FROM Herfindahl_Hirschman_Index LIMIT 1", ("NL",))
+
+    tables = list_tables(conn)
+    latest_v6 = LATEST_IPV6_ADOPTION_TABLE in tables
+    if LATEST_TOP_ASN_DATE_TABLE in tables:
+        top_asns = (TOP_ASN_LATEST_SQL, (top_cc,))
+    else:
+        top_asns = (TOP_ASN_SQL, (top_cc, top_cc))
+    if LATEST_ROA_DATE_TABLE in tables:
+        latest_roa = (ROA_LATEST_SNAPSHOT_SQL, (roa_cc,))
+    else:
+        latest_roa = (ROA_LATEST_SQL, (roa_cc, roa_cc))
+
+    queries = {
+        "get_monthly_roa_coverage": (ROA_COVERAGE_SQL, (roa_cc, roa_ipv, roa_date, roa_date)),
+        "get_latest_roa_coverage": latest_roa,
+        "get_top_four_asns": top_asns,
+        "get_country_asn_hhi": (ASN_HHI_SQL, (hhi_cc,)),
+        "get_country_ipv6_adoption_rate (latest)": _build_adoption_query(v6_cc, None, None, None, None, latest_v6),
+        "get_country_ipv6_adoption_rate (latest, source)": _build_adoption_query(v6_cc, v6_source, None, None, None, latest_v6),
+        "get_country_ipv6_adoption_rate (date)": _build_adoption_query(v6_cc, None, v6_date, None, None),
+        "get_country_ipv6_adoption_rate (range, source)": _build_adoption_query(v6_cc, v6_source, None, v6_date, v6_date),
+        "get_monthly_roa_coverage_batch": (ROA_COVERAGE_BATCH_SQL, (json.dumps([roa_cc]), json.dumps([roa_ipv]), roa_date, roa_date)),
+        "get_ipv6_adoption_rate_batch (latest)": (
+            (ADOPTION_BATCH_LATEST_SNAPSHOT_SQL if latest_v6 else ADOPTION_BATCH_LATEST_SQL)[False], (json.dumps([v6_cc]),),
+        ),
+        "get_ipv6_adoption_rate_batch (range, sources)": (ADOPTION_BATCH_RANGE_SQL[True], (json.dumps([v6_cc]), json.dumps([v6_source]), v6_date, v6_date)),
+    }
+    if CONCENTRATION_TABLE in tables:
+        queries["get_asn_concentration_series"] = (CONCENTRATION_SERIES_SQL, (top_cc, "0000-00-00", "9999-99-99"))
+    elif SUBSCRIBERS_TABLE in tables:
+        queries["get_asn_concentration_series"] = (SUBSCRIBERS_BY_COUNTRY_SQL, (top_cc, "0000-00-00", "9999-99-99"))
+    return queries
+
+
+def explain(conn: sqlite3.Connection, queries: dict) -> dict:
+    '''
+    Returns the `EXPLAIN QUERY PLAN` lines of each query.
+    '''
+    plans = {}
+    for name, (sql, params) in queries.items():
+        plans[name] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    return plans
+
+
+def full_scans(plan: list) -> list:
+    '''
+    Plan steps that scan a whole table. Scans of a materialized subquery
+    (e.g. the per-source `MAX(date)` rows) are not table scans.
+    '''
+    materialized = {step.split()[1] for step in plan if step.startswith("MATERIALIZE")}
+    return [
+        step for step in plan
+        if step.startswith("SCAN") and "INDEX" not in step and step.split()[1] not in materialized
+    ]
+
+
+def optimize(db_path: str) -> bool:
+    '''
+    Creates the covering indexes, latest-snapshot and concentration tables the tools need,
+    refreshes planner statistics and prints each tool query plan before and
+    after. Safe to run repeatedly, also while the agent is serving: the
+    changes are made on a copy that replaces the DB when done.
+
+    Returns `True` when no tool query is left doing a full table scan.
+    '''
+    with writable_copy(db_path) as conn:
+        tables = list_tables(conn)
+        for name, (table, columns) in INDEXES.items():
+            if table not in tables:
+                print(f"Skipping {name}: table {table} does not exist")
+            elif not set(columns) <= set(table_columns(conn, table)):
+                print(f"Skipping {name}: {table} is missing columns {sorted(set(columns) - set(table_columns(conn, table)))}")
+
+        before = explain(conn, tool_queries(conn))
+
+        created = ensure_indexes(conn)
+        built = install_latest_snapshots(conn)
+        install_concentration(conn)
+        months = update_concentration(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+        print("Created indexes:", created or "none (already up to date)")
+        print("Built latest snapshots:", built or "none (already up to date)")
+        print("Recomputed concentration months:", len(months))
+
+        queries = tool_queries(conn)
+        after = explain(conn, queries)
+
+        ok = True
+        for name in queries:
+            print(f"\n{name}")
+            print("  before:", *before[name], sep="\n    ")
+            print("  after: ", *after[name], sep="\n    ")
+            if full_scans(after[name]):
+                ok = False
+                print("  FULL TABLE SCAN:", full_scans(after[name]))
+        return ok
 
-db_path = "ripencc_agent/data/insights.db"
 
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and optimize insights.db.")
+    parser.add_argument("--db", default=DB_PATH, help="Path to insights.db")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("tables", help="List tables")
+    columns_parser = commands.add_parser("columns", help="List the columns of a table")
+    columns_parser.add_argument("table")
+    commands.add_parser("optimize", help="Create indexes, ANALYZE and show query plans")
+    args = parser.parse_args()
 
-table_name = "Country_IPv6_Adoption"
+    if args.command == "optimize":
+        raise SystemExit(0 if optimize(args.db) else 1)
 
-cur.execute(f"PRAGMA table_info({table_name});")
-columns = [row[1] for row in cur.fetchall()]
+    conn = sqlite3.connect(args.db)
+    if args.command == "columns":
+        print(f"Columns in {args.table}:", table_columns(conn, args.table))
+    else:
+        print("Tables:", list_tables(conn))
+    conn.close()
 
-print(f"Columns in {table_name}:", columns)
 
-conn.close()
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@ from google.adk import Agent
 from .sub_agents.rpki import rpki_agent 
 from .sub_agents.market import market_agent 
 from .sub_agents.ipv6 import ipv6_agent 
+from .sub_agents.profile import profile_agent
+from .instrumentation import after_agent, after_model, after_tool, before_agent, before_model, before_tool
+from .answer_cache import answer_from_cache
+from .compaction import compact_history, end_turn, note_answer
+from .router import record_root_model_latency, route_before_model
 
 LLM_MODEL = "gemini-2.5-flash"
 
@@ -45,11 +50,28 @@ root_agent = Agent(
          - "Show me the IPv6 adoption from Google for Japan."
          - "Tell me about IPv6 adoption trends."
 
+    4. `profile_agent` — Use this when the user wants an overview of one country across topics rather than a single metric:
+       - A general profile, overview or "state of the Internet" of a country
+       - Questions combining routing security, IPv6 adoption and the ISP market for one country
+       Example prompts:
+         - "Give me an overview of Brazil's internet"
+         - "Country profile for Kenya"
+         - "What does the Internet landscape in Japan look like?"
+
     Constraints:
     - Do not answer questions outside the scope of RPKI, market data (currently ASN/ISP), or IPv6 data. # Updated constraint
     - Only use the capabilities of available sub-agents and tools.
     - If a request is unsupported or out of scope, respond with a clear and polite explanation.
     """,
     # Update the sub_agents list to use the new name 'rpki_agent'
-    sub_agents=[rpki_agent, market_agent, ipv6_agent] 
+    sub_agents=[rpki_agent, market_agent, ipv6_agent, profile_agent],
+    before_agent_callback=before_agent,
+    after_agent_callback=[end_turn, after_agent],
+    # Repeated questions are answered from the answer cache, and clear-cut
+    # ones are routed by keyword rules, without a model call. Older turns
+    # of long conversations are sent as a summary (see `compaction.py`).
+    before_model_callback=[before_model, answer_from_cache, route_before_model, compact_history],
+    after_model_callback=[after_model, record_root_model_latency, note_answer],
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
 )
\ No newline at end of file
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools import BaseTool, ToolContext
+from google.genai import types
+
+from .cache import ToolResultCache
+from .compaction import SUMMARY_STATE, is_user_turn
+from .countries import country_mentions
+from .db import data_version
+from .instrumentation import metrics, turn_model_calls
+from .router import classify, latest_user_text
+
+# Answer cache for whole user turns.
+#
+# The key of a question is its route (the pre-router's keyword rules) plus
+# the question itself, normalized: case, punctuation, a few filler words and
+# how a country is named ("the Netherlands", "Holland", "NL") do not matter,
+# every other word does, in order. "Show me the ROA coverage of Holland" and
+# "ROA coverage of NL?" share a key; "...in March 2023" and "...in June 2023",
+# "higher" and "lower", "monthly" and "yearly" do not. `answer_from_cache` (a
+# before_model callback) answers a repeated question with the final response
+# cached for its key, skipping every model call of the turn; `remember_answer`
+# (an after_model callback on the answering agents) stores that response.
+# Entries are only valid for the DB version they were produced at.
+#
+# The cache is shared by all sessions, so only the first turn of a session
+# takes part: a follow-up's answer depends on the turns before it. Questions
+# the key cannot capture faithfully (relative dates, exclusions, no country
+# outside rankings, no clear intent) and turns where a tool failed are not cached.
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.environ.get("RIPENCC_ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("RIPENCC_ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("RIPENCC_ANSWER_CACHE_TTL_SECONDS", "21600"))
+
+# Questions across all countries; they are cacheable without naming one.
+RANKING = r"\brank|leaderboard|\b(top|bottom) \d+\b|\bhighest\b|\blowest\b|\bbest\b|\bworst\b|\bcountries\b|\bmost (concentrated|competitive)\b"
+
+# Words that never change the answer; everything else in a question is part of its key.
+FILLER_WORDS = frozenset({"a", "an", "the", "please", "me", "us", "show", "tell", "give", "can", "could", "would", "you", "i", "want", "to", "know"})
+
+# Wording that changes the answer with the data, or needs the conversation.
+UNCACHEABLE = re.compile(
+    r"\b(last|past|previous|this|next|recent(ly)?|ago|yesterday|today|except|excluding|exclude|without|other than)\b",
+    re.IGNORECASE,
+)
+
+_RANKING_PATTERN = re.compile(RANKING, re.IGNORECASE)
+# Words, dates ("2023-03-01") and decimals ("1.5") as one token each; "@nl" stands for a country.
+_TOKEN_PATTERN = re.compile(r"@?[a-z0-9]+(?:[.-][a-z0-9]+)*")
+
+# temp: state, so it lasts for the current invocation only. "" means nothing to store.
+ANSWER_KEY_STATE = "temp:answer_cache_key"
+
+
+def question_tokens(text: str) -> list:
+    '''
+    The words of a question that make up its key, countries as `@` plus their code.
+
+    Example:
+        >>> question_tokens("Show me the ROA coverage of the Netherlands in March 2023!")
+        ['roa', 'coverage', 'of', '@nl', 'in', 'march', '2023']
+    '''
+    parts, position = [], 0
+    for start, end, code in country_mentions(text):
+        parts += [text[position:start], f" @{code} "]
+        position = end
+    parts.append(text[position:])
+    return [token for token in _TOKEN_PATTERN.findall("".join(parts).lower()) if token not in FILLER_WORDS]
+
+
+def answer_key(text: str) -> Optional[str]:
+    '''
+    The normalized cache key of a user question, or `None` if it should not be cached.
+
+    Example:
+        >>> answer_key("IPv6 adoption in Brazil since 2022 according to Google")
+        '["ipv6_agent", ["ipv6", "adoption", "in", "@br", "since", "2022", "according", "google"]]'
+    '''
+    if UNCACHEABLE.search(text):
+        return None
+    agent_name, _, _ = classify(text)
+    if agent_name is None:
+        return None
+    if not country_mentions(text) and not _RANKING_PATTERN.search(text):
+        return None
+    return json.dumps([agent_name, question_tokens(text)])
+
+
+def _is_first_turn(callback_context: CallbackContext, llm_request: LlmRequest) -> bool:
+    '''
+    Whether the question being answered opens its session: no digest of an
+    earlier turn, and no earlier message of the user in the request.
+    '''
+    if callback_context.state.get(SUMMARY_STATE):
+        return False
+    return sum(1 for content in llm_request.contents if is_user_turn(content)) <= 1
+
+
+class AnswerCacheStats:
+    '''
+    Counts answer cache lookups and the model calls hits made unnecessary.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"hit": 0, "miss": 0, "uncacheable": 0, "store": 0}
+        self.saved_model_calls = 0
+
+    def record(self, event: str, saved_model_calls: int = 0):
+        with self._lock:
+            self.counts[event] += 1
+            self.saved_model_calls += saved_model_calls
+        if event != "store":
+            metrics.inc("ripencc_answer_cache_lookups_total", (("result", event),))
+        if saved_model_calls:
+            metrics.inc("ripencc_answer_cache_saved_model_calls_total", value=saved_model_calls)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.counts["hit"] + self.counts["miss"]
+            return {
+                "hits": self.counts["hit"],
+                "misses": self.counts["miss"],
+                "uncacheable": self.counts["uncacheable"],
+                "stores": self.counts["store"],
+                "hit_ratio": self.counts["hit"] / lookups if lookups else 0.0,
+                "saved_model_calls": self.saved_model_calls,
+            }
+
+
+answer_cache = ToolResultCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS)
+answer_stats = AnswerCacheStats()
+
+
+def answer_from_cache(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    '''
+    `before_model_callback`: answers a question whose key has a cached final response for the current DB version.
+
+    Only the first model call of a turn looks the question up, and only in the
+    first turn of a session; it also leaves the key in the turn's state for
+    `remember_answer`, so later turns are not stored either.
+    '''
+    if not ANSWER_CACHE_ENABLED or callback_context.state.get(ANSWER_KEY_STATE) is not None:
+        return None
+    text = latest_user_text(llm_request)
+    if text is None:
+        return None
+
+    key = answer_key(text) if _is_first_turn(callback_context, llm_request) else None
+    callback_context.state[ANSWER_KEY_STATE] = key or ""
+    if key is None:
+        answer_stats.record("uncacheable")
+        return None
+    try:
+        version = data_version()
+    except OSError:
+        callback_context.state[ANSWER_KEY_STATE] = ""
+        return None
+
+    found, entry = answer_cache.get(key, version)
+    if not found:
+        answer_stats.record("miss")
+        return None
+
+    answer_stats.record("hit", entry["model_calls"])
+    callback_context.state[ANSWER_KEY_STATE] = ""
+    logger.info("answer cache hit: %s", key)
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=entry["text"])]))
+
+
+def remember_answer(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    '''
+    `after_model_callback` for the agents that write final answers: caches the turn's answer under its key.
+
+    Goes after the instrumentation callback, so the model call count includes this call.
+    '''
+    key = callback_context.state.get(ANSWER_KEY_STATE)
+    if not key or llm_response.partial or not llm_response.content or not llm_response.content.parts:
+        return None
+    parts = llm_response.content.parts
+    if any(part.function_call for part in parts):
+        return None
+    text = "".join(part.text for part in parts if part.text and not part.thought)
+    if not text:
+        return None
+
+    callback_context.state[ANSWER_KEY_STATE] = ""
+    try:
+        version = data_version()
+    except OSError:
+        return None
+    answer_cache.put(key, version, {"text": text, "model_calls": turn_model_calls(callback_context.invocation_id)})
+    answer_stats.record("store")
+    return None
+
+
+def skip_answer(state):
+    '''
+    Keeps the current turn's answer out of the cache, e.g. because it is built on a failed tool call.
+    '''
+    if state.get(ANSWER_KEY_STATE):
+        state[ANSWER_KEY_STATE] = ""
+
+
+def skip_answer_on_tool_error(tool: BaseTool, args: dict, tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+    '''
+    `after_tool_callback`: an error (which may be transient, like a timeout) must not be served from the cache.
+    '''
+    if isinstance(tool_response, dict) and tool_response.get("status") == "error":
+        skip_answer(tool_context.state)
+    return None
+
+
+def answer_cache_stats() -> dict:
+    return {**answer_stats.snapshot(), "cache": answer_cache.stats()}
@@ -0,0 +1,315 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from google.adk.tools import ToolContext
+
+from .countries import UnknownCountryError, country_name, resolve_country
+from .db import data_version
+
+# In-process result cache for the data tools.
+#
+# The same questions ("latest IPv6 adoption for DE", "top 4 ASNs in NL") arrive
+# over and over, and the answer only changes when insights.db does. Results are
+# keyed on the tool name plus its normalized arguments and tagged with the DB
+# version they were read at, so a rewrite of the DB file invalidates them.
+
+CACHE_MAX_ENTRIES = int(os.environ.get("RIPENCC_CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.environ.get("RIPENCC_CACHE_TTL_SECONDS", "3600"))
+
+# Per-session memo in `tool_context.state` (see `session_memoized`). It is
+# persisted with the session, so it is kept small.
+SESSION_MEMO_MAX_ENTRIES = int(os.environ.get("RIPENCC_SESSION_MEMO_MAX_ENTRIES", "16"))
+SESSION_MEMO_MAX_BYTES = int(os.environ.get("RIPENCC_SESSION_MEMO_MAX_BYTES", "65536"))
+SESSION_MEMO_TTL_SECONDS = float(os.environ.get("RIPENCC_SESSION_MEMO_TTL_SECONDS", "1800"))
+SESSION_MEMO_PREFIX = "tool_memo"
+
+
+def _normalize_country(value):
+    return resolve_country(value) if isinstance(value, str) else value
+
+
+def _normalize_name(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+def _normalize_text(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _normalize_ip_family(value):
+    return _normalize_text(str(value)) if value is not None else value
+
+
+# How each tool argument is normalized, by parameter name (list arguments are
+# normalized item by item). Arguments are normalized before the tool runs, not
+# only for the key, so "nl" and "NL" share an entry *and* return the same rows.
+# Countries are resolved to their code ("the Netherlands" -> "NL"); one that
+# does not resolve fails the call before any SQL runs.
+ARGUMENT_NORMALIZERS = {
+    "country_code": _normalize_country,
+    "country_codes": _normalize_country,
+    "source": _normalize_name,
+    "sources": _normalize_name,
+    "ip_family": _normalize_ip_family,
+    "ip_families": _normalize_ip_family,
+    "specific_date": _normalize_text,
+    "start_date": _normalize_text,
+    "end_date": _normalize_text,
+    "resolution": _normalize_name,
+    "output_format": _normalize_name,
+    "order": _normalize_name,
+    "date": _normalize_text,
+    "page_token": _normalize_text,
+}
+
+
+def normalize_argument(name: str, value):
+    normalizer = ARGUMENT_NORMALIZERS.get(name)
+    if normalizer is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [normalizer(item) for item in value]
+    return normalizer(value)
+
+
+def unknown_country_result(error: UnknownCountryError) -> dict:
+    return {
+        "status": "error",
+        "error_message": str(error),
+        "suggestions": [{"country_code": code, "name": country_name(code)} for code in error.suggestions],
+    }
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class ToolResultCache:
+    '''
+    A bounded LRU cache with a TTL whose entries are only valid for the DB version they were read at.
+    '''
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (version, expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def get(self, key, version):
+        '''
+        Returns `(True, result)` on a hit and `(False, None)` on a miss.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            entry_version, expires_at, result = entry
+            if entry_version != version:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return False, None
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, result
+
+    def put(self, key, version, result):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+            }
+
+
+tool_cache = ToolResultCache()
+
+
+def cached_tool(func):
+    '''
+    Caches successful results of a data tool in `tool_cache`.
+
+    Arguments are normalized first; an unknown country is returned as an error
+    with the closest `suggestions` without running the tool. The wrapper keeps
+    the tool's name, docstring and signature, so ADK builds the same function
+    declaration for it. Cached results are shared between callers and must not
+    be mutated.
+    '''
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            for name, value in bound.arguments.items():
+                bound.arguments[name] = normalize_argument(name, value)
+        except UnknownCountryError as e:
+            return unknown_country_result(e)
+
+        try:
+            version = data_version()
+        except OSError:
+            # No DB file: let the tool report the error itself.
+            return func(*bound.args, **bound.kwargs)
+
+        key = (func.__name__, _freeze(dict(bound.arguments)))
+        found, result = tool_cache.get(key, version)
+        if found:
+            return result
+
+        result = func(*bound.args, **bound.kwargs)
+        if result.get("status") == "success":
+            tool_cache.put(key, version, result)
+        return result
+
+    return wrapper
+
+
+_session_memo_counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_session_memo_lock = threading.Lock()
+
+
+def _count_session_memo(event: str):
+    with _session_memo_lock:
+        _session_memo_counts[event] += 1
+
+
+def _version_tag() -> str:
+    return "-".join(str(part) for part in data_version())
+
+
+def _remember(state, index_key: str, index: list, key: str, entry: dict, size: int):
+    '''
+    Stores `entry` in a free slot, evicting least recently used entries to stay within the caps.
+    '''
+    index = [item for item in index if item[0] != key]
+    while index and (
+        len(index) >= SESSION_MEMO_MAX_ENTRIES
+        or sum(item[2] for item in index) + size > SESSION_MEMO_MAX_BYTES
+    ):
+        _, slot, _ = index.pop(0)
+        state[f"{SESSION_MEMO_PREFIX}:{slot}"] = None
+        _count_session_memo("evictions")
+
+    used = {item[1] for item in index}
+    slot = next(slot for slot in range(SESSION_MEMO_MAX_ENTRIES) if slot not in used)
+    state[f"{SESSION_MEMO_PREFIX}:{slot}"] = entry
+    state[index_key] = index + [[key, slot, size]]
+    _count_session_memo("stores")
+
+
+def session_memoized(func):
+    '''
+    Memoizes successful results of an async data tool in the session state, so a
+    conversation that keeps drilling into the same country does not refetch it.
+
+    The wrapper takes the `tool_context` ADK passes to tools that ask for one,
+    and otherwise keeps the tool's name, docstring and declared parameters.
+    Entries are keyed on the tool name and normalized arguments only, so every
+    agent of the session reuses them, and are valid for the DB version they
+    were read at and `SESSION_MEMO_TTL_SECONDS`.
+
+    State stays bounded: entries live in a fixed set of `SESSION_MEMO_MAX_ENTRIES`
+    slot keys (`tool_memo:0`, ...), and least recently used entries are evicted
+    to keep them within `SESSION_MEMO_MAX_BYTES`. An index key lists the slots
+    in LRU order. Slot and index values are always replaced, never mutated in
+    place, so each change reaches the event's state delta.
+    '''
+    signature = inspect.signature(func)
+    index_key = f"{SESSION_MEMO_PREFIX}_index"
+
+    @functools.wraps(func)
+    async def wrapper(*args, tool_context: ToolContext = None, **kwargs):
+        if tool_context is None or SESSION_MEMO_MAX_ENTRIES <= 0:
+            return await func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            arguments = {name: normalize_argument(name, value) for name, value in bound.arguments.items()}
+            version = _version_tag()
+        except (UnknownCountryError, OSError):
+            # Let the tool report the error itself.
+            return await func(*args, **kwargs)
+
+        serialized = json.dumps([func.__name__, arguments], sort_keys=True, default=str)
+        key = hashlib.sha1(serialized.encode()).hexdigest()[:16]
+        state = tool_context.state
+        index = state.get(index_key) or []
+
+        for i, (item_key, slot, _) in enumerate(index):
+            if item_key != key:
+                continue
+            entry = state.get(f"{SESSION_MEMO_PREFIX}:{slot}")
+            if entry and entry["version"] == version and time.time() - entry["stored_at"] < SESSION_MEMO_TTL_SECONDS:
+                state[index_key] = index[:i] + index[i + 1:] + [index[i]]
+                _count_session_memo("hits")
+                return entry["result"]
+            break
+
+        _count_session_memo("misses")
+        result = await func(*args, **kwargs)
+        if isinstance(result, dict) and result.get("status") == "success":
+            entry = {"version": version, "stored_at": time.time(), "result": result}
+            size = len(json.dumps(entry, separators=(",", ":"), default=str))
+            if size <= SESSION_MEMO_MAX_BYTES // 4:  # large results would evict everything else
+                _remember(state, index_key, index, key, entry, size)
+        return result
+
+    wrapper.__signature__ = signature.replace(parameters=[
+        *signature.parameters.values(),
+        inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=ToolContext),
+    ])
+    return wrapper
+
+
+def cache_stats() -> dict:
+    '''
+    Hit/miss/eviction counters of the tool result cache and the session memo, for sizing them.
+    '''
+    with _session_memo_lock:
+        session = dict(_session_memo_counts)
+    return {**tool_cache.stats(), "session_memo": session}
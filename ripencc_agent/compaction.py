@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools import BaseTool, ToolContext
+from google.genai import types
+
+from .instrumentation import turn_agent
+
+# Session compaction and retention.
+#
+#   python -m ripencc_agent.compaction sqlite:///sessions.db --retain-turns 3
+#
+# Every event of a session is replayed into each model call, and kept in the
+# session DB, for as long as the session lives, including tool results of a
+# few hundred rows. Two things keep both bounded:
+#
+# - Prompt side (callbacks): when a turn ends, a one-line digest of it (the
+#   question, the tools called, the start of the answer) is appended to the
+#   session state, capped at `SUMMARY_MAX_TURNS`. `compact_history` (a
+#   before_model callback) sends only the last `KEEP_TURNS` turns verbatim,
+#   replaces the older ones with their digests, and shrinks large tool
+#   results of earlier turns in the window to their scalars. The turn being
+#   answered is never touched.
+# - Storage side (`apply_retention`, run periodically against the
+#   DatabaseSessionService DB): deletes the events of all but the last
+#   `RETAIN_TURNS` turns of every session, and shrinks large tool results of
+#   all but the last turn the same way. State is not touched, so the digests
+#   survive. Old results are not externalized: the tools can rebuild them,
+#   and their result caches make that cheap.
+
+COMPACTION_ENABLED = os.environ.get("RIPENCC_COMPACTION", "1") != "0"
+KEEP_TURNS = int(os.environ.get("RIPENCC_COMPACTION_KEEP_TURNS", "3"))
+SUMMARY_MAX_TURNS = int(os.environ.get("RIPENCC_COMPACTION_SUMMARY_TURNS", "20"))
+PART_MAX_BYTES = int(os.environ.get("RIPENCC_COMPACTION_PART_MAX_BYTES", "2048"))
+RETAIN_TURNS = int(os.environ.get("RIPENCC_SESSION_RETAIN_TURNS", str(KEEP_TURNS)))
+DIGEST_CHARS = 240  # per question and answer in a digest
+
+# Persisted with the session: the digests of finished turns, oldest first.
+SUMMARY_STATE = "conversation_summary"
+# temp: state, so it lasts for the current invocation only.
+TURN_STATE = "temp:compaction_turn"
+
+CONTEXT_PREFIX = "For context:"  # how ADK hands other agents' events to an agent
+SUMMARY_HEADER = "Summary of the earlier turns of this conversation (their messages and data were compacted):"
+
+
+def _clip(text: str, chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars - 1] + "…"
+
+
+def compact_response(response: Any) -> Any:
+    '''
+    A tool result cut down to its scalar fields, if it serializes to more than `PART_MAX_BYTES`.
+
+    Example:
+        >>> compact_response({"status": "success", "country_code": "NL", "data": {...}})  # large
+        {'status': 'success', 'country_code': 'NL', 'compacted': 'data omitted (51234 bytes); call the tool again for it'}
+    '''
+    if not isinstance(response, dict):
+        return response
+    size = len(json.dumps(response, separators=(",", ":"), default=str))
+    if size <= PART_MAX_BYTES:
+        return response
+    compacted = {key: value for key, value in response.items() if isinstance(value, (str, int, float, bool)) or value is None}
+    omitted = ", ".join(key for key in response if key not in compacted)
+    compacted["compacted"] = f"{omitted or 'result'} omitted ({size} bytes); call the tool again for it"
+    return compacted
+
+
+def is_user_turn(content: types.Content) -> bool:
+    '''
+    Whether `content` is a message typed by the user, which starts a turn.
+    '''
+    if content.role != "user" or not content.parts:
+        return False
+    first = content.parts[0]
+    return bool(first.text) and not first.text.startswith(CONTEXT_PREFIX) and not first.function_response
+
+
+def _shrink(content: types.Content) -> types.Content:
+    parts = []
+    for part in content.parts or []:
+        if part.function_response is not None:
+            response = compact_response(part.function_response.response)
+            if response is not part.function_response.response:
+                part = types.Part(function_response=types.FunctionResponse(
+                    id=part.function_response.id, name=part.function_response.name, response=response,
+                ))
+        elif part.text and len(part.text) > PART_MAX_BYTES and content.role == "user" and part is not content.parts[0]:
+            # Another agent's tool result, handed over as text.
+            part = types.Part(text=_clip(part.text, PART_MAX_BYTES) + " [compacted]")
+        parts.append(part)
+    return types.Content(role=content.role, parts=parts)
+
+
+def render_summary(digests: list) -> str:
+    lines = [SUMMARY_HEADER]
+    for digest in digests:
+        tools = f" via {', '.join(digest['tools'])}" if digest.get("tools") else ""
+        answer = f": {digest['answer']}" if digest.get("answer") else ""
+        lines.append(f"- User: {digest['question']}\n  {digest['agent']}{tools}{answer}")
+    return "\n".join(lines)
+
+
+def compact_history(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    '''
+    `before_model_callback`: sends the last `KEEP_TURNS` turns, earlier ones as their digests. Goes last.
+    '''
+    if not COMPACTION_ENABLED or not llm_request.contents:
+        return None
+    contents = llm_request.contents
+    starts = [i for i, content in enumerate(contents) if is_user_turn(content)]
+    if not starts:
+        return None
+
+    kept = starts[-KEEP_TURNS:]
+    first = kept[0] if len(starts) > len(kept) else 0
+    # Every finished turn left a digest; those of the turns still sent verbatim are not repeated.
+    digests = callback_context.state.get(SUMMARY_STATE) or []
+    digests = digests[:max(0, len(digests) - (len(kept) - 1))]
+
+    window = [_shrink(content) for content in contents[first:starts[-1]]] + contents[starts[-1]:]
+    if digests:
+        window.insert(0, types.Content(role="user", parts=[types.Part(text=render_summary(digests))]))
+    llm_request.contents = window
+    return None
+
+
+def note_tool(tool: BaseTool, args: dict, tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+    '''
+    `after_tool_callback`: adds the call to the turn's digest.
+    '''
+    if not COMPACTION_ENABLED or tool.name == "transfer_to_agent":
+        return None
+    turn = tool_context.state.get(TURN_STATE) or {"tools": [], "answer": None}
+    arguments = ", ".join(f"{name}={value}" for name, value in args.items() if value is not None)
+    status = tool_response.get("status") if isinstance(tool_response, dict) else None
+    call = f"{tool.name}({arguments})" + (f" [{status}]" if status and status != "success" else "")
+    tool_context.state[TURN_STATE] = {**turn, "tools": turn["tools"] + [call]}
+    return None
+
+
+def note_answer(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    '''
+    `after_model_callback`: keeps the start of the turn's final text for its digest.
+    '''
+    if not COMPACTION_ENABLED or llm_response.partial or not llm_response.content or not llm_response.content.parts:
+        return None
+    turn = callback_context.state.get(TURN_STATE) or {"tools": [], "answer": None}
+    parts = llm_response.content.parts
+    text = "".join(part.text for part in parts if part.text and not part.thought)
+    if text and not any(part.function_call for part in parts):
+        callback_context.state[TURN_STATE] = {**turn, "answer": _clip(text, DIGEST_CHARS), "answered_by": callback_context.agent_name}
+    return None
+
+
+def end_turn(callback_context: CallbackContext):
+    '''
+    `after_agent_callback` for the agents a turn can start at: appends the turn's digest to the session state
+    when the agent the turn started at finishes. Goes before the instrumentation callback, which closes the turn.
+    '''
+    agent_name = callback_context.agent_name
+    if not COMPACTION_ENABLED or turn_agent(callback_context.invocation_id) != agent_name:
+        return None
+    turn = callback_context.state.get(TURN_STATE) or {"tools": [], "answer": None}
+    user_content = callback_context.user_content
+    question = "".join(part.text for part in (user_content.parts if user_content else None) or [] if part.text)
+    digest = {
+        "question": _clip(question, DIGEST_CHARS),
+        "agent": turn.get("answered_by") or agent_name,
+        "tools": turn["tools"],
+        "answer": turn["answer"],
+    }
+    digests = callback_context.state.get(SUMMARY_STATE) or []
+    callback_context.state[SUMMARY_STATE] = (digests + [digest])[-SUMMARY_MAX_TURNS:]
+    return None
+
+
+def _compact_content(content: Any) -> Optional[str]:
+    '''
+    A stored event content (JSON) with large tool results compacted, or `None` if nothing changed.
+    '''
+    content = json.loads(content) if isinstance(content, str) else content
+    changed = False
+    for part in (content or {}).get("parts") or []:
+        function_response = part.get("function_response")
+        if function_response and isinstance(function_response.get("response"), dict):
+            response = compact_response(function_response["response"])
+            if response is not function_response["response"]:
+                function_response["response"] = response
+                changed = True
+    return json.dumps(content) if changed else None
+
+
+def apply_retention(db_url: str, retain_turns: int = RETAIN_TURNS) -> dict:
+    '''
+    Deletes the events of all but the last `retain_turns` turns of every session
+    in a DatabaseSessionService DB, and compacts large tool results in all but
+    the last turn. Safe to run while the app is serving.
+
+    Returns counts of the sessions seen, events deleted and events compacted.
+    '''
+    from sqlalchemy import bindparam, create_engine, text  # installed with google-adk
+
+    retain_turns = max(1, retain_turns)
+    engine = create_engine(db_url)
+    stats = {"sessions": 0, "deleted_events": 0, "compacted_events": 0}
+    with engine.begin() as conn:
+        turns = {}  # session key -> invocation ids, oldest first
+        for app_name, user_id, session_id, invocation_id, _ in conn.execute(text('''
+            SELECT app_name, user_id, session_id, invocation_id, MIN(timestamp) AS started
+            FROM events
+            GROUP BY app_name, user_id, session_id, invocation_id
+            ORDER BY app_name, user_id, session_id, started
+        ''')):
+            turns.setdefault((app_name, user_id, session_id), []).append(invocation_id)
+        stats["sessions"] = len(turns)
+
+        in_session = "app_name = :app_name AND user_id = :user_id AND session_id = :session_id"
+        delete = text(f"DELETE FROM events WHERE {in_session} AND invocation_id IN :ids").bindparams(bindparam("ids", expanding=True))
+        select = text(f"SELECT id, content FROM events WHERE {in_session} AND invocation_id IN :ids").bindparams(bindparam("ids", expanding=True))
+        update = text(f"UPDATE events SET content = :content WHERE {in_session} AND id = :id")
+        for (app_name, user_id, session_id), invocation_ids in turns.items():
+            key = {"app_name": app_name, "user_id": user_id, "session_id": session_id}
+            expired, earlier = invocation_ids[:-retain_turns], invocation_ids[-retain_turns:-1]
+            if expired:
+                stats["deleted_events"] += conn.execute(delete, {**key, "ids": expired}).rowcount
+            if earlier:
+                for event_id, content in conn.execute(select, {**key, "ids": earlier}).fetchall():
+                    compacted = _compact_content(content)
+                    if compacted is not None:
+                        conn.execute(update, {**key, "id": event_id, "content": compacted})
+                        stats["compacted_events"] += 1
+    engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the session retention policy to a DatabaseSessionService DB.")
+    parser.add_argument("db_url", help="SQLAlchemy URL of the session DB, e.g. sqlite:///sessions.db")
+    parser.add_argument("--retain-turns", type=int, default=RETAIN_TURNS, help="Turns of events kept per session")
+    args = parser.parse_args()
+    print(json.dumps(apply_retention(args.db_url, args.retain_turns), indent=2))
+
+
+if __name__ == "__main__":
+    main()
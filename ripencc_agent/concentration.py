@@ -0,0 +1,151 @@
+import json
+import sqlite3
+
+import numpy as np
+
+# Market concentration computed from per-ASN subscriber estimates.
+#
+# ASN_Subscribers holds one row per (country, month, ASN). The engine turns a
+# block of those rows into HHI, CR4, CR8, ASN count and total subscribers for
+# every (country, month) in it at once, with vectorized NumPy group
+# operations, and stores the results in ASN_Concentration.
+#
+# Updates are incremental: triggers on ASN_Subscribers record every month that
+# gains, loses or changes a row in ASN_Concentration_Dirty, and
+# `update_concentration` recomputes only those months (all countries each).
+# A new month costs one month of work, not a pass over the whole history.
+
+SUBSCRIBERS_TABLE = "ASN_Subscribers"
+CONCENTRATION_TABLE = "ASN_Concentration"
+DIRTY_TABLE = "ASN_Concentration_Dirty"
+UPDATE_BATCH_MONTHS = 12  # months recomputed per read and transaction
+
+CONCENTRATION_DDL = f'''
+    CREATE TABLE IF NOT EXISTS {CONCENTRATION_TABLE} (
+        cc TEXT NOT NULL,
+        date TEXT NOT NULL,
+        total_subs INTEGER NOT NULL,
+        asn_count INTEGER NOT NULL,
+        hhi REAL NOT NULL,
+        cr4 REAL NOT NULL,
+        cr8 REAL NOT NULL,
+        PRIMARY KEY (cc, date)
+    ) WITHOUT ROWID
+'''
+DIRTY_DDL = f"CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (date TEXT PRIMARY KEY) WITHOUT ROWID"
+
+DIRTY_TRIGGERS = {
+    "INSERT": f"INSERT OR IGNORE INTO {DIRTY_TABLE} (date) VALUES (NEW.date);",
+    "UPDATE": f"INSERT OR IGNORE INTO {DIRTY_TABLE} (date) VALUES (OLD.date), (NEW.date);",
+    "DELETE": f"INSERT OR IGNORE INTO {DIRTY_TABLE} (date) VALUES (OLD.date);",
+}
+
+SUBSCRIBERS_BY_DATES_SQL = f'''
+    SELECT cc, date, subs
+    FROM {SUBSCRIBERS_TABLE}
+    WHERE date IN (SELECT value FROM json_each(?))
+'''
+SUBSCRIBERS_BY_COUNTRY_SQL = f'''
+    SELECT cc, date, subs
+    FROM {SUBSCRIBERS_TABLE}
+    WHERE cc = ?
+    AND date >= ?
+    AND date <= ?
+'''
+CONCENTRATION_INSERT_SQL = f'''
+    INSERT INTO {CONCENTRATION_TABLE} (cc, date, total_subs, asn_count, hhi, cr4, cr8)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def compute_concentration(rows: list) -> list:
+    '''
+    Concentration metrics of every (country, date) group in `rows` of `(cc, date, subs)`.
+
+    Returns `(cc, date, total_subs, asn_count, hhi, cr4, cr8)` tuples sorted by
+    country and date. Shares are in percent, so HHI runs from 0 to 10,000 and
+    CR4/CR8 (the combined share of the 4 and 8 largest ASNs) from 0 to 100.
+    ASNs without subscribers are ignored, as are groups with none at all.
+    '''
+    rows = [row for row in rows if row[2] and row[2] > 0]
+    if not rows:
+        return []
+
+    ccs, cc_ids = np.unique(np.array([row[0] for row in rows], dtype=str), return_inverse=True)
+    dates, date_ids = np.unique(np.array([row[1] for row in rows], dtype=str), return_inverse=True)
+    subs = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+
+    # Group by (country, date), largest ASN first within each group.
+    order = np.lexsort((-subs, date_ids, cc_ids))
+    group = (cc_ids * len(dates) + date_ids)[order]
+    subs = subs[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    counts = np.diff(np.r_[starts, len(subs)])
+
+    totals = np.add.reduceat(subs, starts)
+    group_of_row = np.repeat(np.arange(len(starts)), counts)
+    shares = subs / totals[group_of_row] * 100
+    rank = np.arange(len(subs)) - starts[group_of_row]
+
+    hhi = np.add.reduceat(shares ** 2, starts)
+    cr4 = np.add.reduceat(np.where(rank < 4, shares, 0.0), starts)
+    cr8 = np.add.reduceat(np.where(rank < 8, shares, 0.0), starts)
+
+    first = order[starts]
+    return [
+        (str(ccs[cc_ids[i]]), str(dates[date_ids[i]]), int(total), int(count), round(float(h), 2), round(float(c4), 2), round(float(c8), 2))
+        for i, total, count, h, c4, c8 in zip(first, totals, counts, hhi, cr4, cr8)
+    ]
+
+
+def _trigger_name(event: str) -> str:
+    return f"trg_{SUBSCRIBERS_TABLE.lower()}_concentration_{event.lower()}"
+
+
+def install_concentration(conn: sqlite3.Connection) -> bool:
+    '''
+    Creates ASN_Concentration, the dirty-month table and its triggers if
+    ASN_Subscribers exists. A newly created ASN_Concentration has every
+    month marked dirty, so the next `update_concentration` fills it. Idempotent.
+
+    Returns `True` if ASN_Concentration was created by this call.
+    '''
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if SUBSCRIBERS_TABLE not in tables:
+        return False
+    with conn:
+        conn.execute(CONCENTRATION_DDL)
+        conn.execute(DIRTY_DDL)
+        for event, body in DIRTY_TRIGGERS.items():
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {_trigger_name(event)}
+                AFTER {event} ON {SUBSCRIBERS_TABLE}
+                BEGIN
+                    {body}
+                END
+            ''')
+        if CONCENTRATION_TABLE not in tables:
+            conn.execute(f"INSERT OR IGNORE INTO {DIRTY_TABLE} (date) SELECT DISTINCT date FROM {SUBSCRIBERS_TABLE}")
+    return CONCENTRATION_TABLE not in tables
+
+
+def update_concentration(conn: sqlite3.Connection, batch_months: int = UPDATE_BATCH_MONTHS) -> list:
+    '''
+    Recomputes ASN_Concentration for the dirty months, `batch_months` at a time.
+
+    Returns the months that were recomputed.
+    '''
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if DIRTY_TABLE not in tables:
+        return []
+
+    dirty = [row[0] for row in conn.execute(f"SELECT date FROM {DIRTY_TABLE} ORDER BY date")]
+    for i in range(0, len(dirty), batch_months):
+        batch = json.dumps(dirty[i:i + batch_months])
+        results = compute_concentration(conn.execute(SUBSCRIBERS_BY_DATES_SQL, (batch,)).fetchall())
+        with conn:
+            conn.execute(f"DELETE FROM {CONCENTRATION_TABLE} WHERE date IN (SELECT value FROM json_each(?))", (batch,))
+            conn.executemany(CONCENTRATION_INSERT_SQL, results)
+            conn.execute(f"DELETE FROM {DIRTY_TABLE} WHERE date IN (SELECT value FROM json_each(?))", (batch,))
+    return dirty
+
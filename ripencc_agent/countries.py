@@ -0,0 +1,445 @@
+import functools
+import re
+import unicodedata
+from typing import Optional
+
+# ISO 3166-1 alpha-2 country codes and the names users call the countries by.
+#
+# Used to recognise countries in free text (answer-cache keys) and to resolve
+# the `country_code` arguments of the tools. The first name of each entry is
+# the short English name; the rest are common aliases.
+#
+# `resolve_country` accepts a code, name or alias in any case and with or
+# without accents ("nl", "the Netherlands", "Deutschland", "Türkiye"), a
+# unique prefix ("switz") or a small typo ("Argentia"). Names live in a prefix
+# trie built at import time; typos are found by walking the trie with a
+# bounded edit distance, which prunes every branch that is already too far
+# off. Anything else raises `UnknownCountryError` with the closest candidates,
+# before a tool touches the DB.
+
+COUNTRIES = {
+    "AD": ("Andorra",),
+    "AE": ("United Arab Emirates", "UAE", "Emirates"),
+    "AF": ("Afghanistan",),
+    "AG": ("Antigua and Barbuda", "Antigua"),
+    "AI": ("Anguilla",),
+    "AL": ("Albania",),
+    "AM": ("Armenia",),
+    "AO": ("Angola",),
+    "AQ": ("Antarctica",),
+    "AR": ("Argentina",),
+    "AS": ("American Samoa",),
+    "AT": ("Austria",),
+    "AU": ("Australia",),
+    "AW": ("Aruba",),
+    "AX": ("Aland Islands", "Åland Islands", "Åland"),
+    "AZ": ("Azerbaijan",),
+    "BA": ("Bosnia and Herzegovina", "Bosnia"),
+    "BB": ("Barbados",),
+    "BD": ("Bangladesh",),
+    "BE": ("Belgium",),
+    "BF": ("Burkina Faso",),
+    "BG": ("Bulgaria",),
+    "BH": ("Bahrain",),
+    "BI": ("Burundi",),
+    "BJ": ("Benin",),
+    "BL": ("Saint Barthelemy", "Saint Barthélemy", "St Barts"),
+    "BM": ("Bermuda",),
+    "BN": ("Brunei", "Brunei Darussalam"),
+    "BO": ("Bolivia",),
+    "BQ": ("Bonaire, Sint Eustatius and Saba", "Caribbean Netherlands", "Bonaire"),
+    "BR": ("Brazil", "Brasil"),
+    "BS": ("Bahamas", "The Bahamas"),
+    "BT": ("Bhutan",),
+    "BV": ("Bouvet Island",),
+    "BW": ("Botswana",),
+    "BY": ("Belarus",),
+    "BZ": ("Belize",),
+    "CA": ("Canada",),
+    "CC": ("Cocos (Keeling) Islands", "Cocos Islands"),
+    "CD": ("Democratic Republic of the Congo", "DR Congo", "DRC", "Congo-Kinshasa"),
+    "CF": ("Central African Republic",),
+    "CG": ("Republic of the Congo", "Congo-Brazzaville", "Congo"),
+    "CH": ("Switzerland",),
+    "CI": ("Cote d'Ivoire", "Côte d'Ivoire", "Ivory Coast"),
+    "CK": ("Cook Islands",),
+    "CL": ("Chile",),
+    "CM": ("Cameroon",),
+    "CN": ("China", "PRC", "Mainland China"),
+    "CO": ("Colombia",),
+    "CR": ("Costa Rica",),
+    "CU": ("Cuba",),
+    "CV": ("Cabo Verde", "Cape Verde"),
+    "CW": ("Curacao", "Curaçao"),
+    "CX": ("Christmas Island",),
+    "CY": ("Cyprus",),
+    "CZ": ("Czechia", "Czech Republic"),
+    "DE": ("Germany", "Deutschland"),
+    "DJ": ("Djibouti",),
+    "DK": ("Denmark",),
+    "DM": ("Dominica",),
+    "DO": ("Dominican Republic",),
+    "DZ": ("Algeria",),
+    "EC": ("Ecuador",),
+    "EE": ("Estonia",),
+    "EG": ("Egypt",),
+    "EH": ("Western Sahara",),
+    "ER": ("Eritrea",),
+    "ES": ("Spain", "España"),
+    "ET": ("Ethiopia",),
+    "FI": ("Finland",),
+    "FJ": ("Fiji",),
+    "FK": ("Falkland Islands", "Falklands"),
+    "FM": ("Micronesia", "Federated States of Micronesia"),
+    "FO": ("Faroe Islands", "Faroes"),
+    "FR": ("France",),
+    "GA": ("Gabon",),
+    "GB": ("United Kingdom", "UK", "Great Britain", "Britain", "England", "Scotland", "Wales"),
+    "GD": ("Grenada",),
+    "GE": ("Georgia",),
+    "GF": ("French Guiana",),
+    "GG": ("Guernsey",),
+    "GH": ("Ghana",),
+    "GI": ("Gibraltar",),
+    "GL": ("Greenland",),
+    "GM": ("Gambia", "The Gambia"),
+    "GN": ("Guinea",),
+    "GP": ("Guadeloupe",),
+    "GQ": ("Equatorial Guinea",),
+    "GR": ("Greece",),
+    "GS": ("South Georgia and the South Sandwich Islands",),
+    "GT": ("Guatemala",),
+    "GU": ("Guam",),
+    "GW": ("Guinea-Bissau",),
+    "GY": ("Guyana",),
+    "HK": ("Hong Kong",),
+    "HM": ("Heard Island and McDonald Islands",),
+    "HN": ("Honduras",),
+    "HR": ("Croatia",),
+    "HT": ("Haiti",),
+    "HU": ("Hungary",),
+    "ID": ("Indonesia",),
+    "IE": ("Ireland",),
+    "IL": ("Israel",),
+    "IM": ("Isle of Man",),
+    "IN": ("India",),
+    "IO": ("British Indian Ocean Territory",),
+    "IQ": ("Iraq",),
+    "IR": ("Iran",),
+    "IS": ("Iceland",),
+    "IT": ("Italy", "Italia"),
+    "JE": ("Jersey",),
+    "JM": ("Jamaica",),
+    "JO": ("Jordan",),
+    "JP": ("Japan",),
+    "KE": ("Kenya",),
+    "KG": ("Kyrgyzstan",),
+    "KH": ("Cambodia",),
+    "KI": ("Kiribati",),
+    "KM": ("Comoros",),
+    "KN": ("Saint Kitts and Nevis", "St Kitts and Nevis"),
+    "KP": ("North Korea", "DPRK"),
+    "KR": ("South Korea", "Korea", "Republic of Korea"),
+    "KW": ("Kuwait",),
+    "KY": ("Cayman Islands",),
+    "KZ": ("Kazakhstan",),
+    "LA": ("Laos", "Lao PDR"),
+    "LB": ("Lebanon",),
+    "LC": ("Saint Lucia", "St Lucia"),
+    "LI": ("Liechtenstein",),
+    "LK": ("Sri Lanka",),
+    "LR": ("Liberia",),
+    "LS": ("Lesotho",),
+    "LT": ("Lithuania",),
+    "LU": ("Luxembourg",),
+    "LV": ("Latvia",),
+    "LY": ("Libya",),
+    "MA": ("Morocco",),
+    "MC": ("Monaco",),
+    "MD": ("Moldova",),
+    "ME": ("Montenegro",),
+    "MF": ("Saint Martin", "St Martin"),
+    "MG": ("Madagascar",),
+    "MH": ("Marshall Islands",),
+    "MK": ("North Macedonia", "Macedonia"),
+    "ML": ("Mali",),
+    "MM": ("Myanmar", "Burma"),
+    "MN": ("Mongolia",),
+    "MO": ("Macao", "Macau"),
+    "MP": ("Northern Mariana Islands",),
+    "MQ": ("Martinique",),
+    "MR": ("Mauritania",),
+    "MS": ("Montserrat",),
+    "MT": ("Malta",),
+    "MU": ("Mauritius",),
+    "MV": ("Maldives",),
+    "MW": ("Malawi",),
+    "MX": ("Mexico",),
+    "MY": ("Malaysia",),
+    "MZ": ("Mozambique",),
+    "NA": ("Namibia",),
+    "NC": ("New Caledonia",),
+    "NE": ("Niger",),
+    "NF": ("Norfolk Island",),
+    "NG": ("Nigeria",),
+    "NI": ("Nicaragua",),
+    "NL": ("Netherlands", "The Netherlands", "Holland"),
+    "NO": ("Norway",),
+    "NP": ("Nepal",),
+    "NR": ("Nauru",),
+    "NU": ("Niue",),
+    "NZ": ("New Zealand",),
+    "OM": ("Oman",),
+    "PA": ("Panama",),
+    "PE": ("Peru",),
+    "PF": ("French Polynesia",),
+    "PG": ("Papua New Guinea",),
+    "PH": ("Philippines", "The Philippines"),
+    "PK": ("Pakistan",),
+    "PL": ("Poland",),
+    "PM": ("Saint Pierre and Miquelon",),
+    "PN": ("Pitcairn", "Pitcairn Islands"),
+    "PR": ("Puerto Rico",),
+    "PS": ("Palestine", "State of Palestine"),
+    "PT": ("Portugal",),
+    "PW": ("Palau",),
+    "PY": ("Paraguay",),
+    "QA": ("Qatar",),
+    "RE": ("Reunion", "Réunion"),
+    "RO": ("Romania",),
+    "RS": ("Serbia",),
+    "RU": ("Russia", "Russian Federation"),
+    "RW": ("Rwanda",),
+    "SA": ("Saudi Arabia",),
+    "SB": ("Solomon Islands",),
+    "SC": ("Seychelles",),
+    "SD": ("Sudan",),
+    "SE": ("Sweden",),
+    "SG": ("Singapore",),
+    "SH": ("Saint Helena", "St Helena"),
+    "SI": ("Slovenia",),
+    "SJ": ("Svalbard and Jan Mayen",),
+    "SK": ("Slovakia",),
+    "SL": ("Sierra Leone",),
+    "SM": ("San Marino",),
+    "SN": ("Senegal",),
+    "SO": ("Somalia",),
+    "SR": ("Suriname",),
+    "SS": ("South Sudan",),
+    "ST": ("Sao Tome and Principe", "São Tomé and Príncipe"),
+    "SV": ("El Salvador",),
+    "SX": ("Sint Maarten",),
+    "SY": ("Syria",),
+    "SZ": ("Eswatini", "Swaziland"),
+    "TC": ("Turks and Caicos Islands",),
+    "TD": ("Chad",),
+    "TF": ("French Southern Territories",),
+    "TG": ("Togo",),
+    "TH": ("Thailand",),
+    "TJ": ("Tajikistan",),
+    "TK": ("Tokelau",),
+    "TL": ("Timor-Leste", "East Timor"),
+    "TM": ("Turkmenistan",),
+    "TN": ("Tunisia",),
+    "TO": ("Tonga",),
+    "TR": ("Turkey", "Türkiye", "Turkiye"),
+    "TT": ("Trinidad and Tobago", "Trinidad"),
+    "TV": ("Tuvalu",),
+    "TW": ("Taiwan",),
+    "TZ": ("Tanzania",),
+    "UA": ("Ukraine",),
+    "UG": ("Uganda",),
+    "UM": ("United States Minor Outlying Islands",),
+    "US": ("United States", "USA", "United States of America", "America"),
+    "UY": ("Uruguay",),
+    "UZ": ("Uzbekistan",),
+    "VA": ("Vatican City", "Holy See", "Vatican"),
+    "VC": ("Saint Vincent and the Grenadines", "St Vincent and the Grenadines"),
+    "VE": ("Venezuela",),
+    "VG": ("British Virgin Islands",),
+    "VI": ("U.S. Virgin Islands", "US Virgin Islands"),
+    "VN": ("Vietnam", "Viet Nam"),
+    "VU": ("Vanuatu",),
+    "WF": ("Wallis and Futuna",),
+    "WS": ("Samoa",),
+    "XK": ("Kosovo",),  # user-assigned, but used by the RIRs
+    "YE": ("Yemen",),
+    "YT": ("Mayotte",),
+    "ZA": ("South Africa",),
+    "ZM": ("Zambia",),
+    "ZW": ("Zimbabwe",),
+}
+
+# lower-case name -> code
+COUNTRY_NAMES = {name.lower(): code for code, names in COUNTRIES.items() for name in names}
+
+# Longest names first, so "South Sudan" wins over "Sudan" and "Niger" does not match inside "Nigeria".
+_NAME_PATTERN = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(name) for name in sorted(COUNTRY_NAMES, key=len, reverse=True)) + r")(?!\w)",
+    re.IGNORECASE,
+)
+# Bare codes only count in upper case: "in", "it" and "no" are words.
+_CODE_PATTERN = re.compile(r"\b[A-Z]{2}\b")
+
+
+def country_name(code: str) -> str:
+    return COUNTRIES[code][0]
+
+
+def country_mentions(text: str) -> list:
+    '''
+    `(start, end, code)` of every country named in `text` (by name, alias or upper-case ISO code), in order.
+    '''
+    found = []
+    for match in _NAME_PATTERN.finditer(text):
+        found.append((match.start(), match.end(), COUNTRY_NAMES[match.group(1).lower()]))
+    for match in _CODE_PATTERN.finditer(text):
+        if match.group(0) in COUNTRIES and not any(start <= match.start() < end for start, end, _ in found):
+            found.append((match.start(), match.end(), match.group(0)))
+    return sorted(found)
+
+
+def find_countries(text: str) -> list:
+    '''
+    Codes of the countries named in `text` (by name, alias or upper-case ISO code), in order of appearance.
+    '''
+    return list(dict.fromkeys(code for _, _, code in country_mentions(text)))
+
+
+MIN_PREFIX = 3          # shortest prefix resolved on its own ("ger" -> DE)
+MAX_SUGGESTIONS = 3
+RESOLVE_CACHE_SIZE = 4096
+
+
+class UnknownCountryError(ValueError):
+    '''
+    Raised for a country argument that does not resolve to a code. `suggestions` lists candidate codes, best first.
+    '''
+
+    def __init__(self, value: str, suggestions: list):
+        self.value = value
+        self.suggestions = suggestions
+        message = f"Unknown country '{value}'."
+        if suggestions:
+            message += " Did you mean: " + ", ".join(f"{code} ({country_name(code)})" for code in suggestions) + "?"
+        else:
+            message += " Use an ISO 3166-1 alpha-2 code (e.g. 'NL') or an English country name."
+        super().__init__(message)
+
+
+def normalize_country_text(text: str) -> str:
+    '''
+    Lower case without accents, punctuation or a leading "the", and "saint" spelled "st".
+
+    Example:
+        >>> normalize_country_text("  The Côte d'Ivoire ")
+        'cote d ivoire'
+    '''
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    return " ".join("st" if word == "saint" else word for word in words)
+
+
+class _TrieNode:
+    __slots__ = ("children", "code", "codes")
+
+    def __init__(self):
+        self.children = {}
+        self.code = None    # set if a name ends here
+        self.codes = set()  # codes of every name at or below this node
+
+
+class CountryResolver:
+    '''
+    Maps codes, names and aliases to ISO 3166-1 alpha-2 codes through a prefix trie with fuzzy matching.
+    '''
+
+    def __init__(self, countries: dict = COUNTRIES):
+        self.countries = countries
+        self.names = {}
+        self.root = _TrieNode()
+        for code, names in countries.items():
+            for name in names:
+                key = normalize_country_text(name)
+                self.names.setdefault(key, code)
+                node = self.root
+                node.codes.add(code)
+                for char in key:
+                    node = node.children.setdefault(char, _TrieNode())
+                    node.codes.add(code)
+                node.code = node.code or code
+        self.lookup = functools.lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._lookup)
+
+    def _prefix_node(self, key: str) -> Optional[_TrieNode]:
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy(self, key: str, max_distance: int) -> list:
+        '''
+        `(distance, code)` of every name within `max_distance` edits (Levenshtein) of `key`, closest first.
+        '''
+        found = {}
+        first_row = list(range(len(key) + 1))
+        stack = [(child, char, first_row) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i, key_char in enumerate(key):
+                row.append(min(row[i] + 1, previous[i + 1] + 1, previous[i] + (key_char != char)))
+            if node.code is not None and row[-1] <= max_distance:
+                found[node.code] = min(row[-1], found.get(node.code, row[-1]))
+            if min(row) <= max_distance:
+                stack.extend((child, next_char, row) for next_char, child in node.children.items())
+        return sorted((distance, code) for code, distance in found.items())
+
+    def _lookup(self, value: str) -> tuple:
+        '''
+        `(code, ())` for a value that resolves, `(None, suggestions)` for one that does not.
+        '''
+        key = normalize_country_text(value)
+        if key in self.names:
+            return self.names[key], ()
+        if len(key) == 2:
+            code = key.upper()
+            return (code, ()) if code in self.countries else (None, ())
+        if len(key) < MIN_PREFIX:
+            return None, ()
+
+        node = self._prefix_node(key)
+        if node is not None and len(node.codes) == 1:
+            return next(iter(node.codes)), ()
+
+        # One typo in short names, two in longer ones; only an unambiguous best match is taken.
+        matches = self._fuzzy(key, 1 if len(key) <= 6 else 2)
+        if matches and (len(matches) == 1 or matches[0][0] < matches[1][0]):
+            return matches[0][1], ()
+
+        completions = sorted(node.codes, key=lambda code: len(country_name(code))) if node is not None else []
+        suggestions = dict.fromkeys(completions + [code for _, code in matches])
+        return None, tuple(suggestions)[:MAX_SUGGESTIONS]
+
+    def resolve(self, value: str) -> str:
+        '''
+        The code `value` stands for. Raises `UnknownCountryError` if there is none.
+
+        Example:
+            >>> country_resolver.resolve("the netherlands")
+            'NL'
+        '''
+        code, suggestions = self.lookup(value)
+        if code is None:
+            raise UnknownCountryError(value.strip(), list(suggestions))
+        return code
+
+
+country_resolver = CountryResolver()
+
+
+def resolve_country(value: str) -> str:
+    return country_resolver.resolve(value)
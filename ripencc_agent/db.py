@@ -0,0 +1,307 @@
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialized
+    fcntl = None
+
+# Shared data-access layer for insights.db.
+#
+# Every tool used to open (and, on the success path only, close) its own
+# `sqlite3.connect(...)` per call. Instead, each thread gets one long-lived
+# read-only connection from a pool, so the connect + schema-parse cost is paid
+# once per thread and prepared statements are reused across calls.
+
+DB_PATH = os.environ.get("RIPENCC_DB_PATH", "ripencc_agent/data/insights.db")
+
+MMAP_SIZE = 256 * 1024 * 1024    # bytes of the DB file mapped into memory
+CACHE_SIZE_KIB = 64 * 1024       # page cache per connection
+CACHED_STATEMENTS = 256          # prepared statements kept per connection
+
+# Covering composite indexes for exactly the access paths the tools use.
+# name -> (table, columns); see `ensure_indexes` and `explore_db.py optimize`.
+INDEXES = {
+    "idx_ipv6_adoption_cc_source_date": (
+        "Country_IPv6_Adoption", ("cc", "source", "date", "percentage"),
+    ),
+    "idx_roa_monthly_cc_ipv_date": (
+        "ROA_MONTHLY", ("country_code", "ip_version", "date", "percentage_space_covered_by_roa"),
+    ),
+    # Date-first twins for the cross-country rankings (`rankings.py`).
+    "idx_ipv6_adoption_source_date_cc": (
+        "Country_IPv6_Adoption", ("source", "date", "cc", "percentage"),
+    ),
+    "idx_roa_monthly_ipv_date_cc": (
+        "ROA_MONTHLY", ("ip_version", "date", "country_code", "percentage_space_covered_by_roa"),
+    ),
+    "idx_top4_asns_cc_date": (
+        "Top_4_ASNs", ("cc", "date", "subs", "asn_name", "asn", "percentage"),
+    ),
+    "idx_asn_subscribers_date_cc": (
+        "ASN_Subscribers", ("date", "cc", "subs"),
+    ),
+    "idx_asn_subscribers_cc_date": (
+        "ASN_Subscribers", ("cc", "date", "subs"),
+    ),
+    "idx_hhi_country_code": (
+        "Herfindahl_Hirschman_Index", ("Country_Code", "Total_Users", "Number_of_ASNs", "HHI"),
+    ),
+}
+
+# When set (see `instrumentation.py`), `query` adds its count, time and rows to
+# this dict. Tool calls copy their context into the DB executor, so the dict
+# set around a tool call collects the queries that call runs.
+query_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+def _file_signature(db_path: str) -> tuple:
+    '''
+    Identity of the DB file on disk. Connections are opened with `immutable=1`,
+    so SQLite will never notice the file changing underneath it; the pool
+    compares this signature instead and reopens when the file is replaced.
+    '''
+    st = os.stat(db_path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def data_version(db_path: Optional[str] = None) -> tuple:
+    '''
+    Changes whenever insights.db is rewritten. `PRAGMA data_version` cannot be
+    used for this: an immutable connection never sees other writers, so the
+    file identity (inode, size, mtime) is the version.
+    '''
+    return _file_signature(db_path or DB_PATH)
+
+
+def _open_read_only(db_path: str) -> sqlite3.Connection:
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro&immutable=1"
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        check_same_thread=False,  # only so the pool can close it from another thread
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+class ConnectionPool:
+    '''
+    Hands out one read-only, immutable connection per thread for a single DB file.
+    '''
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread ident -> connection
+
+    def connection(self) -> sqlite3.Connection:
+        signature = _file_signature(self.db_path)
+        conn = getattr(self._local, "conn", None)
+
+        if conn is not None and self._local.signature != signature:
+            self._discard(conn)
+            conn = None
+
+        if conn is None:
+            conn = _open_read_only(self.db_path)
+            self._local.conn = conn
+            self._local.signature = signature
+            with self._lock:
+                # Thread idents are recycled once a thread exits, so an entry
+                # already under this ident belongs to a dead thread.
+                stale = self._connections.pop(threading.get_ident(), None)
+                self._connections[threading.get_ident()] = conn
+            if stale is not None:
+                stale.close()
+
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+        self._local.conn = None
+        conn.close()
+
+    def interrupt(self, thread_ident: int):
+        '''
+        Aborts whatever query the given thread is running on its pooled connection.
+        '''
+        with self._lock:
+            conn = self._connections.get(thread_ident)
+        if conn is not None:
+            conn.interrupt()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    db_path = db_path or DB_PATH
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_path, ConnectionPool(db_path))
+    return pool
+
+
+def query(sql: str, params: tuple = (), db_path: Optional[str] = None, limit: Optional[int] = None) -> list:
+    '''
+    Runs a read-only query on the pooled connection of the calling thread and returns all rows,
+    or only the first `limit`: the statement is not stepped past them.
+
+    Keep `sql` a constant string (parameters go in `params`) so the connection's
+    statement cache can reuse the prepared statement.
+    '''
+    stats = query_stats.get()
+    started = time.perf_counter() if stats is not None else None
+    conn = get_pool(db_path).connection()
+    cursor = conn.execute(sql, params)
+    try:
+        rows = cursor.fetchall() if limit is None else cursor.fetchmany(limit)
+    finally:
+        cursor.close()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["sql_seconds"] += time.perf_counter() - started
+        stats["rows"] += len(rows)
+    return rows
+
+
+def interrupt(thread_ident: int):
+    '''
+    Aborts the query running on `thread_ident`'s pooled connections, e.g. after a tool timeout.
+    '''
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.interrupt(thread_ident)
+
+
+_table_names = {}  # db_path -> (data version, table names)
+
+
+def table_names(db_path: Optional[str] = None) -> frozenset:
+    '''
+    Names of the tables in the DB, re-read only when the DB file changes.
+    Lets tools use optional tables (e.g. materialized snapshots) when present.
+    '''
+    db_path = db_path or DB_PATH
+    version = _file_signature(db_path)
+    cached = _table_names.get(db_path)
+    if cached is None or cached[0] != version:
+        names = frozenset(row[0] for row in query("SELECT name FROM sqlite_master WHERE type = 'table'", db_path=db_path))
+        cached = _table_names[db_path] = (version, names)
+    return cached[1]
+
+
+def close_all():
+    '''
+    Closes every pooled connection, e.g. before forking or at shutdown.
+    '''
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def connect_writable(db_path: Optional[str] = None) -> sqlite3.Connection:
+    '''
+    Opens a plain read-write connection, e.g. to a copy made by `writable_copy`.
+    Do not write to a DB that pooled readers have open: they read it immutable.
+    '''
+    return sqlite3.connect(db_path or DB_PATH)
+
+
+@contextmanager
+def writer_lock(db_path: Optional[str] = None) -> Iterator[None]:
+    '''
+    Holds an exclusive lock on `<db>.lock`, blocking until other writers release it.
+    '''
+    with open(f"{db_path or DB_PATH}.lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+@contextmanager
+def writable_copy(db_path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    '''
+    Yields a read-write connection to a private copy of the DB for maintenance
+    jobs (indexing, ingest). When the block finishes, the copy is committed,
+    taken out of WAL mode and renamed over the DB in one step; pooled readers
+    keep reading the old file until then and reopen on their next query. If
+    the block raises, the copy is discarded and the DB is left untouched.
+
+    Writers hold `writer_lock` from the copy to the rename, so a second one
+    copies the first one's result instead of renaming over it.
+    '''
+    db_path = db_path or DB_PATH
+    with writer_lock(db_path):
+        staging = f"{db_path}.{os.getpid()}.tmp"
+        if os.path.exists(staging):
+            os.remove(staging)
+        conn = sqlite3.connect(staging)
+        try:
+            if os.path.exists(db_path):
+                source = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+                try:
+                    source.backup(conn)
+                finally:
+                    source.close()
+            yield conn
+            conn.commit()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.close()
+            with open(staging, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(staging, db_path)
+        except BaseException:
+            conn.close()
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def ensure_indexes(conn: sqlite3.Connection) -> list:
+    '''
+    Creates any missing index from `INDEXES` whose table and columns exist. Idempotent.
+
+    Returns the names of the indexes that were created by this call.
+    '''
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    created = []
+    for name, (table, columns) in INDEXES.items():
+        if name in existing:
+            continue
+        if not set(columns) <= set(table_columns(conn, table)):
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        created.append(name)
+    conn.commit()
+    return created
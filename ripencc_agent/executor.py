@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from . import db
+
+# Runs the blocking sqlite3 work of the data tools off the event loop.
+#
+# Sessions are driven by `Runner.run_async`; a tool that queries SQLite on the
+# event-loop thread stalls every other session in the process. `async_tool`
+# turns a data tool into a coroutine that runs it on a bounded thread pool,
+# with a per-call timeout.
+
+DB_MAX_WORKERS = int(os.environ.get("RIPENCC_DB_MAX_WORKERS", "8"))
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("RIPENCC_TOOL_TIMEOUT_SECONDS", "15"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="insights-db")
+    return _executor
+
+
+def configure(max_workers: Optional[int] = None, timeout_seconds: Optional[float] = None):
+    '''
+    Changes the concurrency limit and/or the per-call timeout. A new pool is
+    created on the next call; work already queued on the old one still completes.
+    '''
+    global DB_MAX_WORKERS, TOOL_TIMEOUT_SECONDS
+    if timeout_seconds is not None:
+        TOOL_TIMEOUT_SECONDS = timeout_seconds
+    if max_workers is not None:
+        DB_MAX_WORKERS = max_workers
+        shutdown(wait=False)
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+class _Call:
+    '''
+    One tool call on a worker thread. Remembers the thread while the call runs,
+    so a timeout can interrupt its query without hitting a later call that
+    reuses the same thread.
+    '''
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._lock = threading.Lock()
+        self._thread_ident = None
+
+    def run(self):
+        with self._lock:
+            self._thread_ident = threading.get_ident()
+        try:
+            return self.func(*self.args, **self.kwargs)
+        finally:
+            with self._lock:
+                self._thread_ident = None
+
+    def interrupt(self):
+        with self._lock:
+            if self._thread_ident is not None:
+                db.interrupt(self._thread_ident)
+
+
+def async_tool(func, timeout_seconds: Optional[float] = None):
+    '''
+    Wraps a blocking data tool as a coroutine that runs it on the shared DB executor.
+
+    The coroutine keeps the tool's name, docstring and signature, so the agent
+    sees the same tool, and returns exactly what the tool returns. If the call
+    does not finish within the timeout (queueing included), its query is
+    interrupted and an `"error"` result is returned instead.
+    '''
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        timeout = timeout_seconds if timeout_seconds is not None else TOOL_TIMEOUT_SECONDS
+        call = _Call(func, args, kwargs)
+        # Copy the caller's context so context variables (e.g. tracing) reach the worker.
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(get_executor(), context.run, call.run)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            call.interrupt()
+            return {
+                "status": "error",
+                "error_message": f"`{func.__name__}` did not finish within {timeout:g} seconds.",
+            }
+
+    return wrapper
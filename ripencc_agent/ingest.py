@@ -0,0 +1,290 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Iterator, Optional
+
+from .concentration import install_concentration, update_concentration
+from .db import DB_PATH, ensure_indexes, writable_copy
+from .materialized import install_latest_snapshots
+from .snapshot import build_snapshot, snapshot_path
+
+# Streaming bulk loader for insights.db.
+#
+#   python -m ripencc_agent.ingest ROA_MONTHLY roa_2025_08.csv --incremental
+#
+# Rows are streamed from CSV or JSON Lines dumps (a `.json` file holding one
+# array is also accepted, but is read whole) and upserted on each table's
+# natural key with batched `executemany` inside large transactions. The load
+# runs on a private copy of the DB that replaces it in one rename at the end
+# (see `db.writable_copy`): readers keep seeing the old data until then, and
+# a failed load leaves the DB as it was. Loads take turns on a lock file next
+# to the DB, so concurrent ones cannot lose each other's rows.
+#
+# The copy costs a full read and write of insights.db (and as much free disk)
+# per run, however small the dump: pass every dump of a run on one command
+# line, which loads them all into a single copy, rather than one per call.
+
+BATCH_ROWS = 5_000
+TRANSACTION_ROWS = 200_000
+
+# table -> column types, natural key, and the columns identifying one time
+# series (used by incremental loads to skip dates that are already loaded).
+TABLES = {
+    "ROA_MONTHLY": {
+        "columns": {
+            "date": "TEXT",
+            "country_code": "TEXT",
+            "ip_version": "INTEGER",
+            "percentage_space_covered_by_roa": "REAL",
+        },
+        "key": ("country_code", "ip_version", "date"),
+        "series": ("country_code", "ip_version"),
+    },
+    "Country_IPv6_Adoption": {
+        "columns": {
+            "cc": "TEXT",
+            "date": "TEXT",
+            "percentage": "REAL",
+            "source": "TEXT",
+        },
+        "key": ("cc", "source", "date"),
+        "series": ("cc", "source"),
+    },
+    "Top_4_ASNs": {
+        "columns": {
+            "date": "TEXT",
+            "cc": "TEXT",
+            "asn_name": "TEXT",
+            "asn": "TEXT",
+            "subs": "INTEGER",
+            "percentage": "REAL",
+        },
+        "key": ("cc", "date", "asn"),
+        "series": ("cc",),
+    },
+    "ASN_Subscribers": {
+        "columns": {
+            "date": "TEXT",
+            "cc": "TEXT",
+            "asn": "TEXT",
+            "asn_name": "TEXT",
+            "subs": "INTEGER",
+        },
+        "key": ("cc", "date", "asn"),
+        "series": ("cc",),
+    },
+    "Herfindahl_Hirschman_Index": {
+        "columns": {
+            "Country_Code": "TEXT",
+            "Total_Users": "INTEGER",
+            "Number_of_ASNs": "INTEGER",
+            "HHI": "REAL",
+        },
+        "key": ("Country_Code",),
+        "series": None,  # no date dimension: every load replaces the row
+    },
+}
+
+
+def _natural_key_index(table: str) -> str:
+    return f"uq_{table.lower()}_natural_key"
+
+
+def prepare_table(conn: sqlite3.Connection, table: str):
+    '''
+    Creates `table` if it does not exist yet, plus the unique index on its natural key that upserts rely on.
+    '''
+    spec = TABLES[table]
+    columns = ", ".join(f"{name} {type_}" for name, type_ in spec["columns"].items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    try:
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_natural_key_index(table)} ON {table} ({', '.join(spec['key'])})")
+    except sqlite3.IntegrityError as e:
+        raise ValueError(
+            f"{table} already holds duplicate rows for its natural key {spec['key']}; "
+            f"deduplicate it before loading ({e})."
+        )
+
+
+def upsert_sql(table: str) -> str:
+    spec = TABLES[table]
+    columns = list(spec["columns"])
+    updates = [column for column in columns if column not in spec["key"]]
+    return f'''
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+        ON CONFLICT ({", ".join(spec["key"])}) DO UPDATE
+        SET {", ".join(f"{column} = excluded.{column}" for column in updates)}
+    '''
+
+
+def read_records(path: str) -> Iterator[dict]:
+    '''
+    Streams the records of a CSV, JSON Lines or JSON array dump as dicts.
+    '''
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+    else:
+        raise ValueError(f"Unsupported dump format: {path} (expected .csv, .jsonl, .ndjson or .json)")
+
+
+def _loaded_until(conn: sqlite3.Connection, table: str) -> dict:
+    series = TABLES[table]["series"]
+    SQL = f"SELECT {', '.join(series)}, MAX(date) FROM {table} GROUP BY {', '.join(series)}"
+    return {tuple(str(value) for value in row[:-1]): row[-1] for row in conn.execute(SQL)}
+
+
+def _rows(records: Iterator[dict], table: str, loaded_until: Optional[dict], stats: dict) -> Iterator[tuple]:
+    spec = TABLES[table]
+    columns = list(spec["columns"])
+    for record in records:
+        stats["read"] += 1
+        missing = [column for column in columns if column not in record]
+        if missing:
+            raise ValueError(f"Record {stats['read']} is missing columns {missing}: {record}")
+        if loaded_until is not None:
+            series = tuple(str(record[column]) for column in spec["series"])
+            if series in loaded_until and str(record["date"]) <= loaded_until[series]:
+                stats["skipped"] += 1
+                continue
+        yield tuple(record[column] for column in columns)
+
+
+def load(conn: sqlite3.Connection, table: str, path: str, incremental: bool = False,
+         batch_rows: int = BATCH_ROWS, transaction_rows: int = TRANSACTION_ROWS, verbose: bool = True) -> dict:
+    '''
+    Streams a dump into `table` over a writable connection, upserting on the table's natural key.
+
+    With `incremental`, rows whose date is not newer than what the table already
+    holds for the same series (e.g. the same country and source) are skipped.
+
+    Returns the rows read, written and skipped.
+    '''
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table}; expected one of {sorted(TABLES)}")
+
+    stats = {"table": table, "read": 0, "written": 0, "skipped": 0}
+    started = time.perf_counter()
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    with conn:
+        prepare_table(conn, table)
+        # Snapshot and concentration triggers must exist before loading, or they would miss these rows.
+        install_latest_snapshots(conn)
+        install_concentration(conn)
+
+    incremental = incremental and TABLES[table]["series"] is not None
+    loaded_until = _loaded_until(conn, table) if incremental else None
+    rows = _rows(read_records(path), table, loaded_until, stats)
+    SQL = upsert_sql(table)
+
+    in_transaction = 0
+    conn.execute("BEGIN")
+    while True:
+        batch = list(islice(rows, batch_rows))
+        if not batch:
+            break
+        conn.executemany(SQL, batch)
+        stats["written"] += len(batch)
+        in_transaction += len(batch)
+        if in_transaction >= transaction_rows:
+            conn.commit()
+            conn.execute("BEGIN")
+            in_transaction = 0
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"{table}: {stats['written']} rows written ({stats['written'] / elapsed:,.0f} rows/sec)")
+    conn.commit()
+    return stats
+
+
+def finish(conn: sqlite3.Connection) -> dict:
+    '''
+    Recomputes the concentration metrics of the months whose ASN subscriber rows
+    changed (see `concentration.py`), adds missing indexes and refreshes planner statistics.
+    '''
+    months = update_concentration(conn)
+    ensure_indexes(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return {"concentration_months": len(months)}
+
+
+def ingest(table: str, path: str, db_path: Optional[str] = None, incremental: bool = False,
+           batch_rows: int = BATCH_ROWS, transaction_rows: int = TRANSACTION_ROWS, verbose: bool = True) -> dict:
+    '''
+    Loads one dump into `table` (see `load`) on a copy of the DB, then swaps it in.
+
+    Months whose ASN subscriber rows changed get their concentration metrics
+    recomputed (see `concentration.py`).
+
+    An existing mapped snapshot (see `snapshot.py`) is rebuilt afterwards;
+    until then, readers fall back to SQLite.
+
+    Returns the load statistics: rows read, written and skipped, months of
+    concentration metrics recomputed, elapsed seconds and rows/sec.
+    '''
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table}; expected one of {sorted(TABLES)}")
+
+    started = time.perf_counter()
+    with writable_copy(db_path) as conn:
+        stats = load(conn, table, path, incremental, batch_rows, transaction_rows, verbose)
+        stats.update(finish(conn))
+    _rebuild_snapshot(db_path, stats)
+    _timing(stats, started)
+    return stats
+
+
+def _rebuild_snapshot(db_path: Optional[str], stats: dict):
+    if os.path.exists(snapshot_path(db_path)):
+        stats["snapshot_bytes"] = build_snapshot(db_path)["bytes"]
+
+
+def _timing(stats: dict, started: float):
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_sec"] = round(stats["read"] / stats["seconds"]) if stats["seconds"] else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream CSV/JSON dumps into insights.db.")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("paths", nargs="+", help="CSV (.csv), JSON Lines (.jsonl/.ndjson) or JSON array (.json) dumps")
+    parser.add_argument("--db", default=DB_PATH, help="Path to insights.db")
+    parser.add_argument("--incremental", action="store_true", help="Only load dates newer than those already loaded")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--transaction-rows", type=int, default=TRANSACTION_ROWS)
+    args = parser.parse_args()
+
+    # One copy of the DB for every dump: the copy, not the load, dominates small runs.
+    started = time.perf_counter()
+    total = {"table": args.table, "read": 0, "written": 0, "skipped": 0}
+    with writable_copy(args.db) as conn:
+        for path in args.paths:
+            path_started = time.perf_counter()
+            stats = load(conn, args.table, path, args.incremental, args.batch_rows, args.transaction_rows)
+            _timing(stats, path_started)
+            print(json.dumps({"path": path, **stats}))
+            for key in ("read", "written", "skipped"):
+                total[key] += stats[key]
+        total.update(finish(conn))
+    _rebuild_snapshot(args.db, total)
+    _timing(total, started)
+    print(json.dumps({"paths": len(args.paths), **total}))
+
+
+if __name__ == "__main__":
+    main()
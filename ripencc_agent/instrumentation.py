@@ -0,0 +1,339 @@
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools import BaseTool, ToolContext
+
+from .db import query_stats
+
+# Hot-path instrumentation for the agents.
+#
+# Agent, model and tool callbacks (attached to every agent) measure each user
+# turn: tool wall time, SQL time, rows and result bytes per tool call, model
+# latency and tokens per model call, and sub-agent transfers per turn.
+#
+# Metrics are aggregated for every turn and written as a Prometheus text file.
+# A sampled share of turns is also written to a JSON Lines trace, one record
+# per agent run, model call and tool call, plus one for the turn. Serializing
+# results to count their bytes only happens for sampled turns.
+#
+# Nothing is written unless RIPENCC_RUNTIME_DIR (or one of the two paths
+# below) is set; metrics are still collected in memory (`metrics.render()`).
+
+RUNTIME_DIR = os.environ.get("RIPENCC_RUNTIME_DIR", "")
+TRACE_PATH = os.environ.get("RIPENCC_TRACE_PATH", os.path.join(RUNTIME_DIR, "trace.jsonl") if RUNTIME_DIR else "")
+METRICS_PATH = os.environ.get("RIPENCC_METRICS_PATH", os.path.join(RUNTIME_DIR, "metrics.prom") if RUNTIME_DIR else "")
+TRACE_SAMPLE_RATE = float(os.environ.get("RIPENCC_TRACE_SAMPLE_RATE", "0.1"))
+METRICS_FLUSH_SECONDS = float(os.environ.get("RIPENCC_METRICS_FLUSH_SECONDS", "15"))
+MAX_OPEN_TURNS = 1024  # turns that never finished (e.g. an error) are dropped past this
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROWS_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+BYTES_BUCKETS = (256, 1_024, 4_096, 16_384, 65_536, 262_144, 1_048_576)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    '''
+    Counters and histograms with labels, rendered in the Prometheus text format.
+    '''
+
+    # name -> (type, help, histogram buckets)
+    DEFINITIONS = {
+        "ripencc_turns_total": ("counter", "User turns handled.", None),
+        "ripencc_turn_seconds": ("histogram", "Wall time of a user turn.", SECONDS_BUCKETS),
+        "ripencc_turn_transfers": ("histogram", "Sub-agent transfers per user turn.", COUNT_BUCKETS),
+        "ripencc_agent_runs_total": ("counter", "Agent runs.", None),
+        "ripencc_agent_seconds": ("histogram", "Wall time of an agent run, including its sub-agents.", SECONDS_BUCKETS),
+        "ripencc_model_calls_total": ("counter", "Model calls.", None),
+        "ripencc_model_seconds": ("histogram", "Model call latency.", SECONDS_BUCKETS),
+        "ripencc_model_tokens_total": ("counter", "Tokens reported by the model, by kind (prompt, completion).", None),
+        "ripencc_tool_calls_total": ("counter", "Tool calls, by result status.", None),
+        "ripencc_tool_seconds": ("histogram", "Wall time of a tool call.", SECONDS_BUCKETS),
+        "ripencc_tool_sql_seconds": ("histogram", "SQL execution time per tool call.", SECONDS_BUCKETS),
+        "ripencc_tool_sql_queries_total": ("counter", "SQL queries run by tools.", None),
+        "ripencc_tool_rows": ("histogram", "Rows returned by SQL per tool call.", ROWS_BUCKETS),
+        "ripencc_tool_payload_bytes": ("histogram", "Serialized tool result size (sampled turns only).", BYTES_BUCKETS),
+        "ripencc_answer_cache_lookups_total": ("counter", "Answer cache lookups, by result (hit, miss, uncacheable).", None),
+        "ripencc_answer_cache_saved_model_calls_total": ("counter", "Model calls skipped by answer cache hits.", None),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in self.DEFINITIONS}  # name -> labels -> value or Histogram
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.DEFINITIONS[name][2])
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (type_, help_, _) in self.DEFINITIONS.items():
+                lines.append(f"# HELP {name} {help_}")
+                lines.append(f"# TYPE {name} {type_}")
+                for labels, value in sorted(self._values[name].items()):
+                    if type_ == "counter":
+                        lines.append(f"{name}{_labels(labels)} {value:g}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ("+Inf",), value.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}' if bound != '+Inf' else bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value.sum:g}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+metrics = Metrics()
+
+
+class Turn:
+    '''
+    Measurements of one user turn (one ADK invocation), from the first agent entered until it finishes.
+    '''
+
+    def __init__(self, agent_name: str, sampled: bool):
+        self.agent_name = agent_name
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.transfers = 0
+        self.model_calls = 0
+        self.agent_started = {}  # agent name -> perf_counter
+        self.model_started = {}  # agent name -> perf_counter
+        self.tool_calls = {}     # function call id -> (perf_counter, query stats)
+        self.records = []        # trace records, sampled turns only
+
+
+_turns = OrderedDict()  # invocation id -> Turn
+_turns_lock = threading.Lock()
+_trace_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def _turn(invocation_id: str) -> Optional[Turn]:
+    with _turns_lock:
+        return _turns.get(invocation_id)
+
+
+def turn_model_calls(invocation_id: str) -> int:
+    '''
+    Model calls completed so far in the turn of `invocation_id`.
+    '''
+    turn = _turn(invocation_id)
+    return turn.model_calls if turn is not None else 0
+
+
+def turn_agent(invocation_id: str) -> Optional[str]:
+    '''
+    The agent the turn of `invocation_id` started at, while the turn is open.
+    '''
+    turn = _turn(invocation_id)
+    return turn.agent_name if turn is not None else None
+
+
+def _record(turn: Turn, invocation_id: str, kind: str, **fields):
+    if turn.sampled:
+        turn.records.append({"ts": round(time.time(), 6), "invocation_id": invocation_id, "type": kind, **fields})
+
+
+def _write_trace(records: list):
+    if not TRACE_PATH or not records:
+        return
+    lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+    try:
+        with _trace_lock, open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(lines)
+    except OSError as e:
+        logger.warning("Could not write trace to %s: %s", TRACE_PATH, e)
+
+
+def flush_metrics(force: bool = False):
+    '''
+    Rewrites the Prometheus text file, at most once per `METRICS_FLUSH_SECONDS` unless `force`.
+    '''
+    global _last_flush
+    now = time.monotonic()
+    if not METRICS_PATH or (not force and now - _last_flush < METRICS_FLUSH_SECONDS):
+        return
+    _last_flush = now
+    temporary = f"{METRICS_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(metrics.render())
+        os.replace(temporary, METRICS_PATH)  # scrapers never see a half-written file
+    except OSError as e:
+        logger.warning("Could not write metrics to %s: %s", METRICS_PATH, e)
+
+
+def before_agent(callback_context: CallbackContext):
+    '''
+    `before_agent_callback`: opens the turn on the first agent of an invocation and times every agent run.
+    '''
+    invocation_id = callback_context.invocation_id
+    agent_name = callback_context.agent_name
+    with _turns_lock:
+        turn = _turns.get(invocation_id)
+        if turn is None:
+            turn = _turns[invocation_id] = Turn(agent_name, random.random() < TRACE_SAMPLE_RATE)
+            while len(_turns) > MAX_OPEN_TURNS:
+                _turns.popitem(last=False)
+    turn.agent_started[agent_name] = time.perf_counter()
+    return None
+
+
+def after_agent(callback_context: CallbackContext):
+    '''
+    `after_agent_callback`: records the agent run, and closes the turn when its first agent finishes.
+    '''
+    invocation_id = callback_context.invocation_id
+    agent_name = callback_context.agent_name
+    turn = _turn(invocation_id)
+    if turn is None:
+        return None
+
+    started = turn.agent_started.pop(agent_name, None)
+    if started is not None:
+        seconds = time.perf_counter() - started
+        metrics.inc("ripencc_agent_runs_total", (("agent", agent_name),))
+        metrics.observe("ripencc_agent_seconds", seconds, (("agent", agent_name),))
+        _record(turn, invocation_id, "agent", agent=agent_name, seconds=round(seconds, 6))
+
+    if agent_name == turn.agent_name:
+        with _turns_lock:
+            _turns.pop(invocation_id, None)
+        seconds = time.perf_counter() - turn.started
+        metrics.inc("ripencc_turns_total")
+        metrics.observe("ripencc_turn_seconds", seconds)
+        metrics.observe("ripencc_turn_transfers", turn.transfers)
+        _record(turn, invocation_id, "turn", agent=turn.agent_name, seconds=round(seconds, 6), transfers=turn.transfers)
+        _write_trace(turn.records)
+        flush_metrics()
+    return None
+
+
+def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    '''
+    `before_model_callback`: starts the model call timer. Goes first when an agent has several.
+    '''
+    turn = _turn(callback_context.invocation_id)
+    if turn is not None:
+        turn.model_started[callback_context.agent_name] = time.perf_counter()
+    return None
+
+
+def after_model(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    '''
+    `after_model_callback`: records model latency and token counts.
+    '''
+    invocation_id = callback_context.invocation_id
+    agent_name = callback_context.agent_name
+    turn = _turn(invocation_id)
+    if turn is None or llm_response.partial:
+        return None
+    started = turn.model_started.pop(agent_name, None)
+    if started is None:
+        return None
+
+    seconds = time.perf_counter() - started
+    turn.model_calls += 1
+    labels = (("agent", agent_name),)
+    metrics.inc("ripencc_model_calls_total", labels)
+    metrics.observe("ripencc_model_seconds", seconds, labels)
+
+    usage = llm_response.usage_metadata
+    prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+    completion_tokens = (usage.candidates_token_count or 0) if usage else 0
+    metrics.inc("ripencc_model_tokens_total", labels + (("kind", "prompt"),), prompt_tokens)
+    metrics.inc("ripencc_model_tokens_total", labels + (("kind", "completion"),), completion_tokens)
+    _record(
+        turn, invocation_id, "model", agent=agent_name, seconds=round(seconds, 6),
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+    )
+    return None
+
+
+def before_tool(tool: BaseTool, args: dict, tool_context: ToolContext) -> Optional[dict]:
+    '''
+    `before_tool_callback`: starts the tool timer and collects the SQL the tool runs.
+    '''
+    turn = _turn(tool_context.invocation_id)
+    if turn is None:
+        return None
+    if tool.name == "transfer_to_agent":
+        turn.transfers += 1
+    stats = {"queries": 0, "sql_seconds": 0.0, "rows": 0}
+    query_stats.set(stats)
+    turn.tool_calls[tool_context.function_call_id] = (time.perf_counter(), stats)
+    return None
+
+
+def after_tool(tool: BaseTool, args: dict, tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+    '''
+    `after_tool_callback`: records tool wall time, SQL time, rows and (on sampled turns) result bytes.
+    '''
+    query_stats.set(None)
+    invocation_id = tool_context.invocation_id
+    turn = _turn(invocation_id)
+    if turn is None:
+        return None
+    started, stats = turn.tool_calls.pop(tool_context.function_call_id, (None, None))
+    if started is None:
+        return None
+
+    seconds = time.perf_counter() - started
+    status = tool_response.get("status", "unknown") if isinstance(tool_response, dict) else "unknown"
+    labels = (("tool", tool.name),)
+    metrics.inc("ripencc_tool_calls_total", labels + (("agent", tool_context.agent_name), ("status", status)))
+    metrics.observe("ripencc_tool_seconds", seconds, labels)
+    if stats["queries"]:
+        metrics.inc("ripencc_tool_sql_queries_total", labels, stats["queries"])
+        metrics.observe("ripencc_tool_sql_seconds", stats["sql_seconds"], labels)
+        metrics.observe("ripencc_tool_rows", stats["rows"], labels)
+
+    if turn.sampled:
+        payload_bytes = len(json.dumps(tool_response, separators=(",", ":"), default=str))
+        metrics.observe("ripencc_tool_payload_bytes", payload_bytes, labels)
+        _record(
+            turn, invocation_id, "tool", agent=tool_context.agent_name, tool=tool.name, status=status,
+            seconds=round(seconds, 6), sql_seconds=round(stats["sql_seconds"], 6), queries=stats["queries"],
+            rows=stats["rows"], payload_bytes=payload_bytes,
+        )
+    return None
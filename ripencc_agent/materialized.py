@@ -0,0 +1,172 @@
+import sqlite3
+
+# Materialized "latest" snapshots of insights.db.
+#
+# The latest IPv6 adoption per (country, source) and the latest Top_4_ASNs /
+# ROA_MONTHLY date per country only change when new data lands, yet the tools
+# used to recompute them with a `MAX(date)` subquery on every call. These
+# tables hold the answers directly and are kept current by triggers on the
+# base tables, so every insert, update or delete (including `ingest`) refreshes
+# just the affected keys. An update can move a row to another key or lower
+# its date, so it refreshes the old key like a delete, then the new one like
+# an insert.
+
+LATEST_IPV6_ADOPTION_TABLE = "Latest_IPv6_Adoption"
+LATEST_TOP_ASN_DATE_TABLE = "Latest_Top_4_ASNs_Date"
+LATEST_ROA_DATE_TABLE = "Latest_ROA_Monthly_Date"
+
+# base table -> (snapshot table, DDL, full rebuild SQL, INSERT and DELETE trigger bodies)
+SNAPSHOTS = {
+    "Country_IPv6_Adoption": (
+        LATEST_IPV6_ADOPTION_TABLE,
+        f'''
+            CREATE TABLE IF NOT EXISTS {LATEST_IPV6_ADOPTION_TABLE} (
+                cc TEXT NOT NULL,
+                source TEXT NOT NULL,
+                date TEXT NOT NULL,
+                percentage REAL,
+                PRIMARY KEY (cc, source)
+            ) WITHOUT ROWID
+        ''',
+        f'''
+            INSERT INTO {LATEST_IPV6_ADOPTION_TABLE} (cc, source, date, percentage)
+            SELECT T1.cc, T1.source, T1.date, T1.percentage
+            FROM Country_IPv6_Adoption T1
+            INNER JOIN (
+                SELECT cc, source, MAX(date) AS MaxDate
+                FROM Country_IPv6_Adoption
+                GROUP BY cc, source
+            ) T2 ON T1.cc = T2.cc AND T1.source = T2.source AND T1.date = T2.MaxDate
+            WHERE true
+            ON CONFLICT (cc, source) DO NOTHING
+        ''',
+        {
+            "INSERT": f'''
+                INSERT INTO {LATEST_IPV6_ADOPTION_TABLE} (cc, source, date, percentage)
+                VALUES (NEW.cc, NEW.source, NEW.date, NEW.percentage)
+                ON CONFLICT (cc, source) DO UPDATE
+                SET date = excluded.date, percentage = excluded.percentage
+                WHERE excluded.date >= {LATEST_IPV6_ADOPTION_TABLE}.date;
+            ''',
+            "DELETE": f'''
+                DELETE FROM {LATEST_IPV6_ADOPTION_TABLE}
+                WHERE cc = OLD.cc AND source = OLD.source AND date = OLD.date;
+                INSERT INTO {LATEST_IPV6_ADOPTION_TABLE} (cc, source, date, percentage)
+                SELECT cc, source, date, percentage
+                FROM Country_IPv6_Adoption
+                WHERE cc = OLD.cc AND source = OLD.source
+                ORDER BY date DESC
+                LIMIT 1
+                ON CONFLICT (cc, source) DO NOTHING;
+            ''',
+        },
+    ),
+    "Top_4_ASNs": (
+        LATEST_TOP_ASN_DATE_TABLE,
+        f'''
+            CREATE TABLE IF NOT EXISTS {LATEST_TOP_ASN_DATE_TABLE} (
+                cc TEXT PRIMARY KEY,
+                date TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''',
+        f'''
+            INSERT INTO {LATEST_TOP_ASN_DATE_TABLE} (cc, date)
+            SELECT cc, MAX(date) FROM Top_4_ASNs GROUP BY cc
+        ''',
+        {
+            "INSERT": f'''
+                INSERT INTO {LATEST_TOP_ASN_DATE_TABLE} (cc, date) VALUES (NEW.cc, NEW.date)
+                ON CONFLICT (cc) DO UPDATE SET date = excluded.date
+                WHERE excluded.date > {LATEST_TOP_ASN_DATE_TABLE}.date;
+            ''',
+            "DELETE": f'''
+                DELETE FROM {LATEST_TOP_ASN_DATE_TABLE}
+                WHERE cc = OLD.cc AND NOT EXISTS (
+                    SELECT 1 FROM Top_4_ASNs WHERE cc = OLD.cc AND date = OLD.date
+                );
+                INSERT INTO {LATEST_TOP_ASN_DATE_TABLE} (cc, date)
+                SELECT cc, MAX(date) FROM Top_4_ASNs WHERE cc = OLD.cc GROUP BY cc
+                ON CONFLICT (cc) DO NOTHING;
+            ''',
+        },
+    ),
+    "ROA_MONTHLY": (
+        LATEST_ROA_DATE_TABLE,
+        f'''
+            CREATE TABLE IF NOT EXISTS {LATEST_ROA_DATE_TABLE} (
+                country_code TEXT NOT NULL,
+                ip_version TEXT NOT NULL,
+                date TEXT NOT NULL,
+                PRIMARY KEY (country_code, ip_version)
+            ) WITHOUT ROWID
+        ''',
+        f'''
+            INSERT INTO {LATEST_ROA_DATE_TABLE} (country_code, ip_version, date)
+            SELECT country_code, ip_version, MAX(date) FROM ROA_MONTHLY GROUP BY country_code, ip_version
+        ''',
+        {
+            "INSERT": f'''
+                INSERT INTO {LATEST_ROA_DATE_TABLE} (country_code, ip_version, date)
+                VALUES (NEW.country_code, NEW.ip_version, NEW.date)
+                ON CONFLICT (country_code, ip_version) DO UPDATE SET date = excluded.date
+                WHERE excluded.date > {LATEST_ROA_DATE_TABLE}.date;
+            ''',
+            "DELETE": f'''
+                DELETE FROM {LATEST_ROA_DATE_TABLE}
+                WHERE country_code = OLD.country_code AND ip_version = OLD.ip_version AND NOT EXISTS (
+                    SELECT 1 FROM ROA_MONTHLY
+                    WHERE country_code = OLD.country_code AND ip_version = OLD.ip_version AND date = OLD.date
+                );
+                INSERT INTO {LATEST_ROA_DATE_TABLE} (country_code, ip_version, date)
+                SELECT country_code, ip_version, MAX(date) FROM ROA_MONTHLY
+                WHERE country_code = OLD.country_code AND ip_version = OLD.ip_version
+                GROUP BY country_code, ip_version
+                ON CONFLICT (country_code, ip_version) DO NOTHING;
+            ''',
+        },
+    ),
+}
+
+
+def _trigger_name(base_table: str, event: str) -> str:
+    return f"trg_{base_table.lower()}_latest_{event.lower()}"
+
+
+def _trigger_sql(base_table: str, event: str, body: str) -> str:
+    return f'''CREATE TRIGGER {_trigger_name(base_table, event)}
+                    AFTER {event} ON {base_table}
+                    BEGIN
+                        {body}
+                    END'''
+
+
+def install_latest_snapshots(conn: sqlite3.Connection, rebuild: bool = False) -> list:
+    '''
+    Creates the latest-snapshot tables and their maintenance triggers for every
+    base table that exists, filling new (or, with `rebuild`, all) snapshots from
+    the base data. Triggers from an older version are replaced, and their
+    snapshots rebuilt, since they may have missed changes. Idempotent.
+
+    Returns the names of the snapshot tables that were (re)built.
+    '''
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    installed = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+    built = []
+    with conn:
+        for base_table, (snapshot_table, ddl, rebuild_sql, triggers) in SNAPSHOTS.items():
+            if base_table not in tables:
+                continue
+
+            triggers = {**triggers, "UPDATE": triggers["DELETE"] + triggers["INSERT"]}
+            sqls = {_trigger_name(base_table, event): _trigger_sql(base_table, event, body) for event, body in triggers.items()}
+            outdated = [name for name, sql in sqls.items() if installed.get(name) != sql]
+            if snapshot_table not in tables or rebuild or any(name in installed for name in outdated):
+                conn.execute(ddl)
+                conn.execute(f"DELETE FROM {snapshot_table}")
+                conn.execute(rebuild_sql)
+                built.append(snapshot_table)
+
+            for name in outdated:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                conn.execute(sqls[name])
+    return built
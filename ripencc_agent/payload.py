@@ -0,0 +1,224 @@
+import base64
+import binascii
+import json
+import os
+import zlib
+from typing import Callable, Optional
+
+import numpy as np
+
+from .db import query
+
+# Resolution, downsampling and payload budgets for tool results.
+#
+# Long ranges (ROA coverage over a decade, IPv6 adoption from five sources)
+# used to come back as every row, bloating the prompt and the model's latency.
+# Tools can aggregate into coarser buckets in SQL, downsample to N points with
+# LTTB (largest-triangle-three-buckets, which keeps the visual shape, peaks and
+# dips of a series), and every result is held to a row and byte budget.
+#
+# Tools can also page through every row instead: each page is read with
+# keyset pagination (rows after the last key of the previous page, in key
+# order) and only its rows are fetched from the cursor, so a page costs the
+# same however wide the range is. The continuation token names that key and
+# the query it belongs to. Pages are never downsampled: they are sized so a
+# full page of the tool's widest rows fits the byte budget instead.
+
+ROW_BUDGET = int(os.environ.get("RIPENCC_TOOL_ROW_BUDGET", "360"))
+BYTE_BUDGET = int(os.environ.get("RIPENCC_TOOL_BYTE_BUDGET", "32768"))
+PAGE_MAX_ROWS = int(os.environ.get("RIPENCC_TOOL_PAGE_MAX_ROWS", str(ROW_BUDGET)))
+PAGE_OVERHEAD_BYTES = 512  # status, notes and the continuation token around a page's rows
+
+# resolution -> SQL expression bucketing a 'YYYY-MM[-DD]' `date` column.
+RESOLUTIONS = {
+    "monthly": "substr(date, 1, 7)",
+    "quarterly": "substr(date, 1, 4) || '-Q' || ((CAST(substr(date, 6, 2) AS INTEGER) + 2) / 3)",
+    "yearly": "substr(date, 1, 4)",
+}
+
+
+def check_resolution(resolution: Optional[str]):
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}'; expected one of {sorted(RESOLUTIONS)}.")
+
+
+def aggregate_sql(inner_sql: str, key_columns: list, value_column: str, resolution: str) -> str:
+    '''
+    Wraps a query so its rows are averaged per `key_columns` and date bucket.
+    The bucket label (e.g. '2023-Q1') is returned in place of the date column.
+    '''
+    check_resolution(resolution)
+    keys = "".join(f"{column}, " for column in key_columns)
+    return f'''
+        SELECT {keys}{RESOLUTIONS[resolution]} AS period, ROUND(AVG({value_column}), 4)
+        FROM ({inner_sql})
+        GROUP BY {keys}period
+        ORDER BY {keys}period
+    '''
+
+
+def lttb_indices(values: np.ndarray, n: int) -> np.ndarray:
+    '''
+    Indices of the `n` points LTTB keeps out of `values`, with point positions as the x axis.
+    Always keeps the first and last point.
+    '''
+    count = len(values)
+    if n >= count or count <= 2:
+        return np.arange(count)
+    if n <= 2:
+        return np.array([0, count - 1])[:max(n, 1)]
+
+    x = np.arange(count, dtype=np.float64)
+    edges = np.linspace(1, count - 1, n - 1).astype(np.int64)
+    selected = [0]
+    for b in range(n - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        next_lo, next_hi = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else count
+        next_x = x[next_lo:max(next_hi, next_lo + 1)].mean()
+        next_y = values[next_lo:max(next_hi, next_lo + 1)].mean()
+        prev = selected[-1]
+        areas = np.abs(
+            (x[prev] - next_x) * (values[lo:hi] - values[prev])
+            - (x[prev] - x[lo:hi]) * (next_y - values[prev])
+        )
+        selected.append(lo + int(np.argmax(areas)))
+    selected.append(count - 1)
+    return np.array(selected)
+
+
+def fit_series(series: dict, value_key: str, max_points: Optional[int] = None, total_points: Optional[int] = None) -> tuple:
+    '''
+    Downsamples a map of series, each a dict of parallel lists (one of them `value_key`).
+
+    Each series is cut to at most `max_points`, and all of them together to at most
+    `total_points` (shared evenly). Returns `(series, points_before, points_after)`.
+    '''
+    before = sum(len(columns[value_key]) for columns in series.values())
+    limit = max_points
+    if total_points is not None and before > total_points and series:
+        share = max(total_points // len(series), 2)
+        limit = min(limit, share) if limit else share
+    if not limit:
+        return series, before, before
+
+    fitted = {}
+    for key, columns in series.items():
+        values = np.asarray(columns[value_key], dtype=np.float64)
+        if len(values) <= limit:
+            fitted[key] = columns
+            continue
+        keep = lttb_indices(values, limit).tolist()
+        fitted[key] = {name: [column[i] for i in keep] for name, column in columns.items()}
+    after = sum(len(columns[value_key]) for columns in fitted.values())
+    return fitted, before, after
+
+
+def payload_bytes(result: dict) -> int:
+    return len(json.dumps(result, separators=(",", ":"), default=str))
+
+
+def enforce_budget(series: dict, value_key: str, builders: list, max_points: Optional[int] = None,
+                   row_budget: Optional[int] = None, byte_budget: Optional[int] = None) -> dict:
+    '''
+    Builds a tool result from `series` within the row and byte budgets.
+
+    `builders` turn the (possibly downsampled) series into a result dict, from the
+    most readable format to the most compact; the first one that fits the byte
+    budget is used. If none fits, the series are downsampled further and the most
+    compact format is used. When points were dropped, the result carries a
+    `downsampled` note so the model knows it is not looking at every row.
+    '''
+    row_budget = row_budget or ROW_BUDGET
+    byte_budget = byte_budget or BYTE_BUDGET
+
+    fitted, before, after = fit_series(series, value_key, max_points, row_budget)
+    builder: Callable = builders[0]
+    for _ in range(8):
+        for builder in builders:
+            result = builder(fitted)
+            size = payload_bytes(result)
+            if size <= byte_budget:
+                break
+        if size <= byte_budget or after <= 2 * len(fitted):
+            break
+        target = max(int(after * byte_budget / size * 0.9), 2 * len(fitted))
+        fitted, _, after = fit_series(fitted, value_key, total_points=target)
+
+    if after < before:
+        result["downsampled"] = {
+            "method": "lttb",
+            "points": before,
+            "returned": after,
+        }
+    return result
+
+
+def keyset_sql(sql: str, key_columns: list) -> str:
+    '''
+    Wraps a query so it returns its rows after a key, in key order. The key's
+    values are bound after the query's own parameters; `key_columns` must be text.
+    '''
+    columns = ", ".join(key_columns)
+    return f'''
+        SELECT * FROM ({sql})
+        WHERE ({columns}) > ({", ".join("?" for _ in key_columns)})
+        ORDER BY {columns}
+    '''
+
+
+def _fingerprint(arguments: dict) -> int:
+    return zlib.crc32(json.dumps(arguments, sort_keys=True, default=str).encode())
+
+
+def encode_page_token(arguments: dict, key: tuple) -> str:
+    '''
+    An opaque token for the rows after `key` of the query with `arguments`.
+    '''
+    token = json.dumps({"query": _fingerprint(arguments), "after": list(key)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+
+def decode_page_token(page_token: str, arguments: dict, width: int) -> tuple:
+    '''
+    The key in `page_token`. Raises `ValueError` if it is malformed or was issued for other arguments.
+    '''
+    try:
+        token = json.loads(base64.urlsafe_b64decode(page_token + "=" * (-len(page_token) % 4)))
+        key = tuple(token["after"])
+        matches = token["query"] == _fingerprint(arguments) and len(key) == width
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid `page_token`; pass the `next_page_token` of the previous page unchanged.")
+    if not matches:
+        raise ValueError("This `page_token` belongs to a different query; repeat the arguments of the first page.")
+    return key
+
+
+def page_capacity(row_bytes: int) -> int:
+    '''
+    The most rows a page can hold when each takes up to `row_bytes` in the result.
+    '''
+    return max(1, min(PAGE_MAX_ROWS, (BYTE_BUDGET - PAGE_OVERHEAD_BYTES) // row_bytes))
+
+
+def query_page(sql: str, params: tuple, key_columns: list, key_of: Callable, arguments: dict,
+               page_token: Optional[str] = None, page_size: Optional[int] = None, row_bytes: int = 1) -> tuple:
+    '''
+    One page of `sql`'s rows, in `key_columns` order, starting after the key in `page_token`.
+
+    `key_of` takes a row to its key and `arguments` are what the query was asked
+    for, so a token cannot continue another query. Pages hold `page_size` rows,
+    at most `page_capacity(row_bytes)`, where `row_bytes` bounds the size of one
+    row in the tool's result. Returns `(rows, next_page_token)`; the token is
+    `None` on the last page.
+    '''
+    if page_size is not None and page_size < 1:
+        raise ValueError("`page_size` must be at least 1.")
+    capacity = page_capacity(row_bytes)
+    size = min(page_size or capacity, capacity)
+    after = decode_page_token(page_token, arguments, len(key_columns)) if page_token else ("",) * len(key_columns)
+    # One row more than the page tells whether there is a next page.
+    rows = query(keyset_sql(sql, key_columns), tuple(params) + after, limit=size + 1)
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_page_token(arguments, key_of(rows[-1]))
@@ -0,0 +1,259 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+import numpy as np
+
+from .db import data_version, query, table_names
+from .materialized import LATEST_IPV6_ADOPTION_TABLE
+
+# Cross-country leaderboards.
+#
+# A ranking partition is one (metric, variant, date), e.g. ROA coverage for
+# IPv4 in 2025-06, with every country's value held as arrays sorted from the
+# highest value down. Top/bottom-N is a slice and a country's rank a dict
+# lookup, so a warm ranking costs microseconds.
+#
+# Partitions are built on first use. When the DB changes, a partition is not
+# rebuilt outright: its fingerprint (row count and value checksums, one
+# indexed aggregate row) is compared with the one it was built from, and only
+# partitions whose data actually changed are re-read and re-sorted.
+
+MAX_PARTITIONS = int(os.environ.get("RIPENCC_RANKING_MAX_PARTITIONS", "512"))
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+ORDERS = ("top", "bottom")
+
+LATEST = "latest"
+
+# `variant` and `date` are column expressions, or None when the metric has no such dimension.
+RankedMetric = namedtuple("RankedMetric", "table country variant date value")
+
+METRICS = {
+    "roa_coverage": RankedMetric("ROA_MONTHLY", "country_code", "ip_version", "date", "percentage_space_covered_by_roa"),
+    "ipv6_adoption": RankedMetric("Country_IPv6_Adoption", "cc", "source", "date", "percentage"),
+    "hhi": RankedMetric("Herfindahl_Hirschman_Index", "Country_Code", None, None, "HHI"),
+}
+
+# Metrics whose countries report on different days: "latest" ranks each
+# country's latest value (with its date) from the materialized snapshot, or
+# from the fallback query when the snapshot has not been installed.
+LATEST_METRICS = {
+    "ipv6_adoption": (
+        RankedMetric(LATEST_IPV6_ADOPTION_TABLE, "cc", "source", "date", "percentage"),
+        '''(
+            SELECT T1.cc, T1.source, T1.date, T1.percentage
+            FROM Country_IPv6_Adoption T1
+            INNER JOIN (
+                SELECT cc, source, MAX(date) AS MaxDate
+                FROM Country_IPv6_Adoption
+                WHERE source = ?
+                GROUP BY cc, source
+            ) T2 ON T1.cc = T2.cc AND T1.source = T2.source AND T1.date = T2.MaxDate
+        )''',
+    ),
+}
+
+
+def _where(metric: RankedMetric, variant: Optional[str], date: Optional[str]) -> tuple:
+    conditions, params = [f"{metric.value} IS NOT NULL"], []
+    if metric.variant:
+        conditions.append(f"{metric.variant} = ?")
+        params.append(variant)
+    if metric.date and date is not None:
+        conditions.append(f"{metric.date} = ?")
+        params.append(date)
+    return " AND ".join(conditions), params
+
+
+def _partition_sql(metric: RankedMetric, variant: Optional[str], date: Optional[str], table: Optional[str] = None,
+                   table_params: tuple = ()) -> tuple:
+    '''
+    The rows and fingerprint queries of a partition, with their parameters.
+    '''
+    where, params = _where(metric, variant, None if date == LATEST else date)
+    params = list(table_params) + params
+
+    # Weighting each value by its country code makes swapped values change the checksum.
+    weight = f"(unicode({metric.country}) * 256 + unicode(substr({metric.country}, 2)))"
+    dated = f", {metric.date}" if date == LATEST else ""
+    day_checksum = f", TOTAL(julianday({metric.date}) * {weight})" if date == LATEST else ""
+    rows_sql = f"SELECT {metric.country}, {metric.value}{dated} FROM {table or metric.table} WHERE {where}"
+    fingerprint_sql = (
+        f"SELECT COUNT(*), TOTAL({metric.value}), TOTAL({metric.value} * {weight}){day_checksum} "
+        f"FROM {table or metric.table} WHERE {where}"
+    )
+    return rows_sql, fingerprint_sql, tuple(params)
+
+
+def _end_of_period(date: str) -> str:
+    '''
+    `'2024'` -> `'2024-12-31'` and `'2024-06'` -> `'2024-06-31'`, so a year or month includes its last day.
+    '''
+    return {4: f"{date}-12-31", 7: f"{date}-31"}.get(len(date), date)
+
+
+class Partition:
+    '''
+    The values of one partition sorted from highest to lowest (ties by country code).
+    '''
+
+    def __init__(self, version: tuple, fingerprint: tuple, rows: list):
+        self.version = version
+        self.fingerprint = fingerprint
+        codes = np.array([row[0] for row in rows], dtype=str)
+        values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+        order = np.lexsort((codes, -values))
+        self.codes = codes[order].tolist()
+        self.values = values[order]
+        self.dates = [rows[i][2] for i in order] if rows and len(rows[0]) > 2 else None
+        # Competition ranking: tied values share the better rank ("1, 2, 2, 4").
+        self.ranks = np.searchsorted(-self.values, -self.values, "left") + 1
+        self.positions = {code: i for i, code in enumerate(self.codes)}
+
+    def entry(self, i: int) -> dict:
+        entry = {"rank": int(self.ranks[i]), "country_code": self.codes[i], "value": round(float(self.values[i]), 4)}
+        if self.dates is not None:
+            entry["date"] = self.dates[i]
+        return entry
+
+
+class RankingIndex:
+    '''
+    Ranking partitions, revalidated against the DB when its version changes.
+    '''
+
+    def __init__(self, max_partitions: int = MAX_PARTITIONS):
+        self.max_partitions = max_partitions
+        self._partitions = OrderedDict()  # (metric, variant, date) -> Partition
+        self._dates = {}                  # (metric, variant, date) -> resolved date, for `_version`
+        self._version = None
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.revalidations = 0
+        self.reuses = 0
+
+    def _check_version(self, version: tuple):
+        if version != self._version:
+            self._version = version
+            self._dates.clear()
+
+    # The SQL runs outside `_lock`, which only guards the dicts: a slow build
+    # must not hold up lookups of other partitions. Two threads may build the
+    # same partition at once; the later one is kept.
+
+    def resolve_date(self, metric_name: str, variant: Optional[str], date: Optional[str]) -> Optional[str]:
+        '''
+        The partition date to rank for a requested date: the latest date on or before it.
+        '''
+        metric = METRICS[metric_name]
+        if metric.date is None:
+            return None
+        if date is None and metric_name in LATEST_METRICS:
+            return LATEST
+
+        key = (metric_name, variant, date)
+        version = data_version()
+        with self._lock:
+            self._check_version(version)
+            if key in self._dates:
+                return self._dates[key]
+
+        where, params = _where(metric, variant, None)
+        if date is not None:
+            where += f" AND {metric.date} <= ?"
+            params.append(_end_of_period(date))
+        rows = query(f"SELECT MAX({metric.date}) FROM {metric.table} WHERE {where}", tuple(params))
+        resolved = rows[0][0] if rows else None
+        with self._lock:
+            if self._version == version:
+                self._dates[key] = resolved
+        return resolved
+
+    def partition(self, metric_name: str, variant: Optional[str], date: Optional[str]) -> Partition:
+        metric, table, table_params = METRICS[metric_name], None, ()
+        if date == LATEST:
+            metric, fallback_table = LATEST_METRICS[metric_name]
+            if metric.table not in table_names():
+                table, table_params = fallback_table, (variant,)
+        key = (metric_name, variant, date)
+        version = data_version()
+        with self._lock:
+            self._check_version(version)
+            partition = self._partitions.get(key)
+            if partition is not None and partition.version == version:
+                self._partitions.move_to_end(key)
+                return partition
+
+        rows_sql, fingerprint_sql, params = _partition_sql(metric, variant, date, table, table_params)
+        fingerprint = tuple(query(fingerprint_sql, params)[0])
+        if partition is not None and partition.fingerprint == fingerprint:
+            with self._lock:
+                self.revalidations += 1
+                self.reuses += 1
+                partition.version = version
+                if key in self._partitions:
+                    self._partitions.move_to_end(key)
+            return partition
+
+        built = Partition(version, fingerprint, query(rows_sql, params))
+        with self._lock:
+            if partition is not None:
+                self.revalidations += 1
+            self._partitions[key] = built
+            self.builds += 1
+            self._partitions.move_to_end(key)
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+        return built
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "partitions": len(self._partitions),
+                "max_partitions": self.max_partitions,
+                "builds": self.builds,
+                "revalidations": self.revalidations,
+                "reuses": self.reuses,
+            }
+
+
+ranking_index = RankingIndex()
+
+
+def leaderboard(metric_name: str, variant: Optional[str] = None, date: Optional[str] = None,
+                limit: Optional[int] = None, order: Optional[str] = None, country_code: Optional[str] = None) -> dict:
+    '''
+    The top or bottom `limit` countries of a metric, plus `country_code`'s own
+    position if given. Raises `ValueError` for bad arguments or missing data.
+    '''
+    order = order or "top"
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}'. Use one of: {', '.join(ORDERS)}.")
+    limit = DEFAULT_LIMIT if limit is None else int(limit)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"`limit` must be between 1 and {MAX_LIMIT}.")
+
+    subject = f" for '{variant}'" if variant is not None else ""
+    resolved = ranking_index.resolve_date(metric_name, variant, date)
+    if METRICS[metric_name].date is not None and resolved is None:
+        raise ValueError(f"No data{subject} on or before {date}." if date else f"No data{subject}.")
+    partition = ranking_index.partition(metric_name, variant, resolved)
+    if not partition.codes:
+        raise ValueError(f"No data{subject}.")
+
+    positions = range(min(limit, len(partition.codes)))
+    if order == "bottom":
+        positions = [len(partition.codes) - 1 - i for i in positions]
+    result = {
+        "order": order,
+        "countries": len(partition.codes),
+        "data": [partition.entry(i) for i in positions],
+    }
+    if resolved is not None and resolved != LATEST:
+        result["date"] = resolved
+    if country_code is not None:
+        position = partition.positions.get(country_code)
+        result["country"] = partition.entry(position) if position is not None else None
+    return result
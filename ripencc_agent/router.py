@@ -0,0 +1,199 @@
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+# Deterministic pre-router for `root_agent`.
+#
+# The root agent's only job is to pick a sub-agent, which costs a full model
+# round trip before any data work starts. `route_before_model` classifies the
+# user's message with weighted keyword rules; when one sub-agent clearly wins
+# it answers the root's model call itself with a `transfer_to_agent` function
+# call, and otherwise lets the model decide.
+
+logger = logging.getLogger(__name__)
+
+PREROUTER_ENABLED = os.environ.get("RIPENCC_PREROUTER", "1") != "0"
+MIN_SCORE = 3          # evidence needed before routing without the model
+MIN_CONFIDENCE = 0.5   # (best - runner-up) / best
+
+# sub-agent name -> [(pattern, weight)], matched case-insensitively.
+ROUTES = {
+    "rpki_agent": [
+        (r"\brpki\b", 4),
+        (r"\broas?\b", 4),
+        (r"route origin", 3),
+        (r"routing security", 2),
+        (r"\bvalidat", 1),
+        (r"\bcoverage\b", 1),
+        (r"\bsecure\b", 1),
+    ],
+    "market_agent": [
+        (r"\basns?\b", 3),
+        (r"\bisps?\b", 3),
+        (r"\bhhi\b", 3),
+        (r"herfindahl", 3),
+        (r"\bcr[48]\b", 3),
+        (r"market share", 3),
+        (r"\bmarket\b", 2),
+        (r"subscribers?", 2),
+        (r"competiti", 2),
+        (r"concentrat", 2),
+        (r"\bproviders?\b", 1),
+        (r"\btop (4|four)\b", 1),
+    ],
+    "ipv6_agent": [
+        (r"\bipv6\b", 2),
+        (r"\badoption\b", 2),
+        (r"\b(google|facebook|akamai|cisco|cloudflare)\b", 1),
+    ],
+    "profile_agent": [
+        (r"\boverview\b", 4),
+        (r"\bprofile\b", 4),
+        (r"\blandscape\b", 3),
+        (r"state of (the )?internet", 3),
+        (r"\bsummar(y|ise|ize)\b", 2),
+        (r"\beverything\b", 2),
+    ],
+}
+
+_COMPILED_ROUTES = {
+    agent_name: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for agent_name, rules in ROUTES.items()
+}
+
+
+def classify(text: str) -> tuple:
+    '''
+    Scores `text` against every route.
+
+    Returns `(agent_name, confidence, scores)`, where `agent_name` is `None`
+    when no route is confident enough to skip the model.
+    '''
+    scores = {
+        agent_name: sum(weight for pattern, weight in rules if pattern.search(text))
+        for agent_name, rules in _COMPILED_ROUTES.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, runner_up_score) = ranked[0], ranked[1]
+    confidence = (best_score - runner_up_score) / best_score if best_score else 0.0
+
+    if best_score >= MIN_SCORE and confidence >= MIN_CONFIDENCE:
+        return best, confidence, scores
+    return None, confidence, scores
+
+
+class RoutingStats:
+    '''
+    Counts routing decisions and times the root model calls the router could not avoid,
+    which estimates the latency saved by the ones it did avoid.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routed = {}
+        self.fallbacks = 0
+        self.classify_seconds = 0.0
+        self.fallback_model_calls = 0
+        self.fallback_model_seconds = 0.0
+
+    def record(self, agent_name: Optional[str], classify_seconds: float):
+        with self._lock:
+            self.classify_seconds += classify_seconds
+            if agent_name:
+                self.routed[agent_name] = self.routed.get(agent_name, 0) + 1
+            else:
+                self.fallbacks += 1
+
+    def record_fallback_model_call(self, seconds: float):
+        with self._lock:
+            self.fallback_model_calls += 1
+            self.fallback_model_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routed = sum(self.routed.values())
+            decisions = routed + self.fallbacks
+            avg_model_ms = (
+                self.fallback_model_seconds / self.fallback_model_calls * 1000 if self.fallback_model_calls else None
+            )
+            return {
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "routed_ratio": routed / decisions if decisions else 0.0,
+                "avg_classify_us": self.classify_seconds / decisions * 1e6 if decisions else None,
+                "avg_root_model_ms": avg_model_ms,
+                "estimated_saved_ms": routed * avg_model_ms if avg_model_ms is not None else None,
+            }
+
+
+routing_stats = RoutingStats()
+
+_FALLBACK_STARTED = "temp:prerouter_fallback_started"
+
+
+def latest_user_text(llm_request: LlmRequest) -> Optional[str]:
+    '''
+    The text of the user's message if it is what the model is about to answer,
+    i.e. not a tool result or a turn already in progress.
+    '''
+    if not llm_request.contents:
+        return None
+    content = llm_request.contents[-1]
+    if content.role != "user" or not content.parts:
+        return None
+    if any(part.function_response for part in content.parts):
+        return None
+    text = " ".join(part.text for part in content.parts if part.text)
+    return text or None
+
+
+def route_before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    '''
+    `before_model_callback` for `root_agent`: transfers straight to a sub-agent when the classifier is confident.
+    '''
+    if not PREROUTER_ENABLED:
+        return None
+    text = latest_user_text(llm_request)
+    if text is None:
+        return None
+
+    started = time.perf_counter()
+    agent_name, confidence, scores = classify(text)
+    routing_stats.record(agent_name, time.perf_counter() - started)
+
+    decision = {
+        "agent": agent_name or "llm",
+        "confidence": round(confidence, 3),
+        "scores": scores,
+    }
+    callback_context.state["routing_decision"] = decision
+    logger.info("pre-router decision: %s", decision)
+
+    if agent_name is None:
+        callback_context.state[_FALLBACK_STARTED] = time.perf_counter()
+        return None
+
+    return LlmResponse(
+        content=types.Content(
+            role="model",
+            parts=[types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": agent_name}))],
+        )
+    )
+
+
+def record_root_model_latency(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    '''
+    `after_model_callback` for `root_agent`: times the model calls the pre-router fell back to.
+    '''
+    started = callback_context.state.get(_FALLBACK_STARTED)
+    if started is not None and not llm_response.partial:
+        routing_stats.record_fallback_model_call(time.perf_counter() - started)
+        callback_context.state[_FALLBACK_STARTED] = None
+    return None
@@ -0,0 +1,600 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import sqlite3
+import struct
+import time
+import uuid
+import zlib
+from typing import Optional
+
+# Multi-process serving with warm, preloaded workers.
+#
+#   python -m ripencc_agent.serve --workers 4 --port 8000
+#   curl -d '{"user_id": "u1", "message": "IPv6 adoption in Brazil?"}' localhost:8000/run
+#
+# The master process imports the agent tree (google.adk and every sub-agent
+# package) once, warms the data layer (country resolver, table list,
+# time-series engine, snapshot) and then, before its event loop starts, forks
+# a template process: a synchronous copy of the warm master that forks the
+# `--workers` workers on request. The workers inherit the warm interpreter:
+# nothing is imported or loaded twice, and the read-only data stays shared
+# copy-on-write (the master closes its DB connections and thread pool and
+# freezes the GC before forking, so neither the children's connections nor a
+# collection touch the shared pages). No process is ever forked from inside
+# a running event loop.
+#
+# The master serves HTTP and only forwards turns; each worker runs its own
+# event loop with a Runner and handles many turns concurrently. A session is
+# pinned to one worker by a hash of its id, so its turns run one at a time in
+# one process, next to its result and answer caches. A worker that dies is
+# re-forked by the template under the same index, so the pinning holds; with
+# `--session-db` its sessions survive too.
+#
+# Master and workers talk over a socket pair per worker, in length-prefixed
+# JSON frames. The master passes the template the worker's end of each new
+# pair; the template reports the pids it forked and reaped on a control
+# socket, in the same frames. Every worker writes its own metrics and trace
+# files (`metrics.worker<N>.prom`). `GET /health` reports the workers and the
+# startup times: preload, warm-up, fork to ready per worker, and total.
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get("RIPENCC_SERVE_WORKERS", str(os.cpu_count() or 1)))
+HOST = os.environ.get("RIPENCC_SERVE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("RIPENCC_SERVE_PORT", "8000"))
+SESSION_DB_URL = os.environ.get("RIPENCC_SESSION_DB_URL") or None
+READY_TIMEOUT_SECONDS = 60   # fork until a worker takes turns
+STOP_TIMEOUT_SECONDS = 30    # for in-flight turns when stopping, before workers are killed
+REAP_POLL_SECONDS = 0.05
+
+APP_NAME = "ripencc_agent"
+FRAME_HEADER = struct.Struct("!I")  # length of the JSON body that follows
+
+
+class WorkerLost(RuntimeError):
+    '''
+    The worker of a session exited before answering the turn.
+    '''
+
+
+def preload():
+    '''
+    Imports the agent tree. Returns `root_agent` and the seconds it took.
+    '''
+    started = time.perf_counter()
+    from .agent import root_agent
+    return root_agent, time.perf_counter() - started
+
+
+def _walk(agent):
+    yield agent
+    for sub_agent in agent.sub_agents:
+        yield from _walk(sub_agent)
+
+
+def warm(agent) -> dict:
+    '''
+    Loads what every worker would otherwise load on its first turns, and returns the seconds per step.
+    Data steps fail softly (e.g. no DB yet): the workers then load it themselves.
+    '''
+    from google.adk.tools import FunctionTool
+
+    from . import db
+    from .countries import resolve_country
+    from .snapshot import get_snapshot
+    from .timeseries import get_engine
+
+    steps = {
+        "countries": lambda: resolve_country("germany"),
+        "tables": db.table_names,
+        "timeseries": get_engine,
+        "snapshot": get_snapshot,
+        # ADK builds every tool's declaration from its signature on each model call.
+        "tools": lambda: [
+            (tool if isinstance(tool, FunctionTool) else FunctionTool(tool))._get_declaration()
+            for agent_ in _walk(agent) for tool in getattr(agent_, "tools", []) if callable(tool) or isinstance(tool, FunctionTool)
+        ],
+    }
+    seconds = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Warm-up step %s failed, workers will load it themselves: %s", name, e)
+        seconds[name] = round(time.perf_counter() - started, 6)
+    return seconds
+
+
+def prepare_for_fork():
+    '''
+    Leaves the master without threads or open DB connections, and moves its objects out of the GC's reach.
+    '''
+    from . import db, executor
+
+    db.close_all()
+    executor.shutdown()
+    gc.collect()
+    gc.freeze()  # a collection in a worker would otherwise write to every shared page
+
+
+def _frame(message: dict) -> bytes:
+    body = json.dumps(message, default=str).encode()
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def _write_frame(writer: asyncio.StreamWriter, message: dict):
+    writer.write(_frame(message))
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[dict]:
+    '''
+    The next frame, or `None` once the other side is gone.
+    '''
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        return json.loads(await reader.readexactly(FRAME_HEADER.unpack(header)[0]))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def _worker_path(path: str, index: int) -> str:
+    '''
+    Example:
+        >>> _worker_path("/run/ripencc/metrics.prom", 2)
+        '/run/ripencc/metrics.worker2.prom'
+    '''
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker{index}{extension}"
+
+
+_session_turns = {}  # session id -> (lock, turns running or waiting)
+
+
+@contextlib.asynccontextmanager
+async def _session_turn(session_id: str):
+    '''
+    Runs the turns of one session one at a time, in arrival order.
+    '''
+    lock, turns = _session_turns.get(session_id, (None, 0))
+    lock = lock or asyncio.Lock()
+    _session_turns[session_id] = (lock, turns + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, turns = _session_turns[session_id]
+        if turns == 1:
+            del _session_turns[session_id]
+        else:
+            _session_turns[session_id] = (lock, turns - 1)
+
+
+async def _run_turn(runner, request: dict, writer: asyncio.StreamWriter):
+    from google.genai import types
+
+    started = time.perf_counter()
+    reply, error = None, None
+    service = runner.session_service
+    key = {"app_name": APP_NAME, "user_id": request["user_id"], "session_id": request["session_id"]}
+    try:
+        async with _session_turn(request["session_id"]):
+            if await service.get_session(**key) is None:
+                await service.create_session(**key)
+            async for event in runner.run_async(
+                user_id=request["user_id"], session_id=request["session_id"],
+                new_message=types.Content(role="user", parts=[types.Part(text=request["message"])]),
+            ):
+                if event.is_final_response() and event.content and event.content.parts:
+                    reply = "".join(part.text for part in event.content.parts if part.text and not part.thought)
+    except Exception as e:  # reported to the caller; the worker keeps serving
+        logger.exception("Turn %s failed", request["id"])
+        error = repr(e)
+    _write_frame(writer, {"id": request["id"], "reply": reply, "error": error, "seconds": round(time.perf_counter() - started, 6)})
+
+
+async def _serve_worker(index: int, sock: socket.socket, agent, session_db: Optional[str]):
+    from google.adk.runners import Runner
+    from google.adk.sessions import DatabaseSessionService, InMemorySessionService
+
+    from . import instrumentation
+
+    if instrumentation.METRICS_PATH:
+        instrumentation.METRICS_PATH = _worker_path(instrumentation.METRICS_PATH, index)
+    if instrumentation.TRACE_PATH:
+        instrumentation.TRACE_PATH = _worker_path(instrumentation.TRACE_PATH, index)
+
+    service = DatabaseSessionService(db_url=session_db) if session_db else InMemorySessionService()
+    runner = Runner(app_name=APP_NAME, agent=agent, session_service=service)
+    reader, writer = await asyncio.open_connection(sock=sock)
+    _write_frame(writer, {"ready": os.getpid()})
+
+    turns = set()
+    while (request := await _read_frame(reader)) is not None:
+        turn = asyncio.create_task(_run_turn(runner, request, writer))
+        turns.add(turn)
+        turn.add_done_callback(turns.discard)
+        await writer.drain()
+    # The master is gone or stopping: finish what was taken on.
+    if turns:
+        await asyncio.gather(*turns, return_exceptions=True)
+    instrumentation.flush_metrics(force=True)
+    writer.close()
+
+
+def _worker_main(index: int, sock: socket.socket, agent, session_db: Optional[str], inherited: list):
+    '''
+    Body of a worker forked by the template; never returns.
+    '''
+    code = 1
+    try:
+        for other in inherited:
+            other.close()
+        asyncio.run(_serve_worker(index, sock, agent, session_db))
+        code = 0
+    except BaseException:
+        logger.exception("Worker %d failed", index)
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+def _serve_template(control: socket.socket, agent, session_db: Optional[str]):
+    '''
+    Forks a worker for every index the master sends (with the worker's end of
+    its socket pair), and reports the pid of each worker forked and reaped.
+    '''
+    workers = {}  # pid -> index
+    control.settimeout(REAP_POLL_SECONDS)
+    while True:
+        while workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            control.sendall(_frame({"exited": workers.pop(pid), "pid": pid, "code": os.waitstatus_to_exitcode(status)}))
+        try:
+            message, fds, _, _ = socket.recv_fds(control, FRAME_HEADER.size, 1)
+        except TimeoutError:
+            continue
+        if not message:
+            break
+        (index,) = FRAME_HEADER.unpack(message)
+        worker_end = socket.socket(fileno=fds[0])
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            _worker_main(index, worker_end, agent, session_db, [control])
+        worker_end.close()
+        workers[pid] = index
+        control.sendall(_frame({"forked": index, "pid": pid}))
+    # The master is gone: its workers see their sockets close, finish their turns and exit.
+    while workers:
+        pid, _ = os.wait()
+        workers.pop(pid, None)
+
+
+def _template_main(control: socket.socket, agent, session_db: Optional[str], inherited: list):
+    '''
+    Body of the template process; never returns.
+    '''
+    code = 1
+    try:
+        for other in inherited:
+            other.close()
+        # Ctrl-C reaches the whole group; the master stops the workers and the template.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        _serve_template(control, agent, session_db)
+        code = 0
+    except BaseException:
+        logger.exception("Template process failed")
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+class Worker:
+    '''
+    The master's handle on one forked worker.
+    '''
+
+    def __init__(self, index: int, sock: socket.socket):
+        self.index = index
+        self.pid = None            # reported by the template once forked
+        self.sock = sock
+        self.forked = time.perf_counter()
+        self.ready_seconds = None  # fork request until the worker took turns
+        self.ready = None          # future, set once attached
+        self.writer = None
+        self.pending = {}          # request id -> future of the response frame
+
+    def info(self) -> dict:
+        return {
+            "index": self.index,
+            "pid": self.pid,
+            "ready": self.ready_seconds is not None,
+            "ready_seconds": round(self.ready_seconds, 6) if self.ready_seconds is not None else None,
+            "pending": len(self.pending),
+        }
+
+
+class WorkerPool:
+    '''
+    Has the template fork the workers, routes turns to them by session and replaces any that exit.
+    '''
+
+    def __init__(self, agent, size: int, session_db: Optional[str] = None, inherited: tuple = ()):
+        if size < 1:
+            raise ValueError("At least one worker is needed")
+        self.agent = agent
+        self.session_db = session_db
+        self.inherited = list(inherited)  # sockets of the master the workers must not hold (the listener)
+        self.workers = [None] * size
+        self.restarts = 0
+        self.template_pid = None
+        self._control = None         # master end of the control socket to the template
+        self._control_writer = None
+        self._exits = {}             # worker index -> future of its exit code, reported by the template
+        self._next_id = 0
+        self._stopping = False
+
+    def _start_template(self):
+        master_end, template_end = socket.socketpair()
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            master_end.close()
+            _template_main(template_end, self.agent, self.session_db, self.inherited)
+        template_end.close()
+        self._control, self.template_pid = master_end, pid
+
+    def fork(self, index: int) -> Worker:
+        '''
+        Asks the template to fork worker `index`. Raises `OSError` if the template is gone.
+        '''
+        master_end, worker_end = socket.socketpair()
+        try:
+            socket.send_fds(self._control, [FRAME_HEADER.pack(index)], [worker_end.fileno()])
+        except OSError:
+            master_end.close()
+            raise
+        finally:
+            worker_end.close()
+        self.workers[index] = Worker(index, master_end)
+        return self.workers[index]
+
+    def fork_all(self):
+        '''
+        Forks the template and has it fork every worker. Call before the event loop starts, after `prepare_for_fork`.
+        '''
+        self._start_template()
+        for index in range(len(self.workers)):
+            self.fork(index)
+
+    async def _attach(self, worker: Worker):
+        worker.ready = asyncio.get_running_loop().create_future()
+        reader, worker.writer = await asyncio.open_connection(sock=worker.sock)
+        asyncio.create_task(self._read(worker, reader))
+
+    async def start(self, timeout: float = READY_TIMEOUT_SECONDS):
+        reader, self._control_writer = await asyncio.open_connection(sock=self._control)
+        asyncio.create_task(self._read_control(reader))
+        for worker in self.workers:
+            await self._attach(worker)
+        await asyncio.wait_for(asyncio.gather(*(worker.ready for worker in self.workers)), timeout)
+
+    def _exit(self, index: int) -> asyncio.Future:
+        if index not in self._exits:
+            self._exits[index] = asyncio.get_running_loop().create_future()
+        return self._exits[index]
+
+    async def _read_control(self, reader: asyncio.StreamReader):
+        # A worker is only replaced once its exit was reported, so an index names one worker at a time.
+        while (frame := await _read_frame(reader)) is not None:
+            if "forked" in frame:
+                self.workers[frame["forked"]].pid = frame["pid"]
+            else:
+                self._exit(frame["exited"]).set_result(frame["code"])
+        if not self._stopping:
+            logger.error("The template process exited; workers that exit will not be replaced")
+
+    async def _wait_exit(self, worker: Worker, timeout: float) -> Optional[int]:
+        '''
+        Waits for the template to reap `worker`, killing it after `timeout`. Returns its exit code.
+        '''
+        exited = self._exit(worker.index)
+        try:
+            try:
+                return await asyncio.wait_for(asyncio.shield(exited), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Worker %d (pid %s) did not exit in %ss; killing it", worker.index, worker.pid, timeout)
+            if worker.pid is not None:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(worker.pid, signal.SIGKILL)
+            with contextlib.suppress(asyncio.TimeoutError):
+                return await asyncio.wait_for(asyncio.shield(exited), timeout)
+            return None  # the template is gone too
+        finally:
+            self._exits.pop(worker.index, None)
+
+    async def _read(self, worker: Worker, reader: asyncio.StreamReader):
+        while (frame := await _read_frame(reader)) is not None:
+            if "ready" in frame:
+                worker.ready_seconds = time.perf_counter() - worker.forked
+                worker.ready.set_result(True)
+                continue
+            future = worker.pending.pop(frame["id"], None)
+            if future is not None and not future.done():
+                future.set_result(frame)
+        await self._lost(worker)
+
+    async def _lost(self, worker: Worker):
+        lost = WorkerLost(f"Worker {worker.index} (pid {worker.pid}) exited")
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(lost)
+        worker.pending.clear()
+        if not worker.ready.done():
+            worker.ready.set_exception(lost)
+            worker.ready.exception()  # retrieved: only waiting turns care
+        worker.writer.close()
+        if self._stopping:
+            return
+        code = await self._wait_exit(worker, STOP_TIMEOUT_SECONDS)
+        logger.warning("Worker %d (pid %s) exited with %s; forking a new one", worker.index, worker.pid, code)
+        try:
+            replacement = self.fork(worker.index)
+        except OSError as e:
+            logger.error("Cannot replace worker %d: %s", worker.index, e)
+            return
+        self.restarts += 1
+        await self._attach(replacement)
+
+    def worker_index(self, session_id: str) -> int:
+        return zlib.crc32(session_id.encode()) % len(self.workers)
+
+    async def run_turn(self, user_id: str, session_id: str, message: str) -> dict:
+        '''
+        Runs a turn on the worker of `session_id`. Returns the response frame plus the worker's index and pid.
+        Raises `WorkerLost` if the worker exits first.
+        '''
+        worker = self.workers[self.worker_index(session_id)]
+        await asyncio.wait_for(asyncio.shield(worker.ready), READY_TIMEOUT_SECONDS)
+        self._next_id += 1
+        future = worker.pending[self._next_id] = asyncio.get_running_loop().create_future()
+        _write_frame(worker.writer, {"id": self._next_id, "user_id": user_id, "session_id": session_id, "message": message})
+        await worker.writer.drain()
+        return {**await future, "worker": worker.index, "pid": worker.pid}
+
+    async def stop(self, timeout: float = STOP_TIMEOUT_SECONDS):
+        '''
+        Closes the workers' sockets, so they finish their turns and exit, waits for them, then stops the template.
+        '''
+        self._stopping = True
+        for worker in self.workers:
+            worker.writer.close()
+        await asyncio.gather(*(self._wait_exit(worker, timeout) for worker in self.workers))
+        self._control_writer.close()
+        await _reap(self.template_pid, timeout)
+
+    def info(self) -> list:
+        return [worker.info() for worker in self.workers]
+
+
+async def _reap(pid: int, timeout: float) -> Optional[int]:
+    '''
+    Waits for a child of the master (the template) to exit, killing it after `timeout`. Returns its exit code.
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            done, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            return None
+        if done:
+            return os.waitstatus_to_exitcode(status)
+        if time.monotonic() > deadline:
+            logger.warning("Process %d did not exit in %ss; killing it", pid, timeout)
+            os.kill(pid, signal.SIGKILL)
+            deadline = float("inf")
+        await asyncio.sleep(REAP_POLL_SECONDS)
+
+
+def create_app(pool: WorkerPool, startup: dict):
+    '''
+    The HTTP front end of the master: `POST /run` and `GET /health`.
+    '''
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class TurnRequest(BaseModel):
+        user_id: str
+        message: str
+        session_id: Optional[str] = None
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await pool.start()
+        startup["ready_seconds"] = round(time.perf_counter() - startup.pop("started"), 6)
+        startup["workers_ready_seconds"] = [worker.info()["ready_seconds"] for worker in pool.workers]
+        logger.info("Serving with %d workers: %s", len(pool.workers), json.dumps(startup))
+        yield
+        await pool.stop()
+
+    app = FastAPI(title=APP_NAME, lifespan=lifespan)
+
+    @app.post("/run")
+    async def run(request: TurnRequest) -> dict:
+        session_id = request.session_id or uuid.uuid4().hex
+        try:
+            response = await pool.run_turn(request.user_id, session_id, request.message)
+        except (WorkerLost, asyncio.TimeoutError) as e:
+            raise HTTPException(status_code=503, detail=str(e) or "Worker not ready")
+        if response["error"]:
+            raise HTTPException(status_code=500, detail=response["error"])
+        return {
+            "session_id": session_id,
+            "reply": response["reply"],
+            "worker": response["worker"],
+            "seconds": response["seconds"],
+        }
+
+    @app.get("/health")
+    async def health() -> dict:
+        return {"pid": os.getpid(), "template_pid": pool.template_pid, "workers": pool.info(), "restarts": pool.restarts, "startup": startup}
+
+    return app
+
+
+def _load_hook(spec: str):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the agent from warm, preloaded worker processes.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--session-db", default=SESSION_DB_URL, help="SQLAlchemy URL for a DatabaseSessionService (default: in memory)")
+    parser.add_argument("--prepare", help="module:function called with root_agent in the master before warming, e.g. to swap the model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    # ADK's ParallelAgent (profile_agent) ends its tracing spans in another
+    # context; OpenTelemetry logs a harmless traceback for each one.
+    logging.getLogger("opentelemetry.context").setLevel(logging.CRITICAL)
+    startup = {"started": time.perf_counter()}
+
+    agent, startup["preload_seconds"] = preload()
+    if args.prepare:
+        _load_hook(args.prepare)(agent)
+    started = time.perf_counter()
+    startup["warmup"] = warm(agent)
+    startup["warmup_seconds"] = round(time.perf_counter() - started, 6)
+    startup["preload_seconds"] = round(startup["preload_seconds"], 6)
+
+    import uvicorn  # installed with google-adk
+
+    listener = socket.create_server((args.host, args.port), backlog=2048)
+    pool = WorkerPool(agent, args.workers, args.session_db, inherited=(listener,))
+    prepare_for_fork()
+    pool.fork_all()
+    server = uvicorn.Server(uvicorn.Config(create_app(pool, startup), log_level="warning"))
+    try:
+        asyncio.run(server.serve(sockets=[listener]))
+    except KeyboardInterrupt:  # uvicorn re-raises the signal it stopped on
+        pass
+
+
+if __name__ == "__main__":
+    main()
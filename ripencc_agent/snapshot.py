@@ -0,0 +1,424 @@
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from . import db
+
+# Memory-mapped binary snapshot of the insights data.
+#
+#   python -m ripencc_agent.snapshot build    # writes insights.snap next to insights.db
+#   python -m ripencc_agent.snapshot info
+#
+# Every worker process warms its own SQLite page cache and parses SQL for the
+# same few lookups. The snapshot compiles the tables the per-country tools
+# read into one read-only file: fixed-width numeric columns, strings interned
+# into one sorted table (so a column of strings is a column of uint32 ids whose
+# order is the strings' order), and per table an index from country to its
+# block of rows. Tools map the file and slice it without copying, so every
+# process shares one physical copy through the OS page cache.
+#
+# The snapshot records the version of the DB it was compiled from. A missing,
+# unreadable or stale snapshot (the DB changed since) is ignored and the tools
+# query SQLite as before; `ingest` rebuilds an existing snapshot after loading.
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.environ.get("RIPENCC_SNAPSHOT", "1") != "0"
+SNAPSHOT_PATH = os.environ.get("RIPENCC_SNAPSHOT_PATH")  # default: next to the DB, as .snap
+
+MAGIC = b"RIPESNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")  # magic, format version, manifest bytes
+ALIGNMENT = 8
+
+# Column types, their on-disk dtypes and the value stored for NULL.
+DTYPES = {"str": np.dtype("<u4"), "int": np.dtype("<i8"), "float": np.dtype("<f8")}
+NULL_ID = np.iinfo(np.uint32).max
+NULL_INT = np.iinfo(np.int64).min
+
+# table -> (columns with their types, row order). The first column is the
+# country the index is built on; within a country, rows keep the given order.
+TABLES = {
+    "ROA_MONTHLY": (
+        (("country_code", "str"), ("ip_version", "int"), ("date", "str"), ("percentage_space_covered_by_roa", "float")),
+        "country_code, ip_version, date",
+    ),
+    "Country_IPv6_Adoption": (
+        (("cc", "str"), ("source", "str"), ("date", "str"), ("percentage", "float")),
+        "cc, source, date",
+    ),
+    "Top_4_ASNs": (
+        (("cc", "str"), ("date", "str"), ("subs", "int"), ("asn_name", "str"), ("asn", "str"), ("percentage", "float")),
+        "cc, date, subs DESC",
+    ),
+    "Herfindahl_Hirschman_Index": (
+        (("Country_Code", "str"), ("Total_Users", "int"), ("Number_of_ASNs", "int"), ("HHI", "float")),
+        "Country_Code",
+    ),
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_path(db_path: Optional[str] = None) -> str:
+    return SNAPSHOT_PATH or os.path.splitext(db_path or db.DB_PATH)[0] + ".snap"
+
+
+def _encode_column(values: list, kind: str, string_ids: dict, table: str, column: str) -> np.ndarray:
+    try:
+        if kind == "str":
+            return np.array([NULL_ID if value is None else string_ids[value] for value in values], dtype=DTYPES[kind])
+        if kind == "int":
+            if any(not isinstance(value, int) for value in values if value is not None):
+                raise TypeError("not an integer")
+            return np.array([NULL_INT if value is None else value for value in values], dtype=DTYPES[kind])
+        return np.array([np.nan if value is None else float(value) for value in values], dtype=DTYPES[kind])
+    except (KeyError, TypeError, ValueError) as e:
+        raise SnapshotError(f"{table}.{column} holds a value that is not {kind}: {e}") from e
+
+
+def build_snapshot(db_path: Optional[str] = None, path: Optional[str] = None) -> dict:
+    '''
+    Compiles the tables in `TABLES` that exist in the DB into a snapshot file,
+    written next to the DB unless `path` is given. The file is replaced
+    atomically, so processes still mapping the previous one are unaffected.
+
+    Returns the path, its size, the rows per table and the seconds it took.
+    '''
+    db_path = db_path or db.DB_PATH
+    path = path or snapshot_path(db_path)
+    started = time.perf_counter()
+    source = db.data_version(db_path)
+
+    conn = db.connect_writable(db_path)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        tables = {}
+        for table, (columns, order) in TABLES.items():
+            if table in existing:
+                names = ", ".join(column for column, _ in columns)
+                tables[table] = conn.execute(f"SELECT {names} FROM {table} ORDER BY {order}").fetchall()
+    finally:
+        conn.close()
+    if db.data_version(db_path) != source:
+        raise SnapshotError(f"{db_path} changed while the snapshot was built; run it again.")
+
+    strings = sorted({
+        value
+        for table, rows in tables.items()
+        for i, (_, kind) in enumerate(TABLES[table][0]) if kind == "str"
+        for value in (row[i] for row in rows) if value is not None
+    }, key=lambda value: value.encode())
+    string_ids = {value: i for i, value in enumerate(strings)}
+
+    sections = []  # (name, array or bytes), laid out in this order
+
+    encoded = [value.encode() for value in strings]
+    sections.append(("strings.offsets", np.cumsum([0] + [len(value) for value in encoded], dtype=np.uint64)))
+    sections.append(("strings.data", b"".join(encoded)))
+
+    manifest_tables = {}
+    for table, rows in tables.items():
+        columns = TABLES[table][0]
+        for i, (column, kind) in enumerate(columns):
+            sections.append((f"{table}.{column}", _encode_column([row[i] for row in rows], kind, string_ids, table, column)))
+        index_column, _ = columns[0]
+        keys = sections[-len(columns)][1]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        sections.append((f"{table}.index.keys", keys[starts]))
+        sections.append((f"{table}.index.starts", np.r_[starts, len(keys)].astype(np.uint64)))
+        manifest_tables[table] = {"rows": len(rows), "columns": dict(columns), "index": index_column}
+
+    # The manifest holds the offset of every section and the sections start after
+    # it, so lay them out again until the offsets no longer change its size.
+    built_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    offsets = {name: 0 for name, _ in sections}
+    while True:
+        manifest_bytes = json.dumps({
+            "source": list(source),
+            "built_at": built_at,
+            "strings": len(strings),
+            "tables": manifest_tables,
+            "sections": {name: [offsets[name], len(data) if isinstance(data, bytes) else data.nbytes] for name, data in sections},
+        }).encode()
+        position, laid_out = HEADER.size + len(manifest_bytes), {}
+        for name, data in sections:
+            position += -position % ALIGNMENT
+            laid_out[name] = position
+            position += len(data) if isinstance(data, bytes) else data.nbytes
+        if laid_out == offsets:
+            break
+        offsets = laid_out
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        for name, data in sections:
+            f.write(b"\0" * (offsets[name] - f.tell()))
+            f.write(data if isinstance(data, bytes) else data.tobytes())
+    os.replace(temporary, path)
+
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "rows": {table: len(rows) for table, rows in tables.items()},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+class StringTable:
+    '''
+    The interned strings, sorted. Each is decoded once, on first access. Supports `bisect`.
+    '''
+
+    def __init__(self, offsets: np.ndarray, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+        self._decoded = [None] * (len(offsets) - 1)
+
+    def __len__(self) -> int:
+        return len(self._decoded)
+
+    def __getitem__(self, i: int) -> str:
+        value = self._decoded[i]
+        if value is None:
+            value = self._decoded[i] = str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        return value
+
+    def find(self, value: str) -> Optional[int]:
+        i = bisect.bisect_left(self, value)
+        return i if i < len(self) and self[i] == value else None
+
+
+class SnapshotTable:
+    '''
+    One table of a snapshot: its columns as arrays over the mapped file, and the country index.
+    '''
+
+    def __init__(self, snapshot: "Snapshot", name: str, meta: dict):
+        self.name = name
+        self.strings = snapshot.strings
+        self.types = meta["columns"]
+        self.columns = {column: snapshot.array(f"{name}.{column}", DTYPES[kind]) for column, kind in self.types.items()}
+        self.index_keys = snapshot.array(f"{name}.index.keys", DTYPES["str"])
+        self.index_starts = snapshot.array(f"{name}.index.starts", np.dtype("<u8"))
+        self._spans = None  # key -> (start, end), read from the index on first use
+
+    def span(self, key: str) -> tuple:
+        '''
+        The `[start, end)` rows of `key` (a country code).
+        '''
+        if self._spans is None:
+            starts = self.index_starts.tolist()
+            self._spans = {self.strings[key_id]: (starts[i], starts[i + 1]) for i, key_id in enumerate(self.index_keys.tolist())}
+        return self._spans.get(key, (0, 0))
+
+    def _encode(self, column: str, value):
+        kind = self.types[column]
+        try:
+            if kind == "str":
+                return self.strings.find(str(value))
+            return int(value) if kind == "int" else float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _rows(self, key: str, where: Optional[dict], start: Optional[str], end: Optional[str]) -> np.ndarray:
+        lo, hi = self.span(key)
+        mask = None
+        for column, value in (where or {}).items():
+            if isinstance(value, (list, tuple)):
+                encoded = [item for item in (self._encode(column, item) for item in value) if item is not None]
+                matches = np.isin(self.columns[column][lo:hi], encoded)
+            else:
+                encoded = self._encode(column, value)
+                if encoded is None:
+                    return np.arange(0)
+                matches = self.columns[column][lo:hi] == encoded
+            mask = matches if mask is None else mask & matches
+        # Ids sort like their strings, so string bounds become id bounds.
+        if start is not None:
+            matches = self.columns["date"][lo:hi] >= bisect.bisect_left(self.strings, start)
+            mask = matches if mask is None else mask & matches
+        if end is not None:
+            matches = self.columns["date"][lo:hi] < bisect.bisect_right(self.strings, end)
+            mask = matches if mask is None else mask & matches
+        return np.arange(lo, hi) if mask is None else lo + np.flatnonzero(mask)
+
+    def _decode(self, rows: np.ndarray, columns: tuple) -> list:
+        decoded = []
+        for column in columns:
+            values = self.columns[column][rows]
+            kind = self.types[column]
+            if kind == "str":
+                decoded.append([None if value == NULL_ID else self.strings[value] for value in values.tolist()])
+            elif kind == "int":
+                decoded.append([None if value == NULL_INT else value for value in values.tolist()])
+            else:
+                decoded.append([None if value != value else value for value in values.tolist()])
+        return list(zip(*decoded))
+
+    def select(self, key: str, columns: tuple, where: Optional[dict] = None,
+               start: Optional[str] = None, end: Optional[str] = None) -> list:
+        '''
+        The `columns` of `key`'s rows matching `where` (column -> value, or a list of
+        values) with a `date` between `start` and `end` (inclusive), in stored order.
+        '''
+        return self._decode(self._rows(key, where, start, end), columns)
+
+    def latest(self, key: str, columns: tuple, group: Optional[str] = None, where: Optional[dict] = None) -> list:
+        '''
+        Like `select`, but only the rows at the latest date of `key`, or of each value of `group`.
+        '''
+        rows = self._rows(key, where, None, None)
+        if not len(rows):
+            return []
+        dates = self.columns["date"][rows]
+        if group is None:
+            latest = dates == dates.max()
+        else:
+            # Within a country, rows are stored grouped, so each group is one run.
+            groups = self.columns[group][rows]
+            first = np.empty(len(rows), dtype=bool)
+            first[0] = True
+            np.not_equal(groups[1:], groups[:-1], out=first[1:])
+            latest = dates == np.maximum.reduceat(dates, np.flatnonzero(first))[np.cumsum(first) - 1]
+        return self._decode(rows[latest], columns)
+
+
+class Snapshot:
+    '''
+    A snapshot file mapped read-only. Raises `SnapshotError` if it is not a snapshot of this format.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stale = False  # set once found stale, so that is only logged once
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise SnapshotError(f"{path} is not a snapshot: {e}") from e
+        self._buffer = memoryview(self._mmap)
+
+        try:
+            magic, version, manifest_bytes = HEADER.unpack_from(self._buffer)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} snapshot.")
+            self.manifest = json.loads(str(self._buffer[HEADER.size:HEADER.size + manifest_bytes], "utf-8"))
+            self.source = tuple(self.manifest["source"])
+            self.strings = StringTable(self.array("strings.offsets", np.dtype("<u8")), self.section("strings.data"))
+            self.tables = {name: SnapshotTable(self, name, meta) for name, meta in self.manifest["tables"].items()}
+        except (struct.error, KeyError, ValueError) as e:
+            raise SnapshotError(f"{path} is not a readable snapshot: {e}") from e
+
+    def section(self, name: str) -> memoryview:
+        offset, size = self.manifest["sections"][name]
+        if offset + size > len(self._buffer):
+            raise SnapshotError(f"{self.path} is truncated.")
+        return self._buffer[offset:offset + size]
+
+    def array(self, name: str, dtype: np.dtype) -> np.ndarray:
+        return np.frombuffer(self.section(name), dtype=dtype)
+
+    def info(self) -> dict:
+        return {
+            "path": self.path,
+            "bytes": self.signature[1],
+            "built_at": self.manifest["built_at"],
+            "strings": self.manifest["strings"],
+            "tables": {name: meta["rows"] for name, meta in self.manifest["tables"].items()},
+        }
+
+
+_snapshots = {}  # path -> Snapshot, or the signature of a file that is not one
+_snapshots_lock = threading.Lock()
+
+
+def _open(path: str) -> Optional[Snapshot]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+    opened = _snapshots.get(path)
+    if isinstance(opened, Snapshot) and opened.signature == signature:
+        return opened
+    if opened == signature:
+        return None
+
+    with _snapshots_lock:
+        opened = _snapshots.get(path)
+        if isinstance(opened, Snapshot) and opened.signature == signature:
+            return opened
+        try:
+            opened = Snapshot(path)
+        except (OSError, SnapshotError) as e:
+            logger.warning("ignoring snapshot: %s", e)
+            _snapshots[path] = signature
+            return None
+        _snapshots[path] = opened
+        return opened
+
+
+def get_snapshot() -> Optional[Snapshot]:
+    '''
+    The snapshot of the current DB version, or `None` if it is disabled, missing, unreadable or stale.
+    '''
+    if not SNAPSHOT_ENABLED:
+        return None
+    snapshot = _open(snapshot_path())
+    if snapshot is None:
+        return None
+    try:
+        version = db.data_version()
+    except OSError:
+        return None
+    if snapshot.source != version:
+        if not snapshot.stale:
+            snapshot.stale = True
+            logger.warning("ignoring stale snapshot %s: the DB changed since it was built", snapshot.path)
+        return None
+    return snapshot
+
+
+def snapshot_table(name: str) -> Optional[SnapshotTable]:
+    '''
+    `name` from the current snapshot, or `None` if the tools should query SQLite.
+    '''
+    snapshot = get_snapshot()
+    return snapshot.tables.get(name) if snapshot is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the memory-mapped snapshot of insights.db.")
+    parser.add_argument("--db", default=db.DB_PATH, help="Path to insights.db")
+    parser.add_argument("--out", help="Snapshot path (default: next to the DB, as .snap)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="Compile the snapshot from the DB")
+    commands.add_parser("info", help="Describe the snapshot and whether it is current")
+    args = parser.parse_args()
+
+    path = args.out or snapshot_path(args.db)
+    if args.command == "build":
+        print(json.dumps(build_snapshot(args.db, path), indent=2))
+        return
+    snapshot = Snapshot(path)
+    print(json.dumps({**snapshot.info(), "current": snapshot.source == db.data_version(args.db)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
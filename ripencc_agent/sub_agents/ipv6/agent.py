@@ -2,7 +2,10 @@ from google.adk import Agent
 # Assuming get_country_ipv6_adoption_rate is in the same 'tools' module or accessible.
 # For demonstration purposes, I'll assume it's imported correctly.
 # In a real scenario, you'd place get_country_ipv6_adoption_rate in your 'tools.py' file.
-from .tools import get_country_ipv6_adoption_rate 
+from .tools import get_country_ipv6_adoption_rate_async, get_ipv6_adoption_ranking_async, get_ipv6_adoption_rate_batch_async, get_ipv6_adoption_trend_async
+from ...answer_cache import answer_from_cache, remember_answer, skip_answer_on_tool_error
+from ...compaction import compact_history, end_turn, note_answer, note_tool
+from ...instrumentation import after_agent, after_model, after_tool, before_agent, before_model, before_tool
 
 ipv6_agent = Agent(  # Changed name here
     name="ipv6_agent",  # Changed name here
@@ -30,10 +33,40 @@ ipv6_agent = Agent(  # Changed name here
          - "How has IPv6 adoption progressed in the US?"
          - "Compare Cisco and Cloudflare IPv6 adoption for Germany."
 
+    2. Use `get_ipv6_adoption_rate_batch` instead of calling `get_country_ipv6_adoption_rate` several times when the user:
+       - Compares IPv6 adoption across several countries, optionally for specific sources.
+       - Phrases like:
+         - "Compare IPv6 adoption in NL, DE and FR."
+         - "Google vs Akamai IPv6 adoption for Japan and Korea since 2022."
+
+    3. Use `get_ipv6_adoption_trend` when the user asks how adoption has changed rather than for raw values:
+       - Growth, trends, year-over-year change, CAGR, peaks or moving averages.
+       - Phrases like:
+         - "IPv6 adoption trend in the US."
+         - "How fast is IPv6 growing in India according to Google?"
+         - "When did IPv6 adoption in Brazil peak?"
+
+    4. Use `get_ipv6_adoption_ranking` for questions across all countries, instead of calling the other tools per country:
+       - Highest or lowest adoption, top/bottom N countries, or where one country ranks, for one source.
+       - Phrases like:
+         - "Top 10 IPv6 adopters per Google"
+         - "Which countries have the lowest IPv6 adoption according to Akamai?"
+         - "Where does Brazil rank for IPv6 adoption?"
+
     Constraints:
     - Stick to the data the tool returns — do not interpret, guess, or reword results.
     - If the tool returns an "error" status, present the `error_message` directly and clearly.
+    - Countries may be passed by ISO code or by name. If a tool reports an unknown country with `suggestions`, ask the user which of them they meant.
+    - For ranges spanning several years, pass `resolution='quarterly'` or `'yearly'` instead of fetching every point.
+    - If a result has a `downsampled` field, mention that only the returned points are shown out of the total.
+    - Only when the user needs every point of a long range (e.g. a full export), pass `page_size` and fetch further pages with each `next_page_token` as `page_token`.
     - Do not respond to requests outside the domain of IPv6 data as provided by your tools.
     """,
-    tools=[get_country_ipv6_adoption_rate]
+    tools=[get_country_ipv6_adoption_rate_async, get_ipv6_adoption_rate_batch_async, get_ipv6_adoption_trend_async, get_ipv6_adoption_ranking_async],
+    before_agent_callback=before_agent,
+    after_agent_callback=[end_turn, after_agent],
+    before_model_callback=[before_model, answer_from_cache, compact_history],
+    after_model_callback=[after_model, remember_answer, note_answer],
+    before_tool_callback=before_tool,
+    after_tool_callback=[after_tool, skip_answer_on_tool_error, note_tool],
 )
\ No newline at end of file
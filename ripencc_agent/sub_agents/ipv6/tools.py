@@ -1,7 +1,159 @@
-import sqlite3
+import json
 from typing import Optional
 
-def get_country_ipv6_adoption_rate(country_code: str, source: Optional[str] = None, specific_date: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
+from ...cache import cached_tool, session_memoized
+from ...db import query, table_names
+from ...executor import async_tool
+from ...materialized import LATEST_IPV6_ADOPTION_TABLE
+from ...payload import aggregate_sql, check_resolution, enforce_budget, query_page
+from ...rankings import leaderboard
+from ...snapshot import SnapshotTable, snapshot_table
+from ...timeseries import get_engine, summarize
+
+IPV6_ADOPTION_TABLE = "Country_IPv6_Adoption"
+ADOPTION_COLUMNS = ("cc", "date", "percentage", "source")
+
+# Set-based queries behind `get_ipv6_adoption_rate_batch`. Country and source
+# lists are bound as JSON arrays so each statement text stays constant.
+BATCH_COUNTRIES = "cc IN (SELECT value FROM json_each(?))"
+BATCH_SOURCES = "source IN (SELECT value FROM json_each(?))"
+
+OUTPUT_FORMATS = ("rows", "columnar")
+# Upper bound of one entry of `data` in the rows format, for sizing pages.
+ADOPTION_ROW_BYTES = 100
+
+ADOPTION_BATCH_LATEST_SQL = {
+    has_sources: f'''
+        SELECT T1.cc, T1.source, T1.date, T1.percentage
+        FROM {IPV6_ADOPTION_TABLE} T1
+        INNER JOIN (
+            SELECT cc, source, MAX(date) AS MaxDate
+            FROM {IPV6_ADOPTION_TABLE}
+            WHERE {BATCH_COUNTRIES}{f" AND {BATCH_SOURCES}" if has_sources else ""}
+            GROUP BY cc, source
+        ) T2 ON T1.cc = T2.cc AND T1.source = T2.source AND T1.date = T2.MaxDate
+        ORDER BY T1.cc, T1.source
+    '''
+    for has_sources in (False, True)
+}
+
+ADOPTION_BATCH_LATEST_SNAPSHOT_SQL = {
+    has_sources: f'''
+        SELECT cc, source, date, percentage
+        FROM {LATEST_IPV6_ADOPTION_TABLE}
+        WHERE {BATCH_COUNTRIES}{f" AND {BATCH_SOURCES}" if has_sources else ""}
+        ORDER BY cc, source
+    '''
+    for has_sources in (False, True)
+}
+
+ADOPTION_BATCH_RANGE_SQL = {
+    has_sources: f'''
+        SELECT cc, source, date, percentage
+        FROM {IPV6_ADOPTION_TABLE}
+        WHERE {BATCH_COUNTRIES}{f" AND {BATCH_SOURCES}" if has_sources else ""}
+        AND date >= ?
+        AND date <= ?
+        ORDER BY cc, source, date
+    '''
+    for has_sources in (False, True)
+}
+
+
+def _build_adoption_query(country_code: str, source: Optional[str], specific_date: Optional[str], start_date: Optional[str], end_date: Optional[str], latest_snapshot: bool = False, resolution: Optional[str] = None) -> tuple:
+    '''
+    Builds the SQL and parameters for `get_country_ipv6_adoption_rate`.
+    The query text depends only on which filters are set, so each variant is
+    prepared once per pooled connection. With `latest_snapshot`, the default
+    (latest per source) branch reads the materialized `Latest_IPv6_Adoption` table.
+    With `resolution`, date ranges are averaged per source and period, and the
+    rows come back as `(cc, source, period, percentage)`.
+    '''
+    if specific_date:
+        SQL_QUERY = f'''
+            SELECT cc, date, percentage, source
+            FROM {IPV6_ADOPTION_TABLE}
+            WHERE cc = ? AND date = ?
+        '''
+        params = [country_code, specific_date]
+        if source:
+            SQL_QUERY += " AND source = ?"
+            params.append(source)
+        return SQL_QUERY, tuple(params)
+    elif start_date or end_date:
+        SQL_QUERY = f'''
+            SELECT cc, date, percentage, source
+            FROM {IPV6_ADOPTION_TABLE}
+            WHERE cc = ?
+        '''
+        params = [country_code]
+        if source:
+            SQL_QUERY += " AND source = ?"
+            params.append(source)
+        if start_date:
+            SQL_QUERY += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            SQL_QUERY += " AND date <= ?"
+            params.append(end_date)
+        if resolution:
+            SQL_QUERY = aggregate_sql(SQL_QUERY, ["cc", "source"], "percentage", resolution)
+        return SQL_QUERY, tuple(params)
+    elif latest_snapshot: # Default, served from the materialized snapshot
+        SQL_QUERY = f'''
+            SELECT cc, date, percentage, source
+            FROM {LATEST_IPV6_ADOPTION_TABLE}
+            WHERE cc = ?
+        '''
+        params = [country_code]
+        if source:
+            SQL_QUERY += " AND source = ?"
+            params.append(source)
+        return SQL_QUERY, tuple(params)
+    else: # Default: get latest for each source
+        # Subquery to find the maximum date for each source for the given country
+        subquery_conditions = "WHERE cc = ?"
+        subquery_params = [country_code]
+        if source:
+            subquery_conditions += " AND source = ?"
+            subquery_params.append(source)
+
+        SQL_QUERY = f'''
+            SELECT T1.cc, T1.date, T1.percentage, T1.source
+            FROM {IPV6_ADOPTION_TABLE} T1
+            INNER JOIN (
+                SELECT source, MAX(date) AS MaxDate
+                FROM {IPV6_ADOPTION_TABLE}
+                {subquery_conditions}
+                GROUP BY source
+            ) T2 ON T1.source = T2.source AND T1.date = T2.MaxDate
+            WHERE T1.cc = ?
+        '''
+        # The outer query's WHERE clause may also need to filter by source if provided
+        outer_where_params = [country_code]
+        if source:
+            SQL_QUERY += " AND T1.source = ?"
+            outer_where_params.append(source)
+
+        # Combine subquery parameters and outer query parameters for the final execution
+        full_params = subquery_params + outer_where_params
+        return SQL_QUERY, tuple(full_params)
+
+
+def _snapshot_adoption_rows(snapshot: SnapshotTable, country_code: str, source: Optional[str], specific_date: Optional[str], start_date: Optional[str], end_date: Optional[str]) -> list:
+    '''
+    The rows `_build_adoption_query` selects (without `resolution`), read from the mapped snapshot.
+    '''
+    where = {"source": source} if source else {}
+    if specific_date:
+        return snapshot.select(country_code, ADOPTION_COLUMNS, {**where, "date": specific_date})
+    if start_date or end_date:
+        return snapshot.select(country_code, ADOPTION_COLUMNS, where, start_date, end_date)
+    return snapshot.latest(country_code, ADOPTION_COLUMNS, "source", where)
+
+
+@cached_tool
+def get_country_ipv6_adoption_rate(country_code: str, source: Optional[str] = None, specific_date: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, resolution: Optional[str] = None, max_points: Optional[int] = None, output_format: Optional[str] = None, page_size: Optional[int] = None, page_token: Optional[str] = None):
     '''
     Retrieves the IPv6 adoption rate for a given country, optionally filtered by data source and date.
 
@@ -13,11 +165,20 @@ def get_country_ipv6_adoption_rate(country_code: str, source: Optional[str] = No
     - "What's the latest IPv6 adoption rate for Japan?"
 
     Args:
-    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for.
+    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for. A country name (e.g., `'Netherlands'`) is accepted too.
     - `source` (str, optional): The data source for IPv6 adoption. Can be one of 'google', 'facebook', 'akamai', 'cisco', 'cloudflare'. If not provided, data from all available sources for the country will be returned.
     - `specific_date` (str, optional): A specific date in 'YYYY-MM-DD' format to retrieve the adoption rate for. If provided, `start_date` and `end_date` will be ignored.
     - `start_date` (str, optional): The start date of a range in 'YYYY-MM-DD' format. Used for fetching data over a period.
     - `end_date` (str, optional): The end date of a range in 'YYYY-MM-DD' format. Used for fetching data over a period.
+    - `resolution` (str, optional): For date ranges only: `'monthly'`, `'quarterly'` or `'yearly'` returns the average
+        adoption per source and month (`'2023-01'`), quarter (`'2023-Q1'`) or year (`'2023'`) instead of every measurement.
+        Prefer it for ranges longer than a year.
+    - `max_points` (int, optional): Return at most this many points per source, picked to keep the shape of the curve (peaks and dips).
+    - `output_format` (str, optional): `'rows'` (default) or `'columnar'`. Large results switch to `'columnar'` automatically.
+    - `page_size` (int, optional): For date ranges only: page through every measurement, by source and then date, this many
+        per page (larger sizes are cut to what fits one response), instead of getting a downsampled range at once.
+        `max_points` does not apply to pages.
+    - `page_token` (str, optional): The `next_page_token` of the previous page, to get the next one. Keep the other arguments unchanged.
 
     Returns:
     A `dict` with the following structure:
@@ -32,7 +193,14 @@ def get_country_ipv6_adoption_rate(country_code: str, source: Optional[str] = No
             - `date` (str): The date of the adoption rate measurement (e.g., 'YYYY-MM-DD').
             - `percentage` (float): The IPv6 adoption rate as a percentage.
             - `source` (str): The source of the adoption data.
+    - `format` (str): Present only for the columnar format, as `"columnar"`. `country_code` is then given once and
+        `data` is a dict of three parallel lists: `source`, `date` and `percentage`.
+    - `resolution` (str): Present only if the rows were aggregated to a `resolution`.
+    - `downsampled` (dict): Present only if points were left out to keep the result small: the `method`,
+        the number of `points` available and the number `returned`. Ask for a coarser `resolution` or a shorter range for more detail.
+    - `next_page_token` (str): Present only when paging and more measurements follow. Pass it as `page_token` for the next page.
     - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
 
     Example:
     {
@@ -54,94 +222,306 @@ def get_country_ipv6_adoption_rate(country_code: str, source: Optional[str] = No
     }
     '''
 
-    DB_PATH = "ripencc_agent/data/insights.db"
-    IPV6_ADOPTION_TABLE = "Country_IPv6_Adoption"
+    try:
+        check_resolution(resolution)
+        if output_format is not None and output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output_format '{output_format}'; expected one of {list(OUTPUT_FORMATS)}.")
+        if specific_date or not (start_date or end_date):
+            resolution = None  # single measurements per source: nothing to aggregate
+            page_size = page_token = None  # nor to page through
+        paged = page_size is not None or page_token is not None
+        next_page_token = None
+
+        snapshot = snapshot_table(IPV6_ADOPTION_TABLE)
+        if paged:
+            SQL_QUERY, params = _build_adoption_query(country_code, source, None, start_date, end_date, resolution=resolution)
+            rows, next_page_token = query_page(
+                SQL_QUERY, params, ["source", "period" if resolution else "date"],
+                (lambda row: (row[1], row[2])) if resolution else (lambda row: (row[3], row[1])),
+                {"country_code": country_code, "source": source, "start_date": start_date, "end_date": end_date, "resolution": resolution},
+                page_token, page_size, ADOPTION_ROW_BYTES,
+            )
+        elif snapshot is not None and not resolution:
+            rows = _snapshot_adoption_rows(snapshot, country_code, source, specific_date, start_date, end_date)
+        else:
+            latest_snapshot = LATEST_IPV6_ADOPTION_TABLE in table_names()
+            SQL_QUERY, params = _build_adoption_query(country_code, source, specific_date, start_date, end_date, latest_snapshot, resolution)
+            rows = query(SQL_QUERY, params)
+        if resolution:
+            rows = [(cc_val, period, percentage_val, source_val) for cc_val, source_val, period, percentage_val in rows]
+
+        series = {}
+        for cc_val, date_val, percentage_val, source_val in rows:
+            columns = series.setdefault(source_val, {"date": [], "percentage": []})
+            columns["date"].append(date_val)
+            columns["percentage"].append(percentage_val)
+
+        def with_notes(result: dict) -> dict:
+            if resolution:
+                result["resolution"] = resolution
+            if next_page_token:
+                result["next_page_token"] = next_page_token
+            return result
+
+        def as_rows(series: dict) -> dict:
+            data = []
+            for source_val, columns in series.items():
+                for date_val, percentage_val in zip(columns["date"], columns["percentage"]):
+                    data.append({
+                        "country_code": country_code,
+                        "date": date_val,
+                        "percentage": percentage_val,
+                        "source": source_val
+                    })
+            return with_notes({
+                "status": "success",
+                "data": data
+            })
+
+        def as_columns(series: dict) -> dict:
+            data = {"source": [], "date": [], "percentage": []}
+            for source_val, columns in series.items():
+                data["source"] += [source_val] * len(columns["date"])
+                data["date"] += columns["date"]
+                data["percentage"] += columns["percentage"]
+            return with_notes({
+                "status": "success",
+                "format": "columnar",
+                "country_code": country_code,
+                "data": data
+            })
+
+        builders = [as_columns] if output_format == "columnar" else [as_rows, as_columns]
+        if paged:
+            return builders[0](series)
+        return enforce_budget(series, "percentage", builders, max_points)
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_ipv6_adoption_rate_batch(country_codes: list[str], sources: Optional[list[str]] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    '''
+    Retrieves IPv6 adoption rates for several countries (and optionally several sources) in a single call.
+
+    Use this tool instead of calling `get_country_ipv6_adoption_rate` repeatedly when a question compares countries, e.g.
+    "Compare IPv6 adoption in NL, DE and FR" or "Google vs Akamai IPv6 adoption for Japan and Korea since 2022".
+
+    Args:
+    - `country_codes` (list[str]): ISO 3166-1 alpha-2 country codes (e.g., `['NL', 'DE']`), or country names.
+    - `sources` (list[str], optional): Data sources to include, any of 'google', 'facebook', 'akamai', 'cisco', 'cloudflare'. All sources if not provided.
+    - `start_date` (str, optional): The start date of a range in 'YYYY-MM-DD' format.
+    - `end_date` (str, optional): The end date of a range in 'YYYY-MM-DD' format.
+      If neither `start_date` nor `end_date` is provided, the latest entry per country and source is returned.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `data` (dict): Present only if status is `"success"`. Maps each country code to three parallel lists:
+        `source`, `date` and `percentage`, one position per measurement. Countries without data are omitted.
+    - `downsampled` (dict): Present only if points were left out to keep the result small: the `method`,
+        the number of `points` available and the number `returned`.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
 
+    Example:
+    {
+        "status": "success",
+        "data": {
+            "NL": {"source": ["akamai", "google"], "date": ["2023-01-15", "2023-01-15"], "percentage": [48.2, 50.5]},
+            "DE": {"source": ["akamai", "google"], "date": ["2023-01-15", "2023-01-15"], "percentage": [65.3, 70.1]}
+        }
+    }
+    '''
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        if not country_codes:
+            raise ValueError("`country_codes` must contain at least one country code.")
 
-        data = []
-        SQL_QUERY = ""
-        params = []
+        params = [json.dumps(list(dict.fromkeys(country_codes)))]
+        if sources:
+            params.append(json.dumps(list(dict.fromkeys(sources))))
 
-        if specific_date:
-            SQL_QUERY = f'''
-                SELECT cc, date, percentage, source
-                FROM {IPV6_ADOPTION_TABLE}
-                WHERE cc = ? AND date = ?
-            '''
-            params = [country_code, specific_date]
-            if source:
-                SQL_QUERY += " AND source = ?"
-                params.append(source)
-            cursor.execute(SQL_QUERY, tuple(params))
-            rows = cursor.fetchall()
+        snapshot = snapshot_table(IPV6_ADOPTION_TABLE)
+        if snapshot is not None:
+            where = {"source": list(sources)} if sources else {}
+            columns = ("cc", "source", "date", "percentage")
+            rows = [
+                row
+                for cc in sorted(set(country_codes))
+                for row in (
+                    snapshot.select(cc, columns, where, start_date, end_date) if start_date or end_date
+                    else snapshot.latest(cc, columns, "source", where)
+                )
+            ]
         elif start_date or end_date:
-            SQL_QUERY = f'''
-                SELECT cc, date, percentage, source
-                FROM {IPV6_ADOPTION_TABLE}
-                WHERE cc = ?
-            '''
-            params = [country_code]
-            if source:
-                SQL_QUERY += " AND source = ?"
-                params.append(source)
-            if start_date:
-                SQL_QUERY += " AND date >= ?"
-                params.append(start_date)
-            if end_date:
-                SQL_QUERY += " AND date <= ?"
-                params.append(end_date)
-            cursor.execute(SQL_QUERY, tuple(params))
-            rows = cursor.fetchall()
-        else: # Default: get latest for each source
-            # Subquery to find the maximum date for each source for the given country
-            subquery_conditions = "WHERE cc = ?"
-            subquery_params = [country_code]
-            if source:
-                subquery_conditions += " AND source = ?"
-                subquery_params.append(source)
-
-            SQL_QUERY = f'''
-                SELECT T1.cc, T1.date, T1.percentage, T1.source
-                FROM {IPV6_ADOPTION_TABLE} T1
-                INNER JOIN (
-                    SELECT source, MAX(date) AS MaxDate
-                    FROM {IPV6_ADOPTION_TABLE}
-                    {subquery_conditions}
-                    GROUP BY source
-                ) T2 ON T1.source = T2.source AND T1.date = T2.MaxDate
-                WHERE T1.cc = ?
-            '''
-            # The outer query's WHERE clause may also need to filter by source if provided
-            outer_where_params = [country_code]
-            if source:
-                SQL_QUERY += " AND T1.source = ?"
-                outer_where_params.append(source)
-
-            # Combine subquery parameters and outer query parameters for the final execution
-            full_params = subquery_params + outer_where_params
-            cursor.execute(SQL_QUERY, tuple(full_params))
-            rows = cursor.fetchall()
+            # Open-ended ranges: any 'YYYY-MM-DD' string sorts between these bounds.
+            params += [start_date or "0000", end_date or "9999"]
+            rows = query(ADOPTION_BATCH_RANGE_SQL[bool(sources)], tuple(params))
+        elif LATEST_IPV6_ADOPTION_TABLE in table_names():
+            rows = query(ADOPTION_BATCH_LATEST_SNAPSHOT_SQL[bool(sources)], tuple(params))
+        else:
+            rows = query(ADOPTION_BATCH_LATEST_SQL[bool(sources)], tuple(params))
 
-        for cc_val, date_val, percentage_val, source_val in rows:
-            data.append({
-                "country_code": cc_val,
-                "date": date_val,
-                "percentage": percentage_val,
-                "source": source_val
-            })
+        # Downsampled per (country, source), so each source keeps its own curve.
+        series = {}
+        for cc_val, source_val, date_val, percentage_val in rows:
+            columns = series.setdefault((cc_val, source_val), {"date": [], "percentage": []})
+            columns["date"].append(date_val)
+            columns["percentage"].append(percentage_val)
 
-        conn.close()
+        def by_country(series: dict) -> dict:
+            data = {}
+            for (cc_val, source_val), columns in series.items():
+                country = data.setdefault(cc_val, {"source": [], "date": [], "percentage": []})
+                country["source"] += [source_val] * len(columns["date"])
+                country["date"] += columns["date"]
+                country["percentage"] += columns["percentage"]
+            return {
+                "status": "success",
+                "data": data
+            }
+
+        return enforce_budget(series, "percentage", [by_country])
 
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_ipv6_adoption_trend(country_code: str, source: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, window_months: Optional[int] = None, include_series: Optional[bool] = None):
+    '''
+    Computes trend statistics of IPv6 adoption for a country over a time window, per data source.
+
+    Use this tool instead of `get_country_ipv6_adoption_rate` when the user asks how adoption has *changed* rather than for
+    raw values, e.g. "IPv6 adoption trend in the US", "How fast is IPv6 growing in India according to Google?" or
+    "When did IPv6 adoption in Brazil peak?". The statistics are computed server-side, so present them as returned.
+
+    Args:
+    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`). A country name (e.g., `'Netherlands'`) is accepted too.
+    - `source` (str, optional): One of 'google', 'facebook', 'akamai', 'cisco', 'cloudflare'. All available sources if not provided.
+    - `start_date` (str, optional): The beginning of the window in 'YYYY-MM-DD' format. Defaults to the first available date.
+    - `end_date` (str, optional): The end of the window in 'YYYY-MM-DD' format. Defaults to the latest available date.
+    - `window_months` (int, optional): Length of the trailing moving average in months. Defaults to 3.
+    - `include_series` (bool, optional): Also return the measurements and moving average. Defaults to False.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `trends` (dict): Present only if status is `"success"`. Maps each source to its adoption percentages over the window:
+        - `points` (int): Number of measurements in the window.
+        - `start` / `end` (dict): First and last `date` and `value`.
+        - `change` (float): `end` minus `start`, in percentage points.
+        - `min` / `max` (dict): Lowest and highest `date` and `value`.
+        - `mean` (float): Average adoption.
+        - `moving_average` (dict): `window_months` and the `latest` trailing average.
+        - `yoy_change` (dict or null): `from`, `to` and `delta` (percentage points) between the latest value and the value a year earlier.
+        - `cagr_pct` (float or null): Compound annual growth rate of adoption, in percent.
+        - `slope_per_year` (float or null): Least-squares trend, in percentage points per year.
+        - `series` (dict): Only with `include_series`; parallel lists `date`, `value` and `moving_average`.
+      Sources without measurements in the window are omitted.
+    - `downsampled` (dict): Present only if points of the `series` were left out to keep the result small: the `method`,
+        the number of `points` in the window and the number `returned`.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+    '''
+    try:
+        table = get_engine().ipv6
+        keys = [(country_code, source)] if source else table.keys(country_code)
+        trends = {}
+        for key in keys:
+            if key in table.index:
+                trend = summarize(table, key, start_date, end_date, window_months or 3, bool(include_series))
+                if trend is not None:
+                    trends[key[1]] = trend
+
+        if not trends:
+            raise ValueError(f"No IPv6 adoption data for {country_code}{f' from {source}' if source else ''} in the requested window.")
+
+        def build(series: dict) -> dict:
+            return {
+                "status": "success",
+                "country_code": country_code,
+                "trends": {name: {**trend, "series": series[name]} if name in series else trend for name, trend in trends.items()}
+            }
+
+        series = {name: trend.pop("series") for name, trend in trends.items()} if include_series else {}
+        return enforce_budget(series, "value", [build])
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_ipv6_adoption_ranking(source: str, date: Optional[str] = None, limit: Optional[int] = None, order: Optional[str] = None, country_code: Optional[str] = None):
+    """
+    Ranks all countries by IPv6 adoption as measured by one source.
+
+    Use this tool for cross-country questions instead of calling the per-country tools for every country, e.g.
+    "Top 10 IPv6 adopters per Google", "Which countries have the lowest IPv6 adoption according to Akamai?" or
+    "Where does Brazil rank for IPv6 adoption?".
+
+    Args:
+    - `source` (str): The measurement source to rank by: `'google'`, `'facebook'`, `'akamai'`, `'cisco'` or `'cloudflare'`.
+      Rankings never mix sources; use `'google'` when the user does not name one.
+    - `date` (str, optional): The day to rank, as `YYYY-MM-DD`, `YYYY-MM` or `YYYY`; the latest measurement day on or before it is used.
+      Defaults to each country's latest measurement.
+    - `limit` (int, optional): Number of countries to return, 1-100. Defaults to 10.
+    - `order` (str, optional): `'top'` (highest adoption first, the default) or `'bottom'` (lowest first).
+    - `country_code` (str, optional): An ISO 3166-1 alpha-2 country code whose own rank should also be returned. A country name (e.g., `'Netherlands'`) is accepted too.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `source` (str): The source ranked.
+    - `date` (str): Only with `date`; the measurement day ranked, in `YYYY-MM-DD` format.
+    - `order` (str): `"top"` or `"bottom"`.
+    - `countries` (int): Number of countries ranked.
+    - `data` (list): The ranked countries, each with `rank` (1 = highest adoption), `country_code` and `value` (adoption percentage).
+      Without `date`, each entry also has the `date` of that country's latest measurement.
+    - `country` (dict or null): Only with `country_code`; its entry, or null if it has no data.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "source": "google",
+        "order": "top",
+        "countries": 190,
+        "data": [
+            {"rank": 1, "country_code": "FR", "value": 85.1, "date": "2025-07-14"},
+            {"rank": 2, "country_code": "IN", "value": 76.3, "date": "2025-07-14"}
+        ]
+    }
+    """
+    try:
         return {
             "status": "success",
-            "data": data
+            "source": source,
+            **leaderboard("ipv6_adoption", source, date, limit, order, country_code),
         }
 
     except Exception as e:
         return {
             "status": "error",
             "error_message": str(e)
-        }
\ No newline at end of file
+        }
+
+
+# Async variants registered on the agent: same name, docstring and results,
+# but the query runs on the DB executor instead of the event loop, and results
+# are memoized in the session for follow-up questions.
+get_country_ipv6_adoption_rate_async = session_memoized(async_tool(get_country_ipv6_adoption_rate))
+get_ipv6_adoption_rate_batch_async = session_memoized(async_tool(get_ipv6_adoption_rate_batch))
+get_ipv6_adoption_trend_async = session_memoized(async_tool(get_ipv6_adoption_trend))
+get_ipv6_adoption_ranking_async = session_memoized(async_tool(get_ipv6_adoption_ranking))
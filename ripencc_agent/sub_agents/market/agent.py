@@ -1,5 +1,8 @@
 from google.adk import Agent
-from .tools import get_top_four_asns, get_country_asn_hhi
+from .tools import get_asn_concentration_series_async, get_asn_hhi_ranking_async, get_country_asn_hhi_async, get_top_four_asns_async
+from ...answer_cache import answer_from_cache, remember_answer, skip_answer_on_tool_error
+from ...compaction import compact_history, end_turn, note_answer, note_tool
+from ...instrumentation import after_agent, after_model, after_tool, before_agent, before_model, before_tool
 
 market_agent = Agent( 
     name="market_agent",
@@ -12,10 +15,10 @@ market_agent = Agent(
     instruction="""
     You are a domain expert in market data, with current specialization in ASN (Autonomous System Number) and ISP (Internet Service Provider) market dynamics.
 
-    Use the available tools to respond to country-specific questions involving:
+    Use the available tools to respond to questions involving:
     - Top ASNs or ISPs in a country
     - ISP subscriber shares and market distribution
-    - Market concentration metrics like HHI
+    - Market concentration metrics like HHI and CR4/CR8, for one country, over time or ranked across countries
 
     Tool Guide:
     1. Use `get_top_four_asns` when the user asks for:
@@ -34,10 +37,31 @@ market_agent = Agent(
          - "HHI for ASNs in the UK"
          - "Number of providers and users in the US"
 
+    3. Use `get_asn_hhi_ranking` for questions across all countries, instead of calling `get_country_asn_hhi` per country:
+       - The most concentrated or most competitive ISP markets, or where one country ranks by HHI.
+       - Phrases like:
+         - "Most concentrated ISP markets by HHI"
+         - "Which countries have the most competitive ISP markets?"
+         - "Where does Germany rank for market concentration?"
+
+    4. Use `get_asn_concentration_series` when the user asks how concentration has changed over time, or about a past date:
+       - Monthly HHI, CR4/CR8 (share of the 4/8 largest ASNs) and the number of ASNs, computed from per-ASN subscriber data.
+       - Phrases like:
+         - "How has ISP market concentration in Brazil changed since 2020?"
+         - "HHI of Germany in 2022"
+         - "What share do the four largest ISPs in India hold over time?"
+
     Constraints:
     - Stick to the data the tools return — do not interpret, guess, or reword results.
     - If a tool returns an "error" status, present the `error_message` directly and clearly.
+    - Countries may be passed by ISO code or by name. If a tool reports an unknown country with `suggestions`, ask the user which of them they meant.
     - Currently, your scope for "market data" is limited to ASN/ISP-related metrics. Do not respond to requests outside this domain unless new tools for other market data types are provided.
     """,
-    tools=[get_top_four_asns, get_country_asn_hhi]
+    tools=[get_top_four_asns_async, get_country_asn_hhi_async, get_asn_hhi_ranking_async, get_asn_concentration_series_async],
+    before_agent_callback=before_agent,
+    after_agent_callback=[end_turn, after_agent],
+    before_model_callback=[before_model, answer_from_cache, compact_history],
+    after_model_callback=[after_model, remember_answer, note_answer],
+    before_tool_callback=before_tool,
+    after_tool_callback=[after_tool, skip_answer_on_tool_error, note_tool],
 )
\ No newline at end of file
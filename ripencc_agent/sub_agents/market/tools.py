@@ -1,3 +1,56 @@
+from typing import Optional
+
+from ...cache import cached_tool, session_memoized
+from ...concentration import CONCENTRATION_TABLE, SUBSCRIBERS_BY_COUNTRY_SQL, SUBSCRIBERS_TABLE, compute_concentration
+from ...db import query, table_names
+from ...executor import async_tool
+from ...materialized import LATEST_TOP_ASN_DATE_TABLE
+from ...payload import enforce_budget
+from ...rankings import leaderboard
+from ...snapshot import snapshot_table
+
+TOP_ASN_TABLE = "Top_4_ASNs"
+TOP_ASN_SQL = f'''
+    SELECT date, asn_name, asn, subs, percentage
+    FROM {TOP_ASN_TABLE}
+    WHERE cc = ?
+    AND date = (
+        SELECT MAX(date)
+        FROM {TOP_ASN_TABLE}
+        WHERE cc = ?
+    )
+    ORDER BY subs DESC
+'''
+
+# Same rows, with the latest date looked up in the materialized snapshot
+# instead of a per-call `MAX(date)` subquery.
+TOP_ASN_LATEST_SQL = f'''
+    SELECT T.date, T.asn_name, T.asn, T.subs, T.percentage
+    FROM {LATEST_TOP_ASN_DATE_TABLE} L
+    INNER JOIN {TOP_ASN_TABLE} T ON T.cc = L.cc AND T.date = L.date
+    WHERE L.cc = ?
+    ORDER BY T.subs DESC
+'''
+
+ASN_HHI_TABLE = "Herfindahl_Hirschman_Index"
+ASN_HHI_SQL = f'''
+    SELECT Country_Code, Total_Users, Number_of_ASNs, HHI
+    FROM {ASN_HHI_TABLE}
+    WHERE Country_Code = ?
+'''
+
+CONCENTRATION_SERIES_SQL = f'''
+    SELECT cc, date, total_subs, asn_count, hhi, cr4, cr8
+    FROM {CONCENTRATION_TABLE}
+    WHERE cc = ?
+    AND date >= ?
+    AND date <= ?
+    ORDER BY date
+'''
+CONCENTRATION_COLUMNS = ("date", "total_subs", "asn_count", "hhi", "cr4", "cr8")
+
+
+@cached_tool
 def get_top_four_asns(country_code: str):
     '''
     Retrieves the latest top four ASNs by subscriber count for the specified country.
@@ -6,7 +59,7 @@ def get_top_four_asns(country_code: str):
     or answer questions like "What are the largest ISPs in Germany?" or "Top 4 providers in NL".
 
     Args:
-    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for.
+    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for. A country name (e.g., `'Netherlands'`) is accepted too.
 
     Returns:
     A `dict` with the following structure:
@@ -21,6 +74,7 @@ def get_top_four_asns(country_code: str):
         - `subs_count` (str): Number of subscribers.
         - `percentage` (str): Market share percentage.
     - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
 
     Example:
     {
@@ -46,26 +100,14 @@ def get_top_four_asns(country_code: str):
     }
     '''
 
-    import sqlite3
-
-    DB_PATH = "ripencc_agent/data/insights.db"
-    TOP_ASN_TABLE = "Top_4_ASNs"
-    SQL_QUERY = f'''
-        SELECT date, asn_name, asn, subs, percentage
-        FROM {TOP_ASN_TABLE}
-        WHERE cc = ?
-        AND date = (
-            SELECT MAX(date)
-            FROM {TOP_ASN_TABLE}
-            WHERE cc = ?
-        )
-        ORDER BY subs DESC
-    '''
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(SQL_QUERY, (country_code,country_code))
-        rows = cursor.fetchall()
+        snapshot = snapshot_table(TOP_ASN_TABLE)
+        if snapshot is not None:
+            rows = snapshot.latest(country_code, ("date", "asn_name", "asn", "subs", "percentage"))
+        elif LATEST_TOP_ASN_DATE_TABLE in table_names():
+            rows = query(TOP_ASN_LATEST_SQL, (country_code,))
+        else:
+            rows = query(TOP_ASN_SQL, (country_code, country_code))
 
         date = rows[0][0]
 
@@ -78,8 +120,6 @@ def get_top_four_asns(country_code: str):
                 "subs_count": subs,
                 "percentage": percentage
             })
-        
-        conn.close()
 
         return {
             "status": "success",
@@ -93,6 +133,7 @@ def get_top_four_asns(country_code: str):
             "error_message": str(e)
         }
 
+@cached_tool
 def get_country_asn_hhi(country_code: str):
     '''
     Retrieves the Herfindahl-Hirschman Index (HHI) for the ASN market concentration in a given country.
@@ -105,7 +146,7 @@ def get_country_asn_hhi(country_code: str):
     The HHI is a measure of market concentration, where higher values indicate a more concentrated (less competitive) market.
 
     Args:
-    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for.
+    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`) representing the country to retrieve data for. A country name (e.g., `'Netherlands'`) is accepted too.
 
     Returns:
     A `dict` with the following structure:
@@ -118,6 +159,7 @@ def get_country_asn_hhi(country_code: str):
         - `number_of_asns` (int): Total number of ASNs present in the market.
         - `hhi` (float): The Herfindahl-Hirschman Index score (0–10,000 scale).
     - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
 
     Example:
     {
@@ -133,21 +175,12 @@ def get_country_asn_hhi(country_code: str):
     }
     '''
 
-
-    import sqlite3
-
-    DB_PATH = "ripencc_agent/data/insights.db"
-    ASN_HHI_TABLE = "Herfindahl_Hirschman_Index"
-    SQL_QUERY = f'''
-        SELECT Country_Code, Total_Users, Number_of_ASNs, HHI
-        FROM {ASN_HHI_TABLE}
-        WHERE Country_Code = ?
-    '''
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(SQL_QUERY, (country_code,))
-        rows = cursor.fetchall()
+        snapshot = snapshot_table(ASN_HHI_TABLE)
+        if snapshot is not None:
+            rows = snapshot.select(country_code, ("Country_Code", "Total_Users", "Number_of_ASNs", "HHI"))
+        else:
+            rows = query(ASN_HHI_SQL, (country_code,))
 
         data = []
         for Country_Code, Total_Users, Number_of_ASNs, HHI in rows:
@@ -157,8 +190,6 @@ def get_country_asn_hhi(country_code: str):
                 "number_of_asns": Number_of_ASNs,
                 "hhi": HHI
             })
-        
-        conn.close()
 
         return {
             "status": "success",
@@ -170,3 +201,139 @@ def get_country_asn_hhi(country_code: str):
             "status":"error",
             "error_message": str(e)
         }
+
+
+@cached_tool
+def get_asn_hhi_ranking(limit: Optional[int] = None, order: Optional[str] = None, country_code: Optional[str] = None):
+    '''
+    Ranks all countries by the Herfindahl-Hirschman Index (HHI) of their ASN market.
+
+    Use this tool for cross-country questions instead of calling `get_country_asn_hhi` for every country, e.g.
+    "Which countries have the most concentrated ISP markets?", "Most competitive ISP markets by HHI" or
+    "Where does Germany rank for market concentration?".
+
+    Args:
+    - `limit` (int, optional): Number of countries to return, 1-100. Defaults to 10.
+    - `order` (str, optional): `'top'` (most concentrated, highest HHI first, the default) or `'bottom'` (most competitive, lowest HHI first).
+    - `country_code` (str, optional): An ISO 3166-1 alpha-2 country code whose own rank should also be returned. A country name (e.g., `'Netherlands'`) is accepted too.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): Indicates the result of the request.
+        - `"success"`: Data was successfully retrieved.
+        - `"error"`: An issue occurred (e.g., invalid arguments, or no data available).
+    - `order` (str): `"top"` or `"bottom"`.
+    - `countries` (int): Number of countries ranked.
+    - `data` (list): The ranked countries, each with `rank` (1 = most concentrated), `country_code` and `value` (HHI, 0–10,000 scale).
+    - `country` (dict or null): Only with `country_code`; its `rank`, `country_code` and `value`, or null if it has no HHI.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "order": "top",
+        "countries": 231,
+        "data": [
+            {"rank": 1, "country_code": "ER", "value": 10000.0},
+            {"rank": 2, "country_code": "KP", "value": 9875.2}
+        ]
+    }
+    '''
+
+    try:
+        return {
+            "status": "success",
+            **leaderboard("hhi", limit=limit, order=order, country_code=country_code)
+        }
+
+    except Exception as e:
+        return {
+            "status":"error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_asn_concentration_series(country_code: str, start_date: Optional[str] = None, end_date: Optional[str] = None, max_points: Optional[int] = None):
+    '''
+    Retrieves the monthly market concentration of a country's ISP market over time, computed from per-ASN subscriber estimates.
+
+    Use this tool when the user asks how competition or concentration has changed, or about concentration at a
+    past date, e.g. "How has ISP market concentration in Brazil changed since 2020?", "HHI of Germany in 2022"
+    or "What share do the four largest ISPs in India hold over time?". For the current HHI alone, `get_country_asn_hhi` is enough.
+
+    Args:
+    - `country_code` (str): A string in ISO 3166-1 alpha-2 country code format (e.g., `'NL'`). A country name (e.g., `'Netherlands'`) is accepted too.
+    - `start_date` (str, optional): The beginning of the window in `YYYY-MM-DD` format. Defaults to the first available month.
+    - `end_date` (str, optional): The end of the window in `YYYY-MM-DD` format. Defaults to the latest available month.
+    - `max_points` (int, optional): Return at most this many months, picked to keep the shape of the HHI curve (peaks and dips).
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): Indicates the result of the request.
+        - `"success"`: Data was successfully retrieved.
+        - `"error"`: An issue occurred (e.g., no subscriber data for the country or window).
+    - `country_code` (str): The input country code.
+    - `data` (dict): Present only if status is `"success"`. Parallel lists, one entry per month:
+        - `date` (str): The month, in `YYYY-MM-DD` format.
+        - `total_subs` (int): Estimated subscribers across all ASNs.
+        - `asn_count` (int): Number of ASNs with subscribers.
+        - `hhi` (float): Herfindahl-Hirschman Index (0–10,000 scale; above 2,500 is highly concentrated).
+        - `cr4` / `cr8` (float): Combined market share of the 4 / 8 largest ASNs, in percent.
+    - `downsampled` (dict): Present only if months were left out to keep the result small: the `method`,
+        the number of `points` in the window and the number `returned`.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "country_code": "NL",
+        "data": {
+            "date": ["2025-05-01", "2025-06-01"],
+            "total_subs": [15601204, 15628918],
+            "asn_count": [286, 284],
+            "hhi": [1152.4, 1139.86],
+            "cr4": [61.2, 60.8],
+            "cr8": [78.9, 78.5]
+        }
+    }
+    '''
+
+    try:
+        window = (country_code, start_date or "0000-00-00", end_date or "9999-99-99")
+        if CONCENTRATION_TABLE in table_names():
+            rows = query(CONCENTRATION_SERIES_SQL, window)
+        elif SUBSCRIBERS_TABLE in table_names():
+            rows = compute_concentration(query(SUBSCRIBERS_BY_COUNTRY_SQL, window))
+        else:
+            raise ValueError("Per-ASN subscriber data has not been loaded.")
+        if not rows:
+            raise ValueError(f"No ASN subscriber data for {country_code} in the requested window.")
+
+        series = {country_code: {column: [row[i + 1] for row in rows] for i, column in enumerate(CONCENTRATION_COLUMNS)}}
+
+        def columnar(series: dict) -> dict:
+            return {
+                "status": "success",
+                "country_code": country_code,
+                "data": series[country_code]
+            }
+
+        return enforce_budget(series, "hhi", [columnar], max_points)
+
+    except Exception as e:
+        return {
+            "status":"error",
+            "error_message": str(e)
+        }
+
+
+# Async variants registered on the agent: same name, docstring and results,
+# but the query runs on the DB executor instead of the event loop, and results
+# are memoized in the session for follow-up questions.
+get_top_four_asns_async = session_memoized(async_tool(get_top_four_asns))
+get_country_asn_hhi_async = session_memoized(async_tool(get_country_asn_hhi))
+get_asn_hhi_ranking_async = session_memoized(async_tool(get_asn_hhi_ranking))
+get_asn_concentration_series_async = session_memoized(async_tool(get_asn_concentration_series))
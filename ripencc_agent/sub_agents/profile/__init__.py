@@ -0,0 +1 @@
+from .agent import profile_agent
@@ -0,0 +1,85 @@
+from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent
+from .fetchers import (
+    PROFILE_COUNTRY_KEY, PROFILE_HHI_KEY, PROFILE_IPV6_KEY, PROFILE_ROA_KEY, PROFILE_TOP_ASNS_KEY, ProfileFetcher,
+)
+from ..ipv6.tools import get_country_ipv6_adoption_rate_async
+from ..market.tools import get_country_asn_hhi_async, get_top_four_asns_async
+from ..rpki.tools import get_latest_roa_coverage_async
+from ...answer_cache import remember_answer
+from ...compaction import compact_history, end_turn, note_answer
+from ...instrumentation import after_agent, after_model, after_tool, before_agent, before_model, before_tool
+
+# Country overview in three stages: one small model call to pick the country,
+# the four data sets fetched concurrently (no model calls), and one model call
+# to write the summary. Latency is roughly the slowest fetch plus two model
+# calls, instead of a model turn and a tool call per domain in series.
+
+country_extractor = LlmAgent(
+    name="profile_country_extractor",
+    description="Identifies the country a profile request is about.",
+    instruction="""
+    Identify the country the user wants an overview of.
+    Reply with ONLY its ISO 3166-1 alpha-2 code in upper case (e.g. `BR`), nothing else.
+    If no country is named or implied by the conversation, reply with `NONE`.
+    """,
+    output_key=PROFILE_COUNTRY_KEY,
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=[before_model, compact_history],
+    after_model_callback=after_model,
+)
+
+profile_fetchers = ParallelAgent(
+    name="profile_fetchers",
+    description="Fetches ROA coverage, IPv6 adoption, top ASNs and HHI for the profile country concurrently.",
+    sub_agents=[
+        ProfileFetcher(name="profile_roa_fetcher", fetch=get_latest_roa_coverage_async, output_key=PROFILE_ROA_KEY),
+        ProfileFetcher(name="profile_ipv6_fetcher", fetch=get_country_ipv6_adoption_rate_async, output_key=PROFILE_IPV6_KEY),
+        ProfileFetcher(name="profile_top_asns_fetcher", fetch=get_top_four_asns_async, output_key=PROFILE_TOP_ASNS_KEY),
+        ProfileFetcher(name="profile_hhi_fetcher", fetch=get_country_asn_hhi_async, output_key=PROFILE_HHI_KEY),
+    ],
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+)
+
+profile_summarizer = LlmAgent(
+    name="profile_summarizer",
+    description="Writes the country profile from the fetched data.",
+    instruction=f"""
+    You are a senior Internet infrastructure analyst writing a short profile of one country's Internet.
+
+    Country: {{{PROFILE_COUNTRY_KEY}?}}
+
+    Data (each is a tool result with a `status`; an "error" status means that part is unavailable):
+    - Latest ROA coverage (routing security), by IP version: {{{PROFILE_ROA_KEY}?}}
+    - Latest IPv6 adoption, by measurement source: {{{PROFILE_IPV6_KEY}?}}
+    - Top 4 ASNs by subscribers (market share): {{{PROFILE_TOP_ASNS_KEY}?}}
+    - Market concentration (HHI, 0-10,000): {{{PROFILE_HHI_KEY}?}}
+
+    Write the profile with one short section per topic: Routing security (RPKI), IPv6 adoption, Market.
+    - Quote the figures and their dates exactly as given; do not estimate or invent values.
+    - For a section whose data has an "error" status, say the data is unavailable and give the `error_message`.
+    - If the country is `NONE` or missing, ask the user which country they mean instead.
+    """,
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=[before_model, compact_history],
+    after_model_callback=[after_model, remember_answer, note_answer],
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
+)
+
+profile_agent = SequentialAgent(
+    name="profile_agent",
+    description=(
+        "An agent that builds an overview of one country's Internet: routing security (ROA coverage), "
+        "IPv6 adoption and ISP market structure (top ASNs, HHI), with the data fetched in parallel."
+    ),
+    sub_agents=[country_extractor, profile_fetchers, profile_summarizer],
+    before_agent_callback=before_agent,
+    after_agent_callback=[end_turn, after_agent],
+)
@@ -0,0 +1,55 @@
+import re
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+from ...answer_cache import skip_answer
+
+# State keys shared by the stages of `profile_agent`.
+PROFILE_COUNTRY_KEY = "profile_country_code"
+PROFILE_ROA_KEY = "profile_roa"
+PROFILE_IPV6_KEY = "profile_ipv6"
+PROFILE_TOP_ASNS_KEY = "profile_top_asns"
+PROFILE_HHI_KEY = "profile_hhi"
+
+
+def parse_country_code(text: Optional[str]) -> Optional[str]:
+    '''
+    The ISO 3166-1 alpha-2 code in the extractor's reply (e.g. `'BR'` or `'br\\n'`), or `None`.
+    '''
+    match = re.search(r"\b[A-Z]{2}\b", (text or "").upper())
+    return match.group(0) if match else None
+
+
+class ProfileFetcher(BaseAgent):
+    '''
+    Fetches one data set for the profile's country by calling a data tool
+    directly, without a model call, and stores the tool result under `output_key`.
+
+    Fetchers run side by side under a `ParallelAgent`; the tools are async and
+    run on the DB executor, so the branches really do overlap.
+    '''
+
+    fetch: Callable[[str], Awaitable[dict]]
+    output_key: str
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        country_code = parse_country_code(ctx.session.state.get(PROFILE_COUNTRY_KEY))
+        if country_code is None:
+            result = {
+                "status": "error",
+                "error_message": "Could not tell which country the profile is for.",
+            }
+        else:
+            result = await self.fetch(country_code)
+        if result.get("status") != "success":
+            skip_answer(ctx.session.state)
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={self.output_key: result}),
+        )
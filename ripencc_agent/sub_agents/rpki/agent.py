@@ -1,5 +1,8 @@
 from google.adk import Agent
-from .tools import get_monthly_roa_coverage
+from .tools import get_latest_roa_coverage_async, get_monthly_roa_coverage_async, get_monthly_roa_coverage_batch_async, get_roa_coverage_ranking_async, get_roa_coverage_trend_async
+from ...answer_cache import answer_from_cache, remember_answer, skip_answer_on_tool_error
+from ...compaction import compact_history, end_turn, note_answer, note_tool
+from ...instrumentation import after_agent, after_model, after_tool, before_agent, before_model, before_tool
 
 rpki_agent = Agent(  # Changed name here
     name="rpki_agent",  # Changed name here
@@ -27,11 +30,47 @@ rpki_agent = Agent(  # Changed name here
          - "How secure is the routing in India via RPKI?"
          - "What is the RPKI coverage for a given country?"
 
+    2. Use `get_monthly_roa_coverage_batch` instead of calling `get_monthly_roa_coverage` several times when the user:
+       - Compares ROA coverage across several countries.
+       - Asks for IPv4 and IPv6 coverage together.
+       - Phrases like:
+         - "Compare ROA coverage for NL, DE, FR and BE since 2020"
+         - "IPv4 vs IPv6 ROA coverage in Japan this year"
+
+    3. Use `get_roa_coverage_trend` when the user asks how coverage has changed rather than for raw monthly values:
+       - Growth, improvement, year-over-year change, CAGR, best/worst month or moving averages.
+       - Phrases like:
+         - "How has RPKI improved in France?"
+         - "ROA coverage growth in NL since 2020"
+         - "When was IPv6 ROA coverage in Japan at its highest?"
+
+    4. Use `get_latest_roa_coverage` when the user only wants the current coverage, with no time range:
+       - Phrases like:
+         - "What is the RPKI coverage in Brazil right now?"
+         - "Latest IPv4 and IPv6 ROA coverage for NL"
+
+    5. Use `get_roa_coverage_ranking` for questions across all countries, instead of calling the other tools per country:
+       - Highest or lowest coverage, top/bottom N countries, or where one country ranks.
+       - Phrases like:
+         - "Which countries have the highest ROA coverage?"
+         - "Bottom 5 countries for IPv6 RPKI in 2023"
+         - "Where does Germany rank for IPv4 ROA coverage?"
+
     Constraints:
     - Always use the tool with `country_code`, `ip_version`, and optionally a time range if the query implies it.
     - Return results exactly as the tool provides — do not summarize or interpret beyond what is directly supported by the data.
     - If the tool returns an "error" status, present the `error_message` directly and clearly.
+    - Countries may be passed by ISO code or by name. If a tool reports an unknown country with `suggestions`, ask the user which of them they meant.
+    - For ranges spanning several years, pass `resolution='quarterly'` or `'yearly'` instead of fetching every point.
+    - If a result has a `downsampled` field, mention that only the returned points are shown out of the total.
+    - Only when the user needs every point of a long range (e.g. a full export), pass `page_size` and fetch further pages with each `next_page_token` as `page_token`.
     - Do not respond to questions outside the scope of RPKI and its related routing security metrics.
     """,
-    tools=[get_monthly_roa_coverage]
+    tools=[get_monthly_roa_coverage_async, get_monthly_roa_coverage_batch_async, get_roa_coverage_trend_async, get_latest_roa_coverage_async, get_roa_coverage_ranking_async],
+    before_agent_callback=before_agent,
+    after_agent_callback=[end_turn, after_agent],
+    before_model_callback=[before_model, answer_from_cache, compact_history],
+    after_model_callback=[after_model, remember_answer, note_answer],
+    before_tool_callback=before_tool,
+    after_tool_callback=[after_tool, skip_answer_on_tool_error, note_tool],
 )
\ No newline at end of file
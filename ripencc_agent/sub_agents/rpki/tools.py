@@ -1,4 +1,73 @@
-def get_monthly_roa_coverage(country_code: str, ip_family: str, start_date: str, end_date: str) -> dict:
+import json
+from typing import Optional
+
+from ...cache import cached_tool, session_memoized
+from ...db import query, table_names
+from ...executor import async_tool
+from ...materialized import LATEST_ROA_DATE_TABLE
+from ...payload import RESOLUTIONS, aggregate_sql, check_resolution, enforce_budget, query_page
+from ...rankings import leaderboard
+from ...snapshot import snapshot_table
+from ...timeseries import get_engine, summarize
+
+ROA_TABLE = "ROA_MONTHLY"
+ROA_COLUMNS = ("date", "percentage_space_covered_by_roa")
+ROA_COVERAGE_SQL = f'''
+    SELECT date, percentage_space_covered_by_roa
+    FROM {ROA_TABLE}
+    WHERE (
+        country_code = ? and
+        ip_version = ? and
+        date >= ? and
+        date <= ?
+    )
+'''
+ROA_COVERAGE_SQL_BY_RESOLUTION = {
+    resolution: aggregate_sql(ROA_COVERAGE_SQL, [], "percentage_space_covered_by_roa", resolution)
+    for resolution in RESOLUTIONS
+}
+
+# Upper bound of one `"date": percentage` pair in a result, for sizing pages.
+ROA_ROW_BYTES = 36
+
+# One set-based query for any number of countries and IP versions; the lists
+# are bound as JSON arrays so the statement text (and its cached plan) stays constant.
+ROA_COVERAGE_BATCH_SQL = f'''
+    SELECT country_code, ip_version, date, percentage_space_covered_by_roa
+    FROM {ROA_TABLE}
+    WHERE country_code IN (SELECT value FROM json_each(?))
+    AND ip_version IN (SELECT value FROM json_each(?))
+    AND date >= ?
+    AND date <= ?
+    ORDER BY country_code, ip_version, date
+'''
+
+ROA_LATEST_SQL = f'''
+    SELECT CAST(R.ip_version AS TEXT), R.date, R.percentage_space_covered_by_roa
+    FROM {ROA_TABLE} R
+    INNER JOIN (
+        SELECT ip_version, MAX(date) AS MaxDate
+        FROM {ROA_TABLE}
+        WHERE country_code = ?
+        GROUP BY ip_version
+    ) M ON R.ip_version = M.ip_version AND R.date = M.MaxDate
+    WHERE R.country_code = ?
+    ORDER BY R.ip_version
+'''
+
+# Same rows, with the latest month per IP version taken from the materialized snapshot.
+ROA_LATEST_SNAPSHOT_SQL = f'''
+    SELECT L.ip_version, R.date, R.percentage_space_covered_by_roa
+    FROM {LATEST_ROA_DATE_TABLE} L
+    INNER JOIN {ROA_TABLE} R
+        ON R.country_code = L.country_code AND R.ip_version = L.ip_version AND R.date = L.date
+    WHERE L.country_code = ?
+    ORDER BY L.ip_version
+'''
+
+
+@cached_tool
+def get_monthly_roa_coverage(country_code: str, ip_family: str, start_date: str, end_date: str, resolution: Optional[str] = None, max_points: Optional[int] = None, page_size: Optional[int] = None, page_token: Optional[str] = None) -> dict:
     """
     Retrieves the monthly Route Origin Authorization (ROA) coverage data for specified country over a given time range and IP version.
     This tool queries ROA coverage — a measure of how much of the routed IP space in a given country is covered by valid ROAs — which helps assess routing security. 
@@ -8,10 +77,16 @@ def get_monthly_roa_coverage(country_code: str, ip_family: str, start_date: str,
     For example, it is useful for identifying how well-secured the routing infrastructure is in country like NL from Jan 2020 to Aug 2025.
 
     Args:
-    - `country_code` (str): A string of ISO 3166-1 alpha-2 country code (e.g., `'NL'`) representing the country to retrieve data for.
+    - `country_code` (str): A string of ISO 3166-1 alpha-2 country code (e.g., `'NL'`) representing the country to retrieve data for. A country name (e.g., `'Netherlands'`) is accepted too.
     - `ip_family` (str): The IP version to query. Accepts '4' for IPv4 or '6' for IPv6.
     - `start_date` (str): The beginning of the time window in `YYYY-MM-DD` format.
     - `end_date` (str): The end of the time window in `YYYY-MM-DD` format. Must not earlier than `start_date`.
+    - `resolution` (str, optional): `'monthly'` (default), `'quarterly'` or `'yearly'`. Coarser resolutions return
+        the average coverage per quarter (e.g. `'2023-Q1'`) or year (e.g. `'2023'`); prefer them for ranges of many years.
+    - `max_points` (int, optional): Return at most this many points, picked to keep the shape of the curve (peaks and dips).
+    - `page_size` (int, optional): Page through every point of the window, oldest first, this many per page (larger sizes
+        are cut to what fits one response), instead of getting a downsampled window at once. `max_points` does not apply to pages.
+    - `page_token` (str, optional): The `next_page_token` of the previous page, to get the next one. Keep the other arguments unchanged.
 
     Returns:
     A `dict` with the following structure:
@@ -28,42 +103,318 @@ def get_monthly_roa_coverage(country_code: str, ip_family: str, start_date: str,
             }
         }
         ```
+    - `resolution` (str): Present only if a `resolution` was requested.
+    - `downsampled` (dict): Present only if points were left out to keep the result small: the `method`,
+        the number of `points` in the window and the number `returned`. Ask for a coarser `resolution` or a shorter window for more detail.
+    - `next_page_token` (str): Present only when paging and more points follow. Pass it as `page_token` for the next page.
     - `error_message` (str): Present only if status is `"error"`. Contains a human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
     """
-    import sqlite3
+    try:
+        check_resolution(resolution)
+        paged = page_size is not None or page_token is not None
+        next_page_token = None
+        snapshot = snapshot_table(ROA_TABLE)
+        SQL = ROA_COVERAGE_SQL_BY_RESOLUTION[resolution] if resolution else ROA_COVERAGE_SQL
+        if paged:
+            rows, next_page_token = query_page(
+                SQL, (country_code, ip_family, start_date, end_date), ["period" if resolution else "date"], lambda row: (row[0],),
+                {"country_code": country_code, "ip_family": ip_family, "start_date": start_date, "end_date": end_date, "resolution": resolution},
+                page_token, page_size, ROA_ROW_BYTES,
+            )
+        elif snapshot is not None and not resolution:
+            rows = snapshot.select(country_code, ROA_COLUMNS, {"ip_version": ip_family}, start_date, end_date)
+        else:
+            rows = query(SQL, (country_code, ip_family, start_date, end_date))
 
-    DB_PATH = "ripencc_agent/data/insights.db"
-    ROA_TABLE = "ROA_MONTHLY"
-    SQL_QUERY = f'''
-        SELECT date, percentage_space_covered_by_roa
-        FROM {ROA_TABLE}
-        WHERE (
-            country_code = ? and 
-            ip_version = ? and
-            date >= ? and
-            date <= ?
-        )
-    '''
+        series = {country_code: {"date": [row[0] for row in rows], "percentage": [row[1] for row in rows]}}
+
+        def by_date(series: dict) -> dict:
+            result = {
+                "status": "success",
+                country_code: dict(zip(series[country_code]["date"], series[country_code]["percentage"]))
+            }
+            if resolution:
+                result["resolution"] = resolution
+            if next_page_token:
+                result["next_page_token"] = next_page_token
+            return result
+
+        if paged:
+            return by_date(series)
+        return enforce_budget(series, "percentage", [by_date], max_points)
 
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_monthly_roa_coverage_batch(country_codes: list[str], ip_families: list[str], start_date: str, end_date: str) -> dict:
+    """
+    Retrieves monthly ROA coverage for several countries and IP versions in a single call.
+
+    Use this tool instead of calling `get_monthly_roa_coverage` repeatedly when a question compares countries
+    or IP versions, e.g. "compare ROA coverage for NL, DE, FR and BE since 2020" or "IPv4 vs IPv6 ROA coverage in Japan".
+
+    Args:
+    - `country_codes` (list[str]): ISO 3166-1 alpha-2 country codes (e.g., `['NL', 'DE']`), or country names.
+    - `ip_families` (list[str]): IP versions to query, any of `'4'` and `'6'` (e.g., `['4', '6']`).
+    - `start_date` (str): The beginning of the time window in `YYYY-MM-DD` format.
+    - `end_date` (str): The end of the time window in `YYYY-MM-DD` format. Must not earlier than `start_date`.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `data` (dict): Present only if status is `"success"`. Maps each country code to a dict keyed by IP version,
+        whose values hold two parallel lists: `date` and `percentage` (ROA coverage per month).
+        Countries or IP versions without data in the window are omitted.
+    - `downsampled` (dict): Present only if points were left out to keep the result small: the `method`,
+        the number of `points` in the window and the number `returned`.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "data": {
+            "NL": {
+                "4": {"date": ["2023-08", "2023-09"], "percentage": [87.5, 87.9]},
+                "6": {"date": ["2023-08", "2023-09"], "percentage": [71.2, 71.0]}
+            },
+            "DE": {
+                "4": {"date": ["2023-08", "2023-09"], "percentage": [64.1, 64.8]}
+            }
+        }
+    }
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(SQL_QUERY, (country_code, ip_family, start_date, end_date))
-        rows = cursor.fetchall()
+        if not country_codes or not ip_families:
+            raise ValueError("`country_codes` and `ip_families` must each contain at least one value.")
+
+        snapshot = snapshot_table(ROA_TABLE)
+        if snapshot is not None:
+            rows = [
+                row
+                for cc in sorted(set(country_codes))
+                for row in snapshot.select(cc, ("country_code", "ip_version") + ROA_COLUMNS, {"ip_version": ip_families}, start_date, end_date)
+            ]
+        else:
+            rows = query(ROA_COVERAGE_BATCH_SQL, (
+                json.dumps(list(dict.fromkeys(country_codes))),
+                json.dumps(list(dict.fromkeys(ip_families))),
+                start_date,
+                end_date,
+            ))
+
+        series = {}
+        for cc, ip_version, date, percentage in rows:
+            columns = series.setdefault((cc, str(ip_version)), {"date": [], "percentage": []})
+            columns["date"].append(date)
+            columns["percentage"].append(percentage)
+
+        def nested(series: dict) -> dict:
+            data = {}
+            for (cc, ip_version), columns in series.items():
+                data.setdefault(cc, {})[ip_version] = columns
+            return {
+                "status": "success",
+                "data": data
+            }
+
+        return enforce_budget(series, "percentage", [nested])
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_latest_roa_coverage(country_code: str) -> dict:
+    """
+    Retrieves the most recent monthly ROA coverage of a country for both IPv4 and IPv6.
+
+    Use this tool for "current" questions that need no time range, e.g. "What is the RPKI coverage in Brazil right now?"
+    or "Latest IPv4 and IPv6 ROA coverage for NL".
+
+    Args:
+    - `country_code` (str): A string of ISO 3166-1 alpha-2 country code (e.g., `'NL'`). A country name (e.g., `'Netherlands'`) is accepted too.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `country_code` (str): Present only if status is `"success"`. The input country code.
+    - `data` (dict): Present only if status is `"success"`. Maps each IP version (`'4'`, `'6'`) with data to its latest
+        `date` and `percentage` of routed space covered by ROAs.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "country_code": "NL",
+        "data": {
+            "4": {"date": "2025-08-01", "percentage": 87.5},
+            "6": {"date": "2025-08-01", "percentage": 71.2}
+        }
+    }
+    """
+    try:
+        snapshot = snapshot_table(ROA_TABLE)
+        if snapshot is not None:
+            rows = [(str(ip_version), date, percentage) for ip_version, date, percentage in snapshot.latest(country_code, ("ip_version",) + ROA_COLUMNS, "ip_version")]
+        elif LATEST_ROA_DATE_TABLE in table_names():
+            rows = query(ROA_LATEST_SNAPSHOT_SQL, (country_code,))
+        else:
+            rows = query(ROA_LATEST_SQL, (country_code, country_code))
+        if not rows:
+            raise ValueError(f"No ROA coverage data for country {country_code}.")
 
         data = {}
-        for date, percentage in rows:
-            data[date] = percentage
-        
-        conn.close()
+        for ip_version, date, percentage in rows:
+            data[ip_version] = {"date": date, "percentage": percentage}
+
+        return {
+            "status": "success",
+            "country_code": country_code,
+            "data": data
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
+
+@cached_tool
+def get_roa_coverage_trend(country_code: str, ip_family: str, start_date: Optional[str] = None, end_date: Optional[str] = None, window_months: Optional[int] = None, include_series: Optional[bool] = None) -> dict:
+    """
+    Computes trend statistics of monthly ROA coverage for a country and IP version over a time window.
+
+    Use this tool instead of `get_monthly_roa_coverage` when the user asks how coverage has *changed* rather than for
+    the raw monthly values, e.g. "How has RPKI improved in France?", "ROA coverage growth in NL since 2020" or
+    "What was the best month for IPv6 ROA coverage in Japan?". The statistics are computed server-side, so present them as returned.
+
+    Args:
+    - `country_code` (str): A string of ISO 3166-1 alpha-2 country code (e.g., `'NL'`). A country name (e.g., `'Netherlands'`) is accepted too.
+    - `ip_family` (str): The IP version to query. Accepts '4' for IPv4 or '6' for IPv6.
+    - `start_date` (str, optional): The beginning of the window in `YYYY-MM-DD` format. Defaults to the first available month.
+    - `end_date` (str, optional): The end of the window in `YYYY-MM-DD` format. Defaults to the latest available month.
+    - `window_months` (int, optional): Length of the trailing moving average in months. Defaults to 3.
+    - `include_series` (bool, optional): Also return the monthly values and moving average. Defaults to False.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `trend` (dict): Present only if status is `"success"`. Coverage percentages over the window:
+        - `points` (int): Number of monthly values in the window.
+        - `start` / `end` (dict): First and last `date` and `value`.
+        - `change` (float): `end` minus `start`, in percentage points.
+        - `min` / `max` (dict): Lowest and highest `date` and `value`.
+        - `mean` (float): Average coverage.
+        - `moving_average` (dict): `window_months` and the `latest` trailing average.
+        - `yoy_change` (dict or null): `from`, `to` and `delta` (percentage points) between the latest value and the value a year earlier.
+        - `cagr_pct` (float or null): Compound annual growth rate of coverage, in percent.
+        - `slope_per_year` (float or null): Least-squares trend, in percentage points per year.
+        - `series` (dict): Only with `include_series`; parallel lists `date`, `value` and `moving_average`.
+    - `downsampled` (dict): Present only if points of `series` were left out to keep the result small: the `method`,
+        the number of `points` in the window and the number `returned`.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+    """
+    try:
+        table = get_engine().roa
+        key = (country_code, ip_family)
+        if key not in table.index:
+            raise ValueError(f"No ROA coverage data for country {country_code} and IPv{ip_family}.")
+
+        trend = summarize(table, key, start_date, end_date, window_months or 3, bool(include_series))
+        if trend is None:
+            raise ValueError(f"No ROA coverage data for {country_code} IPv{ip_family} between {start_date or 'the start'} and {end_date or 'now'}.")
+
+        def build(series: dict) -> dict:
+            return {
+                "status": "success",
+                "country_code": country_code,
+                "ip_family": ip_family,
+                "trend": {**trend, "series": series[key]} if series else trend
+            }
+
+        series = {key: trend.pop("series")} if include_series else {}
+        return enforce_budget(series, "value", [build])
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e)
+        }
+
 
+@cached_tool
+def get_roa_coverage_ranking(ip_family: str, date: Optional[str] = None, limit: Optional[int] = None, order: Optional[str] = None, country_code: Optional[str] = None) -> dict:
+    """
+    Ranks all countries by ROA coverage for one IP version and month.
+
+    Use this tool for cross-country questions instead of calling the per-country tools for every country, e.g.
+    "Which countries have the highest ROA coverage?", "Bottom 5 countries for IPv6 RPKI in 2023" or
+    "Where does Germany rank for IPv4 ROA coverage?".
+
+    Args:
+    - `ip_family` (str): The IP version to rank. Accepts '4' for IPv4 or '6' for IPv6.
+    - `date` (str, optional): The month to rank, as `YYYY-MM-DD`, `YYYY-MM` or `YYYY`; the latest month on or before it is used. Defaults to the latest month.
+    - `limit` (int, optional): Number of countries to return, 1-100. Defaults to 10.
+    - `order` (str, optional): `'top'` (highest coverage first, the default) or `'bottom'` (lowest first).
+    - `country_code` (str, optional): An ISO 3166-1 alpha-2 country code whose own rank should also be returned. A country name (e.g., `'Netherlands'`) is accepted too.
+
+    Returns:
+    A `dict` with the following structure:
+    - `status` (str): `"success"` or `"error"`.
+    - `ip_family` (str): The IP version ranked.
+    - `date` (str): The month ranked, in `YYYY-MM-DD` format.
+    - `order` (str): `"top"` or `"bottom"`.
+    - `countries` (int): Number of countries ranked.
+    - `data` (list): The ranked countries, each with `rank` (1 = highest coverage), `country_code` and `value` (coverage percentage).
+    - `country` (dict or null): Only with `country_code`; its `rank`, `country_code` and `value`, or null if it has no data for that month.
+    - `error_message` (str): Present only if status is `"error"`. A human-readable explanation of the failure.
+    - `suggestions` (list): Present only for an unknown country. Candidates, each with `country_code` and `name`.
+
+    Example:
+    {
+        "status": "success",
+        "ip_family": "4",
+        "date": "2025-07-01",
+        "order": "top",
+        "countries": 214,
+        "data": [
+            {"rank": 1, "country_code": "SA", "value": 98.7},
+            {"rank": 2, "country_code": "NL", "value": 97.2}
+        ]
+    }
+    """
+    try:
         return {
             "status": "success",
-            country_code: data
+            "ip_family": ip_family,
+            **leaderboard("roa_coverage", ip_family, date, limit, order, country_code),
         }
 
     except Exception as e:
         return {
             "status": "error",
             "error_message": str(e)
-        }
\ No newline at end of file
+        }
+
+
+# Async variants registered on the agent: same name, docstring and results,
+# but the query runs on the DB executor instead of the event loop, and results
+# are memoized in the session for follow-up questions.
+get_monthly_roa_coverage_async = session_memoized(async_tool(get_monthly_roa_coverage))
+get_monthly_roa_coverage_batch_async = session_memoized(async_tool(get_monthly_roa_coverage_batch))
+get_latest_roa_coverage_async = session_memoized(async_tool(get_latest_roa_coverage))
+get_roa_coverage_trend_async = session_memoized(async_tool(get_roa_coverage_trend))
+get_roa_coverage_ranking_async = session_memoized(async_tool(get_roa_coverage_ranking))
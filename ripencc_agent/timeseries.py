@@ -0,0 +1,168 @@
+import threading
+from typing import Optional
+
+import numpy as np
+
+from .db import data_version, query
+
+# In-memory time-series engine for trend questions.
+#
+# Trend tools used to hand the model hundreds of raw points and leave the
+# arithmetic to it. The engine loads ROA_MONTHLY and Country_IPv6_Adoption
+# once per DB version into contiguous NumPy arrays (one block per series,
+# sorted by date) and computes trend statistics over any window with
+# vectorized operations.
+
+DAYS_PER_YEAR = 365.25
+DAYS_PER_MONTH = DAYS_PER_YEAR / 12
+
+ROA_SERIES_SQL = '''
+    SELECT country_code, CAST(ip_version AS TEXT), date, percentage_space_covered_by_roa
+    FROM ROA_MONTHLY
+    WHERE percentage_space_covered_by_roa IS NOT NULL
+    ORDER BY country_code, ip_version, date
+'''
+
+IPV6_SERIES_SQL = '''
+    SELECT cc, source, date, percentage
+    FROM Country_IPv6_Adoption
+    WHERE percentage IS NOT NULL
+    ORDER BY cc, source, date
+'''
+
+
+class SeriesTable:
+    '''
+    Many time series stored back to back in contiguous arrays.
+
+    `index` maps a series key (e.g. `('NL', '4')`) to its `[start, end)` slice of
+    `days` (days since the epoch), `values` and `dates` (the original date strings).
+    '''
+
+    def __init__(self, rows: list):
+        self.index = {}
+        self.dates = [row[2] for row in rows]
+        self.values = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+        self.days = np.array(self.dates, dtype="datetime64[D]").astype(np.int64)
+
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i][:2] != rows[start][:2]:
+                self.index[rows[start][:2]] = (start, i)
+                start = i
+
+    def keys(self, prefix: str) -> list:
+        return [key for key in self.index if key[0] == prefix]
+
+    def window(self, key: tuple, start_date: Optional[str], end_date: Optional[str]) -> tuple:
+        '''
+        The `[start, end)` slice of `key` whose dates fall inside the window.
+        '''
+        start, end = self.index[key]
+        days = self.days[start:end]
+        lo = np.searchsorted(days, _day(start_date), "left") if start_date else 0
+        hi = np.searchsorted(days, _day(end_date), "right") if end_date else len(days)
+        return start + lo, start + hi
+
+
+def _day(date: str) -> int:
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def _point(table: SeriesTable, i: int) -> dict:
+    return {"date": table.dates[i], "value": round(float(table.values[i]), 4)}
+
+
+def trailing_moving_average(days: np.ndarray, values: np.ndarray, window_days: float) -> np.ndarray:
+    '''
+    Mean of the values in the trailing `window_days` up to and including each point.
+    Works on irregularly spaced series.
+    '''
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.searchsorted(days, days - window_days, "right")
+    last = np.arange(1, len(days) + 1)
+    return (sums[last] - sums[first]) / (last - first)
+
+
+def summarize(table: SeriesTable, key: tuple, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              window_months: int = 3, include_series: bool = False) -> Optional[dict]:
+    '''
+    Trend statistics of one series over a date window, or `None` if the window holds no points.
+    '''
+    lo, hi = table.window(key, start_date, end_date)
+    if hi <= lo:
+        return None
+
+    days = table.days[lo:hi]
+    values = table.values[lo:hi]
+    moving_average = trailing_moving_average(days, values, window_months * DAYS_PER_MONTH)
+
+    summary = {
+        "points": int(hi - lo),
+        "start": _point(table, lo),
+        "end": _point(table, hi - 1),
+        "change": round(float(values[-1] - values[0]), 4),
+        "min": _point(table, lo + int(np.argmin(values))),
+        "max": _point(table, lo + int(np.argmax(values))),
+        "mean": round(float(values.mean()), 4),
+        "moving_average": {
+            "window_months": window_months,
+            "latest": round(float(moving_average[-1]), 4),
+        },
+        "yoy_change": None,
+        "cagr_pct": None,
+        "slope_per_year": None,
+    }
+
+    # Year-over-year: latest point against the last point at least 365 days earlier.
+    year_ago = np.searchsorted(days, days[-1] - 365, "right") - 1
+    if year_ago >= 0:
+        summary["yoy_change"] = {
+            "from": _point(table, lo + int(year_ago)),
+            "to": _point(table, hi - 1),
+            "delta": round(float(values[-1] - values[year_ago]), 4),
+        }
+
+    years = (days - days[0]) / DAYS_PER_YEAR
+    if years[-1] > 0:
+        if values[0] > 0:
+            summary["cagr_pct"] = round(float(((values[-1] / values[0]) ** (1 / years[-1]) - 1) * 100), 4)
+        # Least-squares slope of value against time.
+        centered = years - years.mean()
+        summary["slope_per_year"] = round(float((centered * (values - values.mean())).sum() / (centered ** 2).sum()), 4)
+
+    if include_series:
+        summary["series"] = {
+            "date": table.dates[lo:hi],
+            "value": np.round(values, 4).tolist(),
+            "moving_average": np.round(moving_average, 4).tolist(),
+        }
+    return summary
+
+
+class TimeSeriesEngine:
+    '''
+    ROA coverage and IPv6 adoption series of one DB version, loaded into NumPy arrays.
+    '''
+
+    def __init__(self, version: tuple):
+        self.version = version
+        self.roa = SeriesTable(query(ROA_SERIES_SQL))
+        self.ipv6 = SeriesTable(query(IPV6_SERIES_SQL))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> TimeSeriesEngine:
+    '''
+    The engine for the current DB version, (re)loaded on first use after the DB changes.
+    '''
+    global _engine
+    version = data_version()
+    if _engine is None or _engine.version != version:
+        with _engine_lock:
+            if _engine is None or _engine.version != version:
+                _engine = TimeSeriesEngine(version)
+    return _engine
@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from ripencc_agent import answer_cache as answers
+from ripencc_agent.answer_cache import (
+    ANSWER_KEY_STATE, AnswerCacheStats, answer_from_cache, answer_key, question_tokens, remember_answer,
+    skip_answer_on_tool_error,
+)
+from ripencc_agent.cache import ToolResultCache
+from ripencc_agent.compaction import SUMMARY_STATE
+from ripencc_agent.countries import find_countries
+
+
+def test_answer_key_example():
+    assert answer_key("IPv6 adoption in Brazil since 2022 according to Google") == (
+        '["ipv6_agent", ["ipv6", "adoption", "in", "@br", "since", "2022", "according", "google"]]'
+    )
+
+
+def test_question_tokens_example():
+    assert question_tokens("Show me the ROA coverage of the Netherlands in March 2023!") == [
+        "roa", "coverage", "of", "@nl", "in", "march", "2023",
+    ]
+
+
+@pytest.mark.parametrize("first, second", [
+    ("ROA coverage of the Netherlands in March 2023", "ROA coverage of the Netherlands in June 2023"),
+    ("Is IPv6 adoption in Brazil higher than in 2020?", "Is IPv6 adoption in Brazil lower than in 2020?"),
+    ("Monthly ROA coverage of Germany for IPv4", "Yearly ROA coverage of Germany for IPv4"),
+    ("IPv6 adoption in Brazil according to Google", "IPv6 adoption in Brazil according to Facebook"),
+])
+def test_different_questions_get_different_keys(first, second):
+    assert answer_key(first) is not None
+    assert answer_key(first) != answer_key(second)
+
+
+def test_country_spelling_and_filler_words_share_a_key():
+    assert answer_key("Show me the ROA coverage of Holland") == answer_key("roa coverage of NL?")
+    assert answer_key("Top 4 ISPs in Germany") == answer_key("top 4 ISPs in DE")
+
+
+@pytest.mark.parametrize("text", [
+    "What is RPKI?",                                   # no country
+    "Hello from Brazil",                               # no route
+    "IPv6 adoption in Brazil over the last 3 years",   # relative dates
+    "Top 4 ISPs in Germany excluding Deutsche Telekom",
+])
+def test_uncacheable_questions_have_no_key(text):
+    assert answer_key(text) is None
+
+
+def test_countries_are_found_by_name_and_code():
+    assert sorted(find_countries("ROA coverage of Holland vs BR")) == ["BR", "NL"]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    version = [(1, 1, 1)]
+    monkeypatch.setattr(answers, "data_version", lambda: version[0])
+    monkeypatch.setattr(answers, "answer_cache", ToolResultCache(16, 60))
+    monkeypatch.setattr(answers, "answer_stats", AnswerCacheStats())
+    return version
+
+
+def user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def turn(text: str, *earlier: types.Content, state: dict = None):
+    context = SimpleNamespace(state=dict(state or {}), invocation_id="test")
+    return context, answer_from_cache(context, LlmRequest(contents=[*earlier, user(text)]))
+
+
+def answer(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def test_answers_are_served_for_their_db_version(cache):
+    context, response = turn("IPv6 adoption in Brazil")
+    assert response is None
+    assert context.state[ANSWER_KEY_STATE] == answer_key("IPv6 adoption in Brazil")
+    # A tool call is not the final answer.
+    remember_answer(context, LlmResponse(content=types.Content(role="model", parts=[
+        types.Part(function_call=types.FunctionCall(name="get_ipv6", args={})),
+    ])))
+    remember_answer(context, answer("Brazil: 48%"))
+    assert context.state[ANSWER_KEY_STATE] == ""
+
+    context, response = turn("Show me the IPv6 adoption in Brazil")
+    assert response.content.parts[0].text == "Brazil: 48%"
+    assert context.state[ANSWER_KEY_STATE] == ""
+
+    cache[0] = (2, 1, 1)
+    _, response = turn("IPv6 adoption in Brazil")
+    assert response is None
+    assert answers.answer_stats.snapshot()["hits"] == 1
+
+
+def test_only_first_turns_are_looked_up_and_stored(cache):
+    context, _ = turn("IPv6 adoption in Brazil")
+    remember_answer(context, answer("Brazil: 48%"))
+
+    earlier = (user("ROA coverage of Germany"), types.Content(role="model", parts=[types.Part(text="Germany: 90%")]))
+    context, response = turn("IPv6 adoption in Brazil", *earlier)
+    assert response is None
+    assert context.state[ANSWER_KEY_STATE] == ""
+
+    context, response = turn("IPv6 adoption in Brazil", state={SUMMARY_STATE: "Turn 1: ROA coverage of Germany"})
+    assert response is None
+    remember_answer(context, answer("Brazil: 50%"))
+
+    _, response = turn("IPv6 adoption in Brazil")
+    assert response.content.parts[0].text == "Brazil: 48%"
+    assert answers.answer_stats.snapshot()["stores"] == 1
+
+
+def test_failed_tool_calls_are_not_cached(cache):
+    context, _ = turn("IPv6 adoption in Brazil")
+    skip_answer_on_tool_error(None, {}, SimpleNamespace(state=context.state), {"status": "error", "error_message": "timeout"})
+    remember_answer(context, answer("Sorry, the data is unavailable."))
+
+    _, response = turn("IPv6 adoption in Brazil")
+    assert response is None
+    assert answers.answer_stats.snapshot()["stores"] == 0
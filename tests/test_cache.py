@@ -0,0 +1,67 @@
+from ripencc_agent import cache
+from ripencc_agent.cache import ToolResultCache, cached_tool
+
+
+def test_entries_are_only_valid_for_their_db_version():
+    results = ToolResultCache(max_entries=4, ttl_seconds=60)
+    results.put("key", (1, 100, 5), {"status": "success"})
+
+    assert results.get("key", (1, 100, 5)) == (True, {"status": "success"})
+    assert results.get("key", (2, 100, 5)) == (False, None)
+    # The outdated entry is dropped, not kept for the old version.
+    assert results.get("key", (1, 100, 5)) == (False, None)
+
+    stats = results.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_entries_expire_after_the_ttl():
+    results = ToolResultCache(max_entries=4, ttl_seconds=-1)
+    results.put("key", "v1", {"status": "success"})
+
+    assert results.get("key", "v1") == (False, None)
+    assert results.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    results = ToolResultCache(max_entries=2, ttl_seconds=60)
+    results.put("a", "v1", 1)
+    results.put("b", "v1", 2)
+    results.get("a", "v1")
+    results.put("c", "v1", 3)
+
+    assert results.get("b", "v1") == (False, None)
+    assert results.get("a", "v1") == (True, 1)
+    assert results.get("c", "v1") == (True, 3)
+    assert results.stats()["evictions"] == 1
+
+
+def test_cached_tool_normalizes_arguments_and_caches_only_successes(monkeypatch):
+    version = [(1, 1, 1)]
+    monkeypatch.setattr(cache, "data_version", lambda: version[0])
+    monkeypatch.setattr(cache, "tool_cache", ToolResultCache(max_entries=8, ttl_seconds=60))
+    calls = []
+
+    @cached_tool
+    def get_rows(country_code: str, source: str = "apnic") -> dict:
+        '''Rows for a country.'''
+        calls.append((country_code, source))
+        if source == "broken":
+            return {"status": "error", "error_message": "no data"}
+        return {"status": "success", "country_code": country_code}
+
+    assert get_rows.__name__ == "get_rows"
+    assert get_rows.__doc__ == "Rows for a country."
+
+    assert get_rows(" nl ") == {"status": "success", "country_code": "NL"}
+    assert get_rows("NL", source="APNIC ") == {"status": "success", "country_code": "NL"}
+    assert calls == [("NL", "apnic")]
+
+    get_rows("NL", source="broken")
+    get_rows("NL", source="broken")
+    assert calls[1:] == [("NL", "broken"), ("NL", "broken")]
+
+    version[0] = (2, 1, 1)
+    get_rows("NL")
+    assert calls[-1] == ("NL", "apnic")
+    assert len(calls) == 4
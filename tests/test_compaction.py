@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from ripencc_agent import compaction
+from ripencc_agent.compaction import (
+    CONTEXT_PREFIX, PART_MAX_BYTES, SUMMARY_HEADER, SUMMARY_STATE, compact_history, compact_response, render_summary,
+)
+
+LARGE = {"status": "success", "country_code": "NL", "data": list(range(PART_MAX_BYTES))}
+
+
+def test_small_results_are_kept_whole():
+    response = {"status": "success", "data": [1, 2, 3]}
+    assert compact_response(response) is response
+    assert compact_response("not a dict") == "not a dict"
+
+
+def test_large_results_keep_their_scalars():
+    compacted = compact_response(LARGE)
+    assert compacted["status"] == "success" and compacted["country_code"] == "NL"
+    assert "data" not in compacted
+    assert compacted["compacted"].startswith("data omitted (")
+
+
+def test_summary_lists_every_digest():
+    summary = render_summary([
+        {"question": "IPv6 in NL?", "agent": "ipv6_agent", "tools": ["get_country_ipv6_adoption_rate"], "answer": "About 60%."},
+        {"question": "And DE?", "agent": "ipv6_agent"},
+    ])
+    assert summary.splitlines() == [
+        SUMMARY_HEADER,
+        "- User: IPv6 in NL?",
+        "  ipv6_agent via get_country_ipv6_adoption_rate: About 60%.",
+        "- User: And DE?",
+        "  ipv6_agent",
+    ]
+
+
+def user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def tool_result(response: dict) -> types.Content:
+    return types.Content(role="user", parts=[
+        types.Part(function_response=types.FunctionResponse(name="get_data", response=response)),
+    ])
+
+
+def model(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def test_history_keeps_the_last_turns_and_digests_the_rest(monkeypatch):
+    monkeypatch.setattr(compaction, "KEEP_TURNS", 2)
+    contents = [
+        user("IPv6 in NL?"), tool_result(LARGE), model("About 60%."),
+        user("And DE?"), tool_result(LARGE), user(f"{CONTEXT_PREFIX} [ipv6_agent] said ..."), model("About 70%."),
+        user("And BE?"),
+    ]
+    digests = [{"question": "IPv6 in NL?", "agent": "ipv6_agent"}, {"question": "And DE?", "agent": "ipv6_agent"}]
+    request = LlmRequest(contents=list(contents))
+
+    compact_history(SimpleNamespace(state={SUMMARY_STATE: digests}), request)
+
+    summary, *window = request.contents
+    # Only the first turn is summarized; the second is still sent, its large result compacted.
+    assert summary.parts[0].text == render_summary(digests[:1])
+    assert [content.parts[0].text for content in window if content.parts[0].text] == [
+        "And DE?", f"{CONTEXT_PREFIX} [ipv6_agent] said ...", "About 70%.", "And BE?",
+    ]
+    assert "compacted" in window[1].parts[0].function_response.response
+    assert window[-1] is contents[-1]
+
+
+def test_short_history_is_left_alone(monkeypatch):
+    monkeypatch.setattr(compaction, "KEEP_TURNS", 3)
+    contents = [user("IPv6 in NL?"), model("About 60%."), user("And DE?")]
+    request = LlmRequest(contents=list(contents))
+
+    compact_history(SimpleNamespace(state={}), request)
+    assert request.contents == contents
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from ripencc_agent.concentration import compute_concentration, install_concentration, update_concentration
+
+
+def hhi_by_hand(subs: list) -> float:
+    total = sum(subs)
+    return sum((value / total * 100) ** 2 for value in subs)
+
+
+def test_compute_concentration_by_hand():
+    rows = [("NL", "2025-01-01", 50), ("NL", "2025-01-01", 30), ("NL", "2025-01-01", 20),
+            ("DE", "2025-01-01", 100), ("NL", "2025-02-01", 0), ("NL", "2025-02-01", None)]
+    assert compute_concentration(rows) == [
+        ("DE", "2025-01-01", 100, 1, 10000.0, 100.0, 100.0),
+        ("NL", "2025-01-01", 100, 3, 3800.0, 100.0, 100.0),
+    ]
+    assert compute_concentration([]) == []
+
+
+def test_cr4_and_cr8_take_the_largest_asns():
+    subs = [7, 3, 10, 1, 9, 5, 2, 8, 4, 6]
+    (_, _, total, count, hhi, cr4, cr8), = compute_concentration([("NL", "2025-01-01", value) for value in subs])
+    assert (total, count) == (55, 10)
+    assert hhi == pytest.approx(hhi_by_hand(subs), abs=0.01)
+    assert cr4 == pytest.approx((10 + 9 + 8 + 7) / 55 * 100, abs=0.01)
+    assert cr8 == pytest.approx((55 - 1 - 2) / 55 * 100, abs=0.01)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE ASN_Subscribers (date TEXT, cc TEXT, asn TEXT, asn_name TEXT, subs INTEGER)")
+    conn.executemany("INSERT INTO ASN_Subscribers VALUES (?, ?, ?, ?, ?)", [
+        (date, cc, str(asn), f"AS{asn}", subs)
+        for date in ("2025-01-01", "2025-02-01", "2025-03-01")
+        for cc, shares in (("NL", (60, 30, 10)), ("DE", (25, 25, 25, 25)))
+        for asn, subs in enumerate(shares)
+    ])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def stored(conn: sqlite3.Connection, date: str) -> list:
+    return conn.execute("SELECT * FROM ASN_Concentration WHERE date = ? ORDER BY cc", (date,)).fetchall()
+
+
+def test_install_fills_every_month(conn):
+    assert install_concentration(conn) is True
+    assert update_concentration(conn, batch_months=2) == ["2025-01-01", "2025-02-01", "2025-03-01"]
+    assert stored(conn, "2025-02-01") == [
+        ("DE", "2025-02-01", 100, 4, 2500.0, 100.0, 100.0),
+        ("NL", "2025-02-01", 100, 3, round(hhi_by_hand([60, 30, 10]), 2), 100.0, 100.0),
+    ]
+    assert install_concentration(conn) is False
+    assert update_concentration(conn) == []
+
+
+def test_update_recomputes_only_changed_months(conn):
+    install_concentration(conn)
+    update_concentration(conn)
+
+    with conn:
+        conn.execute("UPDATE ASN_Subscribers SET subs = 90 WHERE cc = 'NL' AND asn = '0' AND date = '2025-03-01'")
+        conn.execute("UPDATE ASN_Subscribers SET date = '2025-04-01' WHERE cc = 'DE' AND date = '2025-02-01'")
+    assert update_concentration(conn) == ["2025-02-01", "2025-03-01", "2025-04-01"]
+
+    assert [row[0] for row in stored(conn, "2025-02-01")] == ["NL"]
+    assert stored(conn, "2025-03-01")[1][4] == round(hhi_by_hand([90, 30, 10]), 2)
+    assert [row[0] for row in stored(conn, "2025-04-01")] == ["DE"]
+
+    with conn:
+        conn.execute("DELETE FROM ASN_Subscribers WHERE date = '2025-01-01'")
+    assert update_concentration(conn) == ["2025-01-01"]
+    assert stored(conn, "2025-01-01") == []
+
+
+def test_nothing_to_do_without_subscribers():
+    conn = sqlite3.connect(":memory:")
+    assert install_concentration(conn) is False
+    assert update_concentration(conn) == []
@@ -0,0 +1,55 @@
+import pytest
+
+from ripencc_agent.cache import cached_tool
+from ripencc_agent.countries import CountryResolver, UnknownCountryError, find_countries, resolve_country
+
+
+@pytest.mark.parametrize("value, code", [
+    ("NL", "NL"),
+    (" nl ", "NL"),
+    ("The Netherlands", "NL"),
+    ("Holland", "NL"),
+    ("germ", "DE"),
+    ("Gremany", "DE"),
+    ("Côte d'Ivoire", "CI"),
+    ("cote divoire", "CI"),
+])
+def test_resolve_country(value, code):
+    assert resolve_country(value) == code
+
+
+def test_unknown_country_suggests_candidates():
+    with pytest.raises(UnknownCountryError) as error:
+        resolve_country("Nig")
+    assert {"NG", "NE"} <= set(error.value.suggestions)
+
+
+def test_unknown_code_has_no_suggestions():
+    with pytest.raises(UnknownCountryError) as error:
+        resolve_country("XQ")
+    assert error.value.suggestions == []
+
+
+def test_resolver_caches_answers():
+    resolver = CountryResolver()
+    assert resolver.resolve("Germany") == resolver.resolve("Germany") == "DE"
+    assert resolver.lookup.cache_info().hits == 1
+
+
+def test_find_countries_in_text():
+    assert find_countries("DE vs Germany vs NL") == ["DE", "NL"]
+    assert find_countries("it is what it is") == []
+
+
+def test_cached_tool_reports_unknown_countries_without_running():
+    calls = []
+
+    @cached_tool
+    def get_rows(country_code: str) -> dict:
+        calls.append(country_code)
+        return {"status": "success"}
+
+    result = get_rows("Nig")
+    assert result["status"] == "error"
+    assert {"country_code": "NG", "name": "Nigeria"} in result["suggestions"]
+    assert calls == []
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from ripencc_agent import db
+
+
+def _make_db(path, values):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(v,) for v in values])
+    conn.close()
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "insights.db")
+    _make_db(path, [1, 2, 3])
+    pool = db.ConnectionPool(path)
+    yield pool
+    pool.close_all()
+
+
+def test_connection_is_reused_per_thread(pool):
+    assert pool.connection() is pool.connection()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not pool.connection()
+
+
+def test_connection_is_read_only(pool):
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connection().execute("INSERT INTO t VALUES (4)")
+
+
+def test_reopens_when_the_file_is_replaced(pool, tmp_path):
+    conn = pool.connection()
+    assert conn.execute("SELECT SUM(v) FROM t").fetchone() == (6,)
+
+    rebuilt = str(tmp_path / "rebuilt.db")
+    _make_db(rebuilt, [10, 20])
+    os.replace(rebuilt, pool.db_path)
+
+    fresh = pool.connection()
+    assert fresh is not conn
+    assert fresh.execute("SELECT SUM(v) FROM t").fetchone() == (30,)
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_recycled_thread_ident_closes_the_dead_threads_connection(pool):
+    # A connection left behind under this ident by a thread that has exited.
+    stale = sqlite3.connect(":memory:", check_same_thread=False)
+    result = {}
+
+    def worker():
+        pool._connections[threading.get_ident()] = stale
+        result["conn"] = pool.connection()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert pool._connections[thread.ident] is result["conn"]
+    with pytest.raises(sqlite3.ProgrammingError):
+        stale.execute("SELECT 1")
+
+
+def test_query_reads_through_the_pool(pool, tmp_path):
+    assert db.query("SELECT v FROM t WHERE v > ? ORDER BY v", (1,), db_path=pool.db_path) == [(2,), (3,)]
+    db.close_all()
@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from ripencc_agent import db, executor
+from ripencc_agent.executor import async_tool
+
+SLOW_SQL = '''
+    WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < 1000000000)
+    SELECT COUNT(*) FROM counter
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "insights.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.execute("INSERT INTO t VALUES (42)")
+    conn.close()
+    yield path
+    db.get_pool(path).close_all()
+
+
+@pytest.fixture
+def single_worker():
+    # One worker thread: a query left running after a timeout would block the next call.
+    executor.configure(max_workers=1)
+    yield
+    executor.shutdown()
+    executor.configure(max_workers=8)
+
+
+def test_timeout_interrupts_the_query_and_returns_an_error(db_path, single_worker):
+    outcomes = []
+
+    def get_count(slow: bool) -> dict:
+        '''Counts rows.'''
+        try:
+            rows = db.query(SLOW_SQL if slow else "SELECT v FROM t", db_path=db_path)
+        except sqlite3.OperationalError as e:
+            outcomes.append((threading.get_ident(), str(e)))
+            raise
+        return {"status": "success", "rows": rows}
+
+    tool = async_tool(get_count, timeout_seconds=0.3)
+    assert tool.__name__ == "get_count"
+
+    # The calling thread's own pooled connection must not be the one interrupted.
+    db.query("SELECT v FROM t", db_path=db_path)
+
+    result = asyncio.run(tool(slow=True))
+    assert result["status"] == "error"
+    assert "did not finish within 0.3 seconds" in result["error_message"]
+
+    assert asyncio.run(tool(slow=False)) == {"status": "success", "rows": [(42,)]}
+    assert len(outcomes) == 1
+    worker, message = outcomes[0]
+    assert worker != threading.get_ident()
+    assert "interrupted" in message
+    assert db.query("SELECT v FROM t", db_path=db_path) == [(42,)]
+
+
+def test_result_is_returned_unchanged(db_path):
+    def get_value(offset: int = 0) -> dict:
+        return {"status": "success", "value": db.query("SELECT v FROM t", db_path=db_path)[0][0] + offset}
+
+    assert asyncio.run(async_tool(get_value)(offset=1)) == {"status": "success", "value": 43}
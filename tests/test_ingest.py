@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+from ripencc_agent import db
+from ripencc_agent.ingest import ingest, main
+
+FIELDS = ["date", "country_code", "ip_version", "percentage_space_covered_by_roa"]
+
+
+def write_csv(path, rows: list) -> str:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+    return str(path)
+
+
+def read_table(db_path: str, sql: str) -> list:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "insights.db")
+
+
+def test_load_upserts_on_the_natural_key(db_path, tmp_path):
+    first = write_csv(tmp_path / "roa_1.csv", [
+        ("2025-01-01", "NL", 4, 50.0),
+        ("2025-02-01", "NL", 4, 51.0),
+        ("2025-02-01", "NL", 6, 20.0),
+    ])
+    stats = ingest("ROA_MONTHLY", first, db_path, batch_rows=2, transaction_rows=2, verbose=False)
+    assert (stats["read"], stats["written"], stats["skipped"]) == (3, 3, 0)
+
+    second = write_csv(tmp_path / "roa_2.csv", [("2025-02-01", "NL", 4, 99.0)])
+    ingest("ROA_MONTHLY", second, db_path, verbose=False)
+
+    assert read_table(db_path, '''
+        SELECT date, ip_version, percentage_space_covered_by_roa FROM ROA_MONTHLY ORDER BY date, ip_version
+    ''') == [("2025-01-01", 4, 50.0), ("2025-02-01", 4, 99.0), ("2025-02-01", 6, 20.0)]
+    assert read_table(db_path, "SELECT date FROM Latest_ROA_Monthly_Date WHERE ip_version = 4") == [("2025-02-01",)]
+    assert read_table(db_path, "PRAGMA journal_mode") == [("delete",)]
+
+
+def test_incremental_load_skips_loaded_dates(db_path, tmp_path):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_1.csv", [("2025-02-01", "NL", 4, 50.0)]), db_path, verbose=False)
+
+    dump = write_csv(tmp_path / "roa_2.csv", [
+        ("2025-01-01", "NL", 4, 1.0),
+        ("2025-02-01", "NL", 4, 1.0),
+        ("2025-03-01", "NL", 4, 1.0),
+        ("2025-01-01", "NL", 6, 1.0),  # a series that was not loaded yet
+    ])
+    stats = ingest("ROA_MONTHLY", dump, db_path, incremental=True, verbose=False)
+
+    assert (stats["written"], stats["skipped"]) == (2, 2)
+    assert read_table(db_path, "SELECT COUNT(*) FROM ROA_MONTHLY") == [(3,)]
+
+
+def test_json_lines_dumps(db_path, tmp_path):
+    dump = tmp_path / "ipv6.jsonl"
+    dump.write_text(
+        '{"cc": "NL", "date": "2025-01-01", "percentage": 60.5, "source": "google"}\n'
+        '\n'
+        '{"cc": "NL", "date": "2025-01-01", "percentage": 58.0, "source": "apnic"}\n'
+    )
+    assert ingest("Country_IPv6_Adoption", str(dump), db_path, verbose=False)["written"] == 2
+
+
+def test_invalid_input_is_rejected(db_path, tmp_path):
+    with pytest.raises(ValueError, match="Unknown table"):
+        ingest("Nope", str(tmp_path / "x.csv"), db_path, verbose=False)
+    with pytest.raises(ValueError, match="Unsupported dump format"):
+        ingest("ROA_MONTHLY", str(tmp_path / "x.xml"), db_path, verbose=False)
+
+    dump = tmp_path / "bad.jsonl"
+    dump.write_text('{"date": "2025-01-01", "country_code": "NL"}\n')
+    with pytest.raises(ValueError, match="missing columns"):
+        ingest("ROA_MONTHLY", str(dump), db_path, verbose=False)
+
+
+def test_load_swaps_in_a_new_file(db_path, tmp_path):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_1.csv", [("2025-01-01", "NL", 4, 50.0)]), db_path, verbose=False)
+    inode = os.stat(db_path).st_ino
+
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_2.csv", [("2025-02-01", "NL", 4, 51.0)]), db_path, verbose=False)
+
+    assert os.stat(db_path).st_ino != inode
+    assert sorted(os.listdir(tmp_path)) == ["insights.db", "insights.db.lock", "roa_1.csv", "roa_2.csv"]
+
+
+def test_failed_load_leaves_the_db_untouched(db_path, tmp_path):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa.csv", [("2025-01-01", "NL", 4, 50.0)]), db_path, verbose=False)
+    inode = os.stat(db_path).st_ino
+
+    dump = tmp_path / "roa.jsonl"
+    row = {"date": "2025-02-01", "country_code": "NL", "ip_version": 4, "percentage_space_covered_by_roa": 1.0}
+    dump.write_text(json.dumps(row) + "\n" + "{not json\n")
+    with pytest.raises(ValueError):
+        ingest("ROA_MONTHLY", str(dump), db_path, batch_rows=1, transaction_rows=1, verbose=False)
+
+    assert os.stat(db_path).st_ino == inode
+    assert read_table(db_path, "SELECT date FROM ROA_MONTHLY") == [("2025-01-01",)]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_live_pool_reads_the_swapped_db(db_path, tmp_path):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_1.csv", [("2025-01-01", "NL", 4, 50.0)]), db_path, verbose=False)
+    pool = db.ConnectionPool(db_path)
+    try:
+        sql = "SELECT percentage_space_covered_by_roa FROM ROA_MONTHLY"
+        assert pool.connection().execute(sql).fetchall() == [(50.0,)]
+
+        with db.writable_copy(db_path) as conn:
+            conn.execute("UPDATE ROA_MONTHLY SET percentage_space_covered_by_roa = 75.0")
+            assert pool.connection().execute(sql).fetchall() == [(50.0,)]
+
+        assert pool.connection().execute(sql).fetchall() == [(75.0,)]
+    finally:
+        pool.close_all()
+
+
+def test_cli_loads_every_dump_into_one_copy(db_path, tmp_path, monkeypatch, capsys):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_0.csv", [("2025-01-01", "NL", 4, 50.0)]), db_path, verbose=False)
+    first = write_csv(tmp_path / "roa_1.csv", [("2025-02-01", "NL", 4, 51.0)])
+    second = write_csv(tmp_path / "roa_2.csv", [("2025-03-01", "NL", 4, 52.0)])
+    copies = []
+    writable_copy = db.writable_copy
+    monkeypatch.setattr("ripencc_agent.ingest.writable_copy", lambda path: copies.append(path) or writable_copy(path))
+    monkeypatch.setattr(sys, "argv", ["ingest", "ROA_MONTHLY", first, second, "--db", db_path])
+
+    main()
+
+    assert copies == [db_path]
+    assert read_table(db_path, "SELECT date FROM ROA_MONTHLY ORDER BY date") == [("2025-01-01",), ("2025-02-01",), ("2025-03-01",)]
+    *per_path, total = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(stats["path"], stats["written"]) for stats in per_path] == [(first, 1), (second, 1)]
+    assert (total["paths"], total["written"]) == (2, 2)
+
+
+def test_concurrent_loads_take_turns(db_path, tmp_path):
+    ingest("ROA_MONTHLY", write_csv(tmp_path / "roa_0.csv", [("2025-01-01", "NL", 4, 50.0)]), db_path, verbose=False)
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_writer():
+        with db.writable_copy(db_path) as conn:
+            conn.execute("INSERT INTO ROA_MONTHLY VALUES ('2025-02-01', 'NL', 4, 51.0)")
+            entered.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=slow_writer)
+    thread.start()
+    entered.wait(10)
+    loader = threading.Thread(target=ingest, args=(
+        "ROA_MONTHLY", write_csv(tmp_path / "roa_1.csv", [("2025-03-01", "NL", 4, 52.0)]), db_path,
+    ), kwargs={"verbose": False})
+    loader.start()
+    loader.join(0.5)
+    assert loader.is_alive()  # waiting for the lock
+    release.set()
+    thread.join()
+    loader.join(10)
+
+    # The second load copied the first one's result rather than renaming over it.
+    assert read_table(db_path, "SELECT date FROM ROA_MONTHLY ORDER BY date") == [("2025-01-01",), ("2025-02-01",), ("2025-03-01",)]
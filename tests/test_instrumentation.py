@@ -0,0 +1,191 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sqlite3
+from typing import AsyncGenerator
+
+import pytest
+from google.adk import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from ripencc_agent import db, instrumentation
+from ripencc_agent.instrumentation import Metrics
+
+
+def test_render_counters_and_histograms():
+    metrics = Metrics()
+    metrics.inc("ripencc_tool_calls_total", (("tool", "get_roa"), ("status", "success")))
+    metrics.inc("ripencc_tool_calls_total", (("tool", "get_roa"), ("status", "success")), 2)
+    metrics.inc("ripencc_model_tokens_total", (("agent", 'a"b'), ("kind", "prompt")), 7)
+    metrics.observe("ripencc_tool_rows", 5, (("tool", "get_roa"),))
+    metrics.observe("ripencc_tool_rows", 500, (("tool", "get_roa"),))
+
+    lines = metrics.render().splitlines()
+    assert "# HELP ripencc_turns_total User turns handled." in lines
+    assert "# TYPE ripencc_tool_rows histogram" in lines
+    assert 'ripencc_tool_calls_total{tool="get_roa",status="success"} 3' in lines
+    assert 'ripencc_model_tokens_total{agent="a\\"b",kind="prompt"} 7' in lines
+    assert 'ripencc_tool_rows_bucket{tool="get_roa",le="1"} 0' in lines
+    assert 'ripencc_tool_rows_bucket{tool="get_roa",le="10"} 1' in lines
+    assert 'ripencc_tool_rows_bucket{tool="get_roa",le="1000"} 2' in lines
+    assert 'ripencc_tool_rows_bucket{tool="get_roa",le="+Inf"} 2' in lines
+    assert 'ripencc_tool_rows_sum{tool="get_roa"} 505' in lines
+    assert 'ripencc_tool_rows_count{tool="get_roa"} 2' in lines
+
+
+class ToolThenTextModel(BaseLlm):
+    '''
+    Calls `count_rows` once, then answers with text once the result is in.
+    '''
+
+    model: str = "stub"
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        last = llm_request.contents[-1]
+        if any(part.function_response for part in last.parts):
+            part = types.Part(text="done")
+        else:
+            part = types.Part(function_call=types.FunctionCall(name="count_rows", args={}))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=11, candidates_token_count=3),
+        )
+
+
+def run_turn(db_path: str, callbacks=instrumentation) -> None:
+    def count_rows() -> dict:
+        '''Counts the rows of t.'''
+        return {"status": "success", "rows": db.query("SELECT v FROM t", db_path=db_path)}
+
+    agent = Agent(
+        name="data_agent",
+        model=ToolThenTextModel(),
+        tools=[count_rows],
+        before_agent_callback=callbacks.before_agent,
+        after_agent_callback=callbacks.after_agent,
+        before_model_callback=callbacks.before_model,
+        after_model_callback=callbacks.after_model,
+        before_tool_callback=callbacks.before_tool,
+        after_tool_callback=callbacks.after_tool,
+    )
+    runner = InMemoryRunner(agent=agent, app_name="instrumentation_test")
+
+    async def turn():
+        session = await runner.session_service.create_session(app_name="instrumentation_test", user_id="user")
+        message = types.Content(role="user", parts=[types.Part(text="How many rows?")])
+        async for _ in runner.run_async(user_id="user", session_id=session.id, new_message=message):
+            pass
+
+    asyncio.run(turn())
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "insights.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,), (3,)])
+    conn.close()
+    return path
+
+
+def test_sampled_turn_is_traced_and_measured(db_path, tmp_path, monkeypatch):
+    trace_path = tmp_path / "trace.jsonl"
+    metrics_path = tmp_path / "metrics.prom"
+    monkeypatch.setattr(instrumentation, "TRACE_PATH", str(trace_path))
+    monkeypatch.setattr(instrumentation, "METRICS_PATH", str(metrics_path))
+    monkeypatch.setattr(instrumentation, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(instrumentation, "METRICS_FLUSH_SECONDS", 0.0)
+
+    run_turn(db_path)
+
+    records = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert [record["type"] for record in records] == ["model", "tool", "model", "agent", "turn"]
+    assert len({record["invocation_id"] for record in records}) == 1
+    model, tool, _, agent, turn = records
+    assert (model["agent"], model["prompt_tokens"], model["completion_tokens"]) == ("data_agent", 11, 3)
+    assert (tool["tool"], tool["status"], tool["queries"], tool["rows"]) == ("count_rows", "success", 1, 3)
+    assert tool["payload_bytes"] == len('{"status":"success","rows":[[1],[2],[3]]}')
+    assert agent["agent"] == turn["agent"] == "data_agent"
+    assert turn["transfers"] == 0
+    assert turn["seconds"] >= agent["seconds"] >= tool["seconds"]
+
+    text = metrics_path.read_text()
+    for line in [
+        'ripencc_tool_calls_total{tool="count_rows",agent="data_agent",status="success"}',
+        'ripencc_tool_sql_queries_total{tool="count_rows"}',
+        'ripencc_tool_rows_count{tool="count_rows"}',
+        'ripencc_model_calls_total{agent="data_agent"}',
+        'ripencc_model_tokens_total{agent="data_agent",kind="completion"}',
+        "ripencc_turns_total",
+        "ripencc_turn_seconds_count",
+    ]:
+        assert line in text
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unsampled_turn_writes_no_trace(db_path, tmp_path, monkeypatch):
+    trace_path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(instrumentation, "TRACE_PATH", str(trace_path))
+    monkeypatch.setattr(instrumentation, "METRICS_PATH", "")
+    monkeypatch.setattr(instrumentation, "TRACE_SAMPLE_RATE", 0.0)
+
+    before = instrumentation.metrics.render()
+    run_turn(db_path)
+
+    assert not trace_path.exists()
+    assert instrumentation.metrics.render() != before
+
+
+def load_instrumentation():
+    '''
+    A fresh copy of the module, so its paths are read from the current environment.
+    '''
+    spec = importlib.util.spec_from_file_location("ripencc_agent._instrumentation_env", instrumentation.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_nothing_is_written_without_a_runtime_dir(db_path, tmp_path, monkeypatch):
+    for name in ["RIPENCC_RUNTIME_DIR", "RIPENCC_TRACE_PATH", "RIPENCC_METRICS_PATH"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("RIPENCC_TRACE_SAMPLE_RATE", "1")
+    monkeypatch.setenv("RIPENCC_METRICS_FLUSH_SECONDS", "0")
+    monkeypatch.chdir(tmp_path)
+    data_dir = os.path.join(os.path.dirname(instrumentation.__file__), "data")
+    data_files = sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []
+
+    module = load_instrumentation()
+    assert module.TRACE_PATH == module.METRICS_PATH == ""
+    run_turn(db_path, module)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["insights.db"]
+    assert (sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []) == data_files
+    assert 'ripencc_turns_total 1' in module.metrics.render().splitlines()
+
+
+def test_runtime_dir_holds_the_trace_and_metrics(db_path, tmp_path, monkeypatch):
+    runtime_dir = tmp_path / "run"
+    runtime_dir.mkdir()
+    monkeypatch.delenv("RIPENCC_TRACE_PATH", raising=False)
+    monkeypatch.delenv("RIPENCC_METRICS_PATH", raising=False)
+    monkeypatch.setenv("RIPENCC_RUNTIME_DIR", str(runtime_dir))
+    monkeypatch.setenv("RIPENCC_TRACE_SAMPLE_RATE", "1")
+    monkeypatch.setenv("RIPENCC_METRICS_FLUSH_SECONDS", "0")
+
+    module = load_instrumentation()
+    assert module.TRACE_PATH == str(runtime_dir / "trace.jsonl")
+    run_turn(db_path, module)
+
+    assert sorted(p.name for p in runtime_dir.iterdir()) == ["metrics.prom", "trace.jsonl"]
+    turn = json.loads((runtime_dir / "trace.jsonl").read_text().splitlines()[-1])
+    assert (turn["type"], turn["agent"], turn["transfers"]) == ("turn", "data_agent", 0)
+    assert {"ts", "invocation_id", "seconds"} <= set(turn)
+    text = (runtime_dir / "metrics.prom").read_text()
+    assert 'ripencc_tool_calls_total{tool="count_rows",agent="data_agent",status="success"} 1' in text
+    assert "ripencc_turns_total 1" in text
@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+
+from ripencc_agent.materialized import SNAPSHOTS, install_latest_snapshots
+
+MONTHS = ["2024-01-01", "2024-02-01", "2024-03-01"]
+
+
+def assert_snapshots_fresh(conn: sqlite3.Connection):
+    '''
+    Each snapshot table must hold exactly what a full rebuild would produce.
+    '''
+    for snapshot_table, ddl, rebuild_sql, _ in SNAPSHOTS.values():
+        conn.execute(ddl.replace(snapshot_table, "temp.expected"))
+        conn.execute(rebuild_sql.replace(f"INTO {snapshot_table}", "INTO temp.expected"))
+        stored = sorted(conn.execute(f"SELECT * FROM {snapshot_table}").fetchall())
+        expected = sorted(conn.execute("SELECT * FROM temp.expected").fetchall())
+        conn.execute("DROP TABLE temp.expected")
+        assert stored == expected, snapshot_table
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "insights.db")
+    conn.execute("CREATE TABLE ROA_MONTHLY (date TEXT, country_code TEXT, ip_version INTEGER, percentage_space_covered_by_roa REAL)")
+    conn.execute("CREATE TABLE Country_IPv6_Adoption (cc TEXT, date TEXT, percentage REAL, source TEXT)")
+    conn.execute("CREATE TABLE Top_4_ASNs (date TEXT, cc TEXT, asn_name TEXT, asn TEXT, subs INTEGER, percentage REAL)")
+    for i, month in enumerate(MONTHS):
+        for cc in ("NL", "DE"):
+            for version in (4, 6):
+                conn.execute("INSERT INTO ROA_MONTHLY VALUES (?, ?, ?, ?)", (month, cc, version, 50.0 + i))
+            for source in ("google", "apnic"):
+                conn.execute("INSERT INTO Country_IPv6_Adoption VALUES (?, ?, ?, ?)", (cc, month, 30.0 + i, source))
+            for rank in range(4):
+                conn.execute(
+                    "INSERT INTO Top_4_ASNs VALUES (?, ?, ?, ?, ?, ?)",
+                    (month, cc, f"AS{rank} Test", str(rank), 100 - rank, 25.0),
+                )
+    conn.commit()
+    install_latest_snapshots(conn)
+    yield conn
+    conn.close()
+
+
+def test_install_fills_the_snapshots(conn):
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT date FROM Latest_Top_4_ASNs_Date WHERE cc = 'NL'").fetchone() == ("2024-03-01",)
+    assert conn.execute(
+        "SELECT date, percentage FROM Latest_IPv6_Adoption WHERE cc = 'DE' AND source = 'google'"
+    ).fetchone() == ("2024-03-01", 32.0)
+
+
+def test_insert_moves_latest_forward(conn):
+    conn.execute("INSERT INTO ROA_MONTHLY VALUES ('2024-04-01', 'NL', 4, 60.0)")
+    conn.execute("INSERT INTO Country_IPv6_Adoption VALUES ('NL', '2024-04-01', 40.0, 'google')")
+    conn.execute("INSERT INTO Top_4_ASNs VALUES ('2024-04-01', 'NL', 'AS9 Test', '9', 10, 50.0)")
+    # An older row does not move anything back.
+    conn.execute("INSERT INTO Top_4_ASNs VALUES ('2023-01-01', 'DE', 'AS9 Test', '9', 10, 50.0)")
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT date FROM Latest_Top_4_ASNs_Date WHERE cc = 'NL'").fetchone() == ("2024-04-01",)
+
+
+def test_update_lowering_the_latest_date(conn):
+    conn.execute("UPDATE Top_4_ASNs SET date = '2000-01-01' WHERE cc = 'NL' AND date = '2024-03-01'")
+    conn.execute("UPDATE ROA_MONTHLY SET date = '2000-01-01' WHERE country_code = 'NL' AND ip_version = 4 AND date = '2024-03-01'")
+    conn.execute("UPDATE Country_IPv6_Adoption SET date = '2000-01-01' WHERE cc = 'NL' AND source = 'google' AND date = '2024-03-01'")
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT date FROM Latest_Top_4_ASNs_Date WHERE cc = 'NL'").fetchone() == ("2024-02-01",)
+
+
+def test_update_moving_rows_to_another_key(conn):
+    conn.execute("UPDATE Top_4_ASNs SET cc = 'ZZ' WHERE cc = 'NL'")
+    conn.execute("UPDATE ROA_MONTHLY SET ip_version = 5 WHERE country_code = 'DE' AND ip_version = 6 AND date = '2024-03-01'")
+    conn.execute("UPDATE Country_IPv6_Adoption SET source = 'other' WHERE cc = 'DE' AND date >= '2024-02-01'")
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT cc, date FROM Latest_Top_4_ASNs_Date ORDER BY cc").fetchall() == [
+        ("DE", "2024-03-01"), ("ZZ", "2024-03-01"),
+    ]
+
+
+def test_update_of_a_value_only(conn):
+    conn.execute("UPDATE Country_IPv6_Adoption SET percentage = -1 WHERE cc = 'NL' AND date = '2024-03-01'")
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT percentage FROM Latest_IPv6_Adoption WHERE cc = 'NL'").fetchall() == [(-1.0,), (-1.0,)]
+
+
+def test_delete_falls_back_to_the_previous_date(conn):
+    conn.execute("DELETE FROM Top_4_ASNs WHERE cc = 'NL' AND date = '2024-03-01' AND asn = '0'")
+    assert_snapshots_fresh(conn)  # three rows are left on that date
+
+    conn.execute("DELETE FROM Top_4_ASNs WHERE cc = 'NL' AND date = '2024-03-01'")
+    conn.execute("DELETE FROM ROA_MONTHLY WHERE country_code = 'DE'")
+    conn.execute("DELETE FROM Country_IPv6_Adoption WHERE cc = 'DE' AND source = 'apnic' AND date >= '2024-02-01'")
+    assert_snapshots_fresh(conn)
+    assert conn.execute("SELECT date FROM Latest_Top_4_ASNs_Date WHERE cc = 'NL'").fetchone() == ("2024-02-01",)
+
+
+def test_install_is_idempotent(conn):
+    assert install_latest_snapshots(conn) == []
+    assert sorted(install_latest_snapshots(conn, rebuild=True)) == sorted(table for table, *_ in SNAPSHOTS.values())
+    assert_snapshots_fresh(conn)
+
+
+def test_install_replaces_outdated_triggers(conn):
+    with conn:
+        conn.execute("DROP TRIGGER trg_top_4_asns_latest_update")
+        conn.execute('''
+            CREATE TRIGGER trg_top_4_asns_latest_update AFTER UPDATE ON Top_4_ASNs
+            BEGIN
+                SELECT 1;
+            END
+        ''')
+    conn.execute("UPDATE Top_4_ASNs SET date = '2000-01-01' WHERE cc = 'NL' AND date = '2024-03-01'")
+
+    # The snapshot missed that update, so it is rebuilt along with the trigger.
+    assert install_latest_snapshots(conn) == ["Latest_Top_4_ASNs_Date"]
+    assert_snapshots_fresh(conn)
+    conn.execute("UPDATE Top_4_ASNs SET date = '2000-01-01' WHERE cc = 'DE' AND date = '2024-03-01'")
+    assert_snapshots_fresh(conn)
@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks.synthetic import generate
+from ripencc_agent import db, payload
+from ripencc_agent.payload import query_page
+from ripencc_agent.sub_agents.ipv6.tools import ADOPTION_ROW_BYTES, get_country_ipv6_adoption_rate
+from ripencc_agent.sub_agents.rpki.tools import get_monthly_roa_coverage
+
+ROA_SQL = '''
+    SELECT date, percentage_space_covered_by_roa
+    FROM ROA_MONTHLY
+    WHERE country_code = ? AND ip_version = ? AND date >= ? AND date <= ?
+'''
+WINDOW = ("2023-01-01", "2025-12-31")
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("paging") / "insights.db")
+    generate(path, countries=2, years=3, sources=2, ipv6_interval_days=30)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(db, "DB_PATH", path)
+        yield path
+
+
+def all_pages(fetch) -> list:
+    pages, token = [], None
+    while True:
+        page = fetch(token)
+        pages.append(page)
+        token = page.get("next_page_token") if isinstance(page, dict) else page[1]
+        if token is None:
+            return pages
+
+
+def test_pages_cover_every_row_once(db_path):
+    params = ("AD", 4, *WINDOW)
+    arguments = {"country_code": "AD", "ip_family": "4"}
+    expected = db.query(ROA_SQL + " ORDER BY date", params)
+
+    pages = all_pages(lambda token: query_page(ROA_SQL, params, ["date"], lambda row: (row[0],), arguments, token, page_size=7))
+    assert [len(rows) for rows, _ in pages] == [7] * 5 + [1]
+    assert [row for rows, _ in pages for row in rows] == expected
+
+
+def test_page_size_must_be_positive(db_path):
+    with pytest.raises(ValueError):
+        query_page(ROA_SQL, ("AD", 4, *WINDOW), ["date"], lambda row: (row[0],), {}, page_size=0)
+
+
+def test_paged_roa_coverage_matches_the_whole_window(db_path):
+    whole = get_monthly_roa_coverage("AD", "4", *WINDOW)
+    assert whole["status"] == "success" and "downsampled" not in whole
+
+    pages = all_pages(lambda token: get_monthly_roa_coverage("AD", "4", *WINDOW, page_size=10, page_token=token))
+    assert all(page["status"] == "success" for page in pages)
+    assert [len(page["AD"]) for page in pages] == [10, 10, 10, 6]
+    assert {date: value for page in pages for date, value in page["AD"].items()} == whole["AD"]
+
+
+def test_paged_ipv6_adoption_goes_by_source_then_date(db_path):
+    whole = get_country_ipv6_adoption_rate("AE", start_date=WINDOW[0], end_date=WINDOW[1])
+    pages = all_pages(lambda token: get_country_ipv6_adoption_rate(
+        "AE", start_date=WINDOW[0], end_date=WINDOW[1], page_size=25, page_token=token,
+    ))
+
+    rows = [(row["source"], row["date"], row["percentage"]) for page in pages for row in page["data"]]
+    assert rows == sorted(rows)
+    assert sorted(rows) == sorted((row["source"], row["date"], row["percentage"]) for row in whole["data"])
+    assert all(len(page["data"]) == 25 for page in pages[:-1])
+
+
+def test_page_token_of_another_country_is_an_error(db_path):
+    first = get_monthly_roa_coverage("AD", "4", *WINDOW, page_size=10)
+    other = get_monthly_roa_coverage("AE", "4", *WINDOW, page_token=first["next_page_token"])
+    assert other["status"] == "error"
+    assert "different query" in other["error_message"]
+
+
+def test_full_pages_fit_the_byte_budget(db_path, monkeypatch):
+    monkeypatch.setattr(payload, "BYTE_BUDGET", 4096)
+    (total,) = db.query("SELECT COUNT(*) FROM Country_IPv6_Adoption WHERE cc = 'AE' AND date >= ? AND date <= ?", WINDOW)[0]
+
+    pages = all_pages(lambda token: get_country_ipv6_adoption_rate(
+        "AE", start_date=WINDOW[0], end_date=WINDOW[1], page_size=360, page_token=token,
+    ))
+    assert len(pages[0]["data"]) == payload.page_capacity(ADOPTION_ROW_BYTES) < 360
+    for page in pages:
+        assert "downsampled" not in page and "format" not in page
+        assert payload.payload_bytes(page) <= 4096
+    assert sum(len(page["data"]) for page in pages) == total
+
+    roa_pages = all_pages(lambda token: get_monthly_roa_coverage("AD", "4", *WINDOW, page_size=360, page_token=token))
+    assert all(payload.payload_bytes(page) <= 4096 for page in roa_pages)
+    assert sum(len(page["AD"]) for page in roa_pages) == 36
@@ -0,0 +1,121 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from ripencc_agent.payload import (
+    aggregate_sql, check_resolution, decode_page_token, encode_page_token, enforce_budget, fit_series, lttb_indices,
+    payload_bytes,
+)
+
+
+@pytest.mark.parametrize("count, n", [(1000, 50), (100, 3), (37, 10), (5, 4)])
+def test_lttb_keeps_endpoints_and_respects_max_points(count, n):
+    values = np.sin(np.linspace(0, 20, count)) * 50 + np.linspace(0, 30, count)
+    kept = lttb_indices(values, n)
+    assert len(kept) == n
+    assert kept[0] == 0 and kept[-1] == count - 1
+    assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    values = np.zeros(500)
+    values[321] = 100.0
+    assert 321 in lttb_indices(values, 20)
+
+
+def test_lttb_returns_short_series_whole():
+    assert lttb_indices(np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_fit_series_shares_total_points():
+    rng = np.random.default_rng(1)
+    series = {key: {"date": list(range(300)), "value": list(rng.random(300))} for key in "abc"}
+    fitted, before, after = fit_series(series, "value", total_points=90)
+
+    assert (before, after) == (900, 90)
+    for columns in fitted.values():
+        assert len(columns["date"]) == len(columns["value"]) == 30
+        assert columns["date"][0] == 0 and columns["date"][-1] == 299
+
+
+def test_fit_series_leaves_series_within_the_limits_alone():
+    series = {"a": {"value": [1.0, 2.0, 3.0]}}
+    assert fit_series(series, "value", max_points=10, total_points=10) == (series, 3, 3)
+
+
+def row_builder(series: dict) -> dict:
+    return {"status": "success", "rows": [
+        {"date": date, "value": value} for date, value in zip(series["NL"]["date"], series["NL"]["value"])
+    ]}
+
+
+def column_builder(series: dict) -> dict:
+    return {"status": "success", "columns": ["date", "value"], "NL": [series["NL"]["date"], series["NL"]["value"]]}
+
+
+def test_enforce_budget_notes_downsampling():
+    series = {"NL": {"date": list(range(1000)), "value": [float(i % 17) for i in range(1000)]}}
+    result = enforce_budget(series, "value", [row_builder], row_budget=100)
+
+    assert len(result["rows"]) == 100
+    assert result["downsampled"] == {"method": "lttb", "points": 1000, "returned": 100}
+
+
+def test_enforce_budget_falls_back_to_the_compact_format():
+    series = {"NL": {"date": [f"2024-01-{day:02d}" for day in range(1, 31)], "value": [1.5] * 30}}
+    rows = row_builder(series)
+    columns = column_builder(series)
+    assert payload_bytes(columns) < payload_bytes(rows)
+
+    result = enforce_budget(series, "value", [row_builder, column_builder], byte_budget=payload_bytes(columns))
+    assert result == columns
+
+
+def test_enforce_budget_downsamples_to_fit_the_byte_budget():
+    series = {"NL": {"date": [f"d{i}" for i in range(300)], "value": [float(i) for i in range(300)]}}
+    result = enforce_budget(series, "value", [row_builder, column_builder], byte_budget=1024)
+
+    assert payload_bytes(result) <= 1024
+    assert "columns" in result
+    assert result["downsampled"]["points"] == 300
+    assert result["downsampled"]["returned"] == len(result["NL"][1])
+
+
+@pytest.mark.parametrize("resolution, expected", [
+    ("monthly", [("NL", "2024-01", 1.5), ("NL", "2024-04", 6.0)]),
+    ("quarterly", [("NL", "2024-Q1", 1.5), ("NL", "2024-Q2", 6.0)]),
+    ("yearly", [("NL", "2024", 3.0)]),
+])
+def test_aggregate_sql(resolution, expected):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (cc TEXT, date TEXT, value REAL)")
+    conn.executemany("INSERT INTO t VALUES ('NL', ?, ?)", [("2024-01-01", 1.0), ("2024-01-15", 2.0), ("2024-04-01", 6.0)])
+    assert conn.execute(aggregate_sql("SELECT cc, date, value FROM t", ["cc"], "value", resolution)).fetchall() == expected
+
+
+def test_unknown_resolution_is_rejected():
+    check_resolution(None)
+    with pytest.raises(ValueError, match="Unknown resolution 'weekly'"):
+        check_resolution("weekly")
+
+
+def test_page_token_round_trips():
+    arguments = {"country_code": "NL", "ip_family": "4"}
+    token = encode_page_token(arguments, ("2024-05-01",))
+    assert "=" not in token
+    assert decode_page_token(token, dict(reversed(arguments.items())), 1) == ("2024-05-01",)
+
+
+@pytest.mark.parametrize("token", ["not a token", "eyJmb28iOiAxfQ", "W10"])
+def test_malformed_page_token_is_rejected(token):
+    with pytest.raises(ValueError, match="Invalid `page_token`"):
+        decode_page_token(token, {"country_code": "NL"}, 1)
+
+
+def test_page_token_of_another_query_is_rejected():
+    token = encode_page_token({"country_code": "NL"}, ("2024-05-01",))
+    with pytest.raises(ValueError, match="different query"):
+        decode_page_token(token, {"country_code": "DE"}, 1)
+    with pytest.raises(ValueError, match="different query"):
+        decode_page_token(token, {"country_code": "NL"}, 2)
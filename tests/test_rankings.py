@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.synthetic import generate
+from ripencc_agent import db, rankings
+from ripencc_agent.rankings import Partition, RankingIndex, leaderboard
+
+
+@pytest.fixture(scope="module")
+def synthetic_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("rankings") / "insights.db")
+    generate(path, countries=6, years=2, sources=2, ipv6_interval_days=30)
+    return path
+
+
+@pytest.fixture
+def index(synthetic_db, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", synthetic_db)
+    index = RankingIndex()
+    monkeypatch.setattr(rankings, "ranking_index", index)
+    return index
+
+
+def test_leaderboard_matches_sorted_sql(index):
+    (latest,) = db.query("SELECT MAX(date) FROM ROA_MONTHLY WHERE ip_version = 4")[0]
+    expected = db.query('''
+        SELECT country_code, percentage_space_covered_by_roa FROM ROA_MONTHLY
+        WHERE ip_version = 4 AND date = ?
+        ORDER BY percentage_space_covered_by_roa DESC, country_code
+    ''', (latest,))
+
+    top = leaderboard("roa_coverage", "4", limit=3)
+    assert (top["order"], top["countries"], top["date"]) == ("top", 6, latest)
+    assert [(entry["country_code"], entry["value"]) for entry in top["data"]] == [tuple(row) for row in expected[:3]]
+
+    bottom = leaderboard("roa_coverage", "4", limit=2, order="bottom", country_code=expected[1][0])
+    assert [entry["country_code"] for entry in bottom["data"]] == [expected[-1][0], expected[-2][0]]
+    assert bottom["country"]["rank"] == 2
+    assert leaderboard("roa_coverage", "4", country_code="ZZ")["country"] is None
+
+
+def test_requested_month_resolves_to_its_latest_date(index):
+    assert leaderboard("roa_coverage", "6", date="2024-07", limit=1)["date"] == "2024-07-01"
+    assert leaderboard("roa_coverage", "6", date="2024-07-15", limit=1)["date"] == "2024-07-01"
+
+
+def test_latest_ipv6_ranking_carries_each_countrys_date(index):
+    result = leaderboard("ipv6_adoption", "google", limit=100)
+    expected = db.query("SELECT cc, date FROM Latest_IPv6_Adoption WHERE source = 'google'")
+    assert "date" not in result
+    assert sorted((entry["country_code"], entry["date"]) for entry in result["data"]) == sorted(map(tuple, expected))
+
+
+def test_partitions_are_reused_across_db_versions_when_unchanged(index, synthetic_db):
+    leaderboard("roa_coverage", "4")
+    leaderboard("roa_coverage", "4")
+    assert (index.builds, index.revalidations) == (1, 0)
+
+    stat = os.stat(synthetic_db)
+    os.utime(synthetic_db, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    leaderboard("roa_coverage", "4")
+    assert index.stats() == {
+        "partitions": 1,
+        "max_partitions": index.max_partitions,
+        "builds": 1,
+        "revalidations": 1,
+        "reuses": 1,
+    }
+
+
+def test_a_slow_query_does_not_block_other_lookups(index, monkeypatch):
+    warm = index.partition("roa_coverage", "4", index.resolve_date("roa_coverage", "4", None))
+    started, release = threading.Event(), threading.Event()
+
+    def slow_query(sql, params=(), **kwargs):
+        if "Country_IPv6_Adoption" in sql:
+            started.set()
+            release.wait(10)
+        return db.query(sql, params, **kwargs)
+
+    monkeypatch.setattr(rankings, "query", slow_query)
+    slow = threading.Thread(target=index.resolve_date, args=("ipv6_adoption", "google", "2024"))
+    slow.start()
+    try:
+        assert started.wait(10)
+        found = []
+        reader = threading.Thread(target=lambda: found.append(
+            index.partition("roa_coverage", "4", index.resolve_date("roa_coverage", "4", None))
+        ))
+        reader.start()
+        reader.join(2)
+        assert found == [warm]
+    finally:
+        release.set()
+        slow.join()
+    assert index.resolve_date("ipv6_adoption", "google", "2024") is not None
+
+
+def test_ties_share_the_better_rank():
+    partition = Partition((), (), [("AA", 5.0), ("BB", 7.0), ("CC", 5.0), ("DD", 1.0)])
+    assert [partition.entry(i)["rank"] for i in range(4)] == [1, 2, 2, 4]
+    assert partition.codes == ["BB", "AA", "CC", "DD"]
+
+
+@pytest.mark.parametrize("arguments", [{"order": "middle"}, {"limit": 0}, {"limit": 101}, {"date": "1990-01"}])
+def test_bad_arguments_are_rejected(index, arguments):
+    with pytest.raises(ValueError):
+        leaderboard("roa_coverage", "4", **arguments)
@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+from typing import AsyncGenerator
+
+import pytest
+from google.adk import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from pydantic import Field
+
+from ripencc_agent import router
+from ripencc_agent.router import RoutingStats, classify, record_root_model_latency, route_before_model
+
+
+@pytest.mark.parametrize("text, agent_name, confidence", [
+    ("What is the ROA coverage in Japan?", "rpki_agent", 1.0),
+    ("How has RPKI improved in France?", "rpki_agent", 1.0),
+    ("Top 4 ISPs in Germany", "market_agent", 1.0),
+    ("How competitive is the ISP market in the UK?", "market_agent", 1.0),
+    ("IPv6 adoption from Google in Brazil", "ipv6_agent", 1.0),
+    ("What is the IPv6 ROA coverage for Brazil?", "rpki_agent", 0.6),
+    # Exactly at MIN_CONFIDENCE: (8 - 4) / 8.
+    ("RPKI versus ASN market share", "market_agent", 0.5),
+    # Confident but below MIN_SCORE.
+    ("ipv6 in Japan", None, 1.0),
+    # Tied.
+    ("ROA coverage vs ASN concentration", None, 0.0),
+    ("Hello there", None, 0.0),
+])
+def test_classify(text, agent_name, confidence):
+    assert classify(text)[:2] == (agent_name, confidence)
+
+
+def test_classify_scores_every_route():
+    _, _, scores = classify("top four ASNs by subscribers")
+    assert scores["market_agent"] == 3 + 2 + 1
+    assert scores["rpki_agent"] == scores["ipv6_agent"] == 0
+
+
+def test_thresholds_are_read_at_call_time(monkeypatch):
+    monkeypatch.setattr(router, "MIN_SCORE", 2)
+    assert classify("ipv6 in Japan")[0] == "ipv6_agent"
+    monkeypatch.setattr(router, "MIN_CONFIDENCE", 0.7)
+    assert classify("What is the IPv6 ROA coverage for Brazil?")[0] is None
+
+
+def user_request(*parts: types.Part) -> LlmRequest:
+    return LlmRequest(contents=[types.Content(role="user", parts=list(parts))])
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = RoutingStats()
+    monkeypatch.setattr(router, "routing_stats", stats)
+    return stats
+
+
+def test_confident_route_answers_with_a_transfer(stats):
+    context = SimpleNamespace(state={})
+    response = route_before_model(context, user_request(types.Part(text="Top 4 ISPs in Germany")))
+
+    call = response.content.parts[0].function_call
+    assert (response.content.role, call.name, call.args) == ("model", "transfer_to_agent", {"agent_name": "market_agent"})
+    assert context.state["routing_decision"]["agent"] == "market_agent"
+    assert router._FALLBACK_STARTED not in context.state
+    assert stats.snapshot()["routed"] == {"market_agent": 1}
+
+
+def test_fallback_times_the_model_call(stats):
+    context = SimpleNamespace(state={})
+    assert route_before_model(context, user_request(types.Part(text="Hello there"))) is None
+    decision = context.state["routing_decision"]
+    assert (decision["agent"], decision["confidence"]) == ("llm", 0.0)
+    assert decision["scores"] == dict.fromkeys(router.ROUTES, 0)
+    assert context.state[router._FALLBACK_STARTED] is not None
+
+    # Partial (streamed) responses do not end the call.
+    record_root_model_latency(context, LlmResponse(partial=True))
+    assert stats.fallback_model_calls == 0
+    record_root_model_latency(context, LlmResponse())
+    assert context.state[router._FALLBACK_STARTED] is None
+    record_root_model_latency(context, LlmResponse())
+
+    snapshot = stats.snapshot()
+    assert (snapshot["fallbacks"], snapshot["routed_ratio"]) == (1, 0.0)
+    assert stats.fallback_model_calls == 1
+    assert snapshot["estimated_saved_ms"] == 0
+
+
+def test_tool_results_and_disabled_router_are_left_to_the_model(stats, monkeypatch):
+    context = SimpleNamespace(state={})
+    result = types.Part(function_response=types.FunctionResponse(name="get_roa", response={"status": "success"}))
+    assert route_before_model(context, user_request(result)) is None
+    assert route_before_model(context, LlmRequest(contents=[])) is None
+
+    monkeypatch.setattr(router, "PREROUTER_ENABLED", False)
+    assert route_before_model(context, user_request(types.Part(text="Top 4 ISPs in Germany"))) is None
+    assert context.state == {}
+    assert stats.snapshot()["routed"] == {} and stats.fallbacks == 0
+
+
+class StubModel(BaseLlm):
+    '''
+    Answers every call with the name of the agent that made it, and counts the calls per agent.
+    '''
+
+    model: str = "stub"
+    calls: dict = Field(default_factory=dict)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        agent_name = (llm_request.config.labels or {}).get("adk_agent_name")
+        self.calls[agent_name] = self.calls.get(agent_name, 0) + 1
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"answered by {agent_name}")]))
+
+
+def run_turn(text: str, model: StubModel) -> list:
+    root = Agent(
+        name="ripencc_agent",
+        model=model,
+        sub_agents=[Agent(name=name, model=model) for name in router.ROUTES],
+        before_model_callback=route_before_model,
+        after_model_callback=record_root_model_latency,
+    )
+    runner = InMemoryRunner(agent=root, app_name="router_test")
+
+    async def turn():
+        session = await runner.session_service.create_session(app_name="router_test", user_id="user")
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        return [event async for event in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+    return asyncio.run(turn())
+
+
+def test_runner_skips_the_root_model_call(stats):
+    model = StubModel()
+    events = run_turn("What is the ROA coverage in Japan?", model)
+
+    assert model.calls == {"rpki_agent": 1}
+    assert events[0].author == "ripencc_agent"
+    assert events[0].get_function_calls()[0].args == {"agent_name": "rpki_agent"}
+    assert events[-1].author == "rpki_agent"
+    assert events[-1].content.parts[0].text == "answered by rpki_agent"
+
+
+def test_runner_falls_back_to_the_root_model(stats):
+    model = StubModel()
+    events = run_turn("Hello there", model)
+
+    assert model.calls == {"ripencc_agent": 1}
+    assert events[-1].content.parts[0].text == "answered by ripencc_agent"
+    assert stats.fallback_model_calls == 1
@@ -0,0 +1,86 @@
+import asyncio
+import gc
+import os
+import signal
+import zlib
+from typing import AsyncGenerator
+
+import pytest
+from google.adk import Agent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+from ripencc_agent import instrumentation, serve
+from ripencc_agent.serve import WorkerPool
+
+
+def test_sessions_are_pinned_by_crc32():
+    pool = WorkerPool(agent=None, size=4)
+    for session_id in ["a", "session-1", "0f8e7c2a-91b4-4c36-a8d5-5b1d2f8f0c1e"]:
+        assert pool.worker_index(session_id) == zlib.crc32(session_id.encode()) % 4
+        assert pool.worker_index(session_id) == pool.worker_index(session_id)
+    assert {pool.worker_index(f"session-{i}") for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_pool_needs_a_worker():
+    with pytest.raises(ValueError):
+        WorkerPool(agent=None, size=0)
+
+
+class PidModel(BaseLlm):
+    '''
+    Answers with the pid of the process it runs in and of its parent.
+    '''
+
+    model: str = "pid"
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"pid {os.getpid()} parent {os.getppid()}")]))
+
+
+async def wait_for(condition, timeout: float = 30):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_workers_are_forked_and_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_PATH", str(tmp_path / "metrics.prom"))
+    monkeypatch.setattr(instrumentation, "TRACE_PATH", "")
+    pool = WorkerPool(Agent(name="pid_agent", model=PidModel()), size=2)
+    serve.prepare_for_fork()
+    try:
+        pool.fork_all()
+    finally:
+        gc.unfreeze()
+
+    async def scenario():
+        await pool.start()
+        try:
+            first = await pool.run_turn("user", "session-1", "Which process?")
+            index = pool.worker_index("session-1")
+            worker = pool.workers[index]
+            assert (first["worker"], first["error"]) == (index, None)
+            assert first["reply"] == f"pid {worker.pid} parent {pool.template_pid}"
+            assert pool.template_pid not in (None, os.getpid())
+
+            os.kill(worker.pid, signal.SIGKILL)
+            await wait_for(lambda: pool.restarts == 1 and pool.workers[index] is not worker)
+            replacement = pool.workers[index]
+            await asyncio.wait_for(asyncio.shield(replacement.ready), 30)
+            await wait_for(lambda: replacement.pid is not None)
+
+            again = await pool.run_turn("user", "session-1", "Which process now?")
+            assert again["worker"] == index
+            # The replacement is forked by the same template, not by the master.
+            assert again["reply"] == f"pid {replacement.pid} parent {pool.template_pid}" != first["reply"]
+            assert [info["ready"] for info in pool.info()] == [True, True]
+        finally:
+            await pool.stop(timeout=10)
+
+    asyncio.run(scenario())
+    # Each worker flushes its own metrics file on the way out.
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metrics.worker0.prom", "metrics.worker1.prom"]
@@ -0,0 +1,107 @@
+import asyncio
+import inspect
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ripencc_agent import cache
+from ripencc_agent.cache import SESSION_MEMO_PREFIX, session_memoized
+
+
+@pytest.fixture
+def version(monkeypatch):
+    version = [(1, 1, 1)]
+    monkeypatch.setattr(cache, "data_version", lambda: version[0])
+    return version
+
+
+def memoized_tool(calls: list):
+    @session_memoized
+    async def get_value(country_code: str, size: int = 10) -> dict:
+        '''A value for a country.'''
+        calls.append(country_code)
+        return {"status": "success", "country_code": country_code, "data": "x" * size}
+
+    return get_value
+
+
+def call(tool, *args, state: dict, **kwargs) -> dict:
+    return asyncio.run(tool(*args, tool_context=SimpleNamespace(state=state), **kwargs))
+
+
+def memo_entries(state: dict) -> list:
+    return [value for key, value in state.items() if key.startswith(f"{SESSION_MEMO_PREFIX}:") and value]
+
+
+def test_signature_gains_the_tool_context():
+    tool = memoized_tool([])
+    assert tool.__name__ == "get_value" and tool.__doc__ == "A value for a country."
+    assert list(inspect.signature(tool).parameters) == ["country_code", "size", "tool_context"]
+
+
+def test_results_are_reused_within_a_session_only(version):
+    calls = []
+    tool = memoized_tool(calls)
+    state = {}
+
+    first = call(tool, "nl", state=state)
+    assert call(tool, "NL ", state=state) == first
+    assert calls == ["nl"]
+
+    call(tool, "NL", state={})
+    assert calls == ["nl", "NL"]
+
+
+def test_entries_expire_with_the_db_version_and_ttl(version, monkeypatch):
+    calls = []
+    tool = memoized_tool(calls)
+    state = {}
+
+    call(tool, "NL", state=state)
+    version[0] = (2, 1, 1)
+    call(tool, "NL", state=state)
+    call(tool, "NL", state=state)
+    assert calls == ["NL", "NL"]
+
+    monkeypatch.setattr(cache, "SESSION_MEMO_TTL_SECONDS", 0)
+    call(tool, "NL", state=state)
+    assert calls == ["NL", "NL", "NL"]
+
+
+def test_memo_stays_within_its_caps(version, monkeypatch):
+    monkeypatch.setattr(cache, "SESSION_MEMO_MAX_ENTRIES", 3)
+    monkeypatch.setattr(cache, "SESSION_MEMO_MAX_BYTES", 4096)
+    calls = []
+    tool = memoized_tool(calls)
+    state = {}
+    for code in ["NL", "DE", "FR", "BE", "NL"]:
+        call(tool, code, size=200, state=state)
+
+    assert calls == ["NL", "DE", "FR", "BE", "NL"]  # NL was evicted before it was asked again
+    entries = memo_entries(state)
+    assert len(entries) == 3
+    assert sum(len(json.dumps(entry, separators=(",", ":"))) for entry in entries) <= 4096
+    assert sorted(key for key in state if key.startswith(f"{SESSION_MEMO_PREFIX}:")) == [
+        f"{SESSION_MEMO_PREFIX}:0", f"{SESSION_MEMO_PREFIX}:1", f"{SESSION_MEMO_PREFIX}:2",
+    ]
+
+    # Results too large for the memo are not stored.
+    call(tool, "IT", size=2000, state=state)
+    call(tool, "IT", size=2000, state=state)
+    assert calls[-2:] == ["IT", "IT"]
+
+
+def test_errors_are_not_memoized(version):
+    calls = []
+
+    @session_memoized
+    async def get_value(country_code: str) -> dict:
+        calls.append(country_code)
+        return {"status": "error", "error_message": "no data"}
+
+    state = {}
+    call(get_value, "NL", state=state)
+    call(get_value, "NL", state=state)
+    assert calls == ["NL", "NL"]
+    assert memo_entries(state) == []
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+from benchmarks.synthetic import generate
+from ripencc_agent import db, snapshot
+from ripencc_agent.snapshot import TABLES, Snapshot, build_snapshot
+from ripencc_agent.sub_agents.ipv6.tools import get_country_ipv6_adoption_rate
+from ripencc_agent.sub_agents.market.tools import get_country_asn_hhi, get_top_four_asns
+from ripencc_agent.sub_agents.rpki.tools import get_monthly_roa_coverage
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("snapshot") / "insights.db")
+    generate(path, countries=3, years=2, sources=2, ipv6_interval_days=30)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(db, "DB_PATH", path)
+        monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", None)
+        yield path
+
+
+@pytest.fixture(scope="module")
+def mapped(db_path) -> Snapshot:
+    stats = build_snapshot(db_path)
+    assert stats["bytes"] > 0
+    return Snapshot(snapshot.snapshot_path(db_path))
+
+
+@pytest.fixture(scope="module")
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("table", sorted(TABLES))
+def test_select_matches_sqlite(mapped, conn, table):
+    columns, order = TABLES[table]
+    names = tuple(column for column, _ in columns)
+    codes = [row[0] for row in conn.execute(f"SELECT DISTINCT {names[0]} FROM {table}")]
+    assert len(codes) > 1
+    for code in codes:
+        expected = conn.execute(f"SELECT {', '.join(names)} FROM {table} WHERE {names[0]} = ? ORDER BY {order}", (code,)).fetchall()
+        assert mapped.tables[table].select(code, names) == expected
+
+
+def test_select_filters_like_sqlite(mapped, conn):
+    rows = mapped.tables["ROA_MONTHLY"].select("AE", ("date", "percentage_space_covered_by_roa"), {"ip_version": 6}, "2024-03-01", "2024-08-31")
+    assert len(rows) == 6
+    assert rows == conn.execute('''
+        SELECT date, percentage_space_covered_by_roa FROM ROA_MONTHLY
+        WHERE country_code = 'AE' AND ip_version = 6 AND date BETWEEN '2024-03-01' AND '2024-08-31'
+        ORDER BY date
+    ''').fetchall()
+
+
+def test_latest_matches_sqlite(mapped, conn):
+    rows = mapped.tables["Country_IPv6_Adoption"].latest("AD", ("source", "date", "percentage"), group="source")
+    assert sorted(rows) == sorted(conn.execute('''
+        SELECT source, date, percentage FROM Latest_IPv6_Adoption WHERE cc = 'AD'
+    ''').fetchall())
+    top = mapped.tables["Top_4_ASNs"].latest("AD", ("date", "asn"))
+    assert top == conn.execute('''
+        SELECT date, asn FROM Top_4_ASNs
+        WHERE cc = 'AD' AND date = (SELECT MAX(date) FROM Top_4_ASNs WHERE cc = 'AD')
+        ORDER BY subs DESC
+    ''').fetchall()
+
+
+def test_unknown_keys_return_nothing(mapped):
+    assert mapped.tables["ROA_MONTHLY"].select("ZZ", ("date",)) == []
+    assert mapped.tables["ROA_MONTHLY"].select("AD", ("date",), {"ip_version": "x"}) == []
+
+
+def test_snapshot_records_the_db_version(mapped, db_path):
+    assert mapped.source == db.data_version(db_path)
+
+
+def tool_answers() -> list:
+    # Past the result cache, so both reads really run.
+    return [
+        get_monthly_roa_coverage.__wrapped__("AE", "6", "2024-01-01", "2024-12-31"),
+        get_country_ipv6_adoption_rate.__wrapped__("AD"),
+        get_top_four_asns.__wrapped__("AE"),
+        get_country_asn_hhi.__wrapped__("AE"),
+    ]
+
+
+def test_tools_answer_the_same_from_the_snapshot(mapped, monkeypatch):
+    assert snapshot.get_snapshot() is not None
+    from_snapshot = tool_answers()
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    assert snapshot.get_snapshot() is None
+    assert from_snapshot == tool_answers()
+    assert all(answer["status"] == "success" for answer in from_snapshot)
+    assert len(from_snapshot[2]["data"]) == 4
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate
+from ripencc_agent import db, payload
+from ripencc_agent.sub_agents.ipv6.tools import get_ipv6_adoption_trend
+from ripencc_agent.sub_agents.rpki.tools import get_roa_coverage_trend
+from ripencc_agent.timeseries import SeriesTable, summarize, trailing_moving_average
+
+# Two monthly ROA series (NL/4 rising by one point a month, NL/6 flat) and one IPv6 series.
+DATES = [f"{year}-{month:02d}-01" for year in (2023, 2024) for month in range(1, 13)]
+ROWS = (
+    [("NL", "4", date, 40.0 + i) for i, date in enumerate(DATES)]
+    + [("NL", "6", date, 10.0) for date in DATES]
+    + [("SE", "4", "2024-06-01", 70.0)]
+)
+
+
+@pytest.fixture
+def table():
+    return SeriesTable(ROWS)
+
+
+def test_series_are_indexed_by_key(table):
+    assert table.index == {("NL", "4"): (0, 24), ("NL", "6"): (24, 48), ("SE", "4"): (48, 49)}
+    assert table.keys("NL") == [("NL", "4"), ("NL", "6")]
+    assert table.window(("NL", "4"), "2024-01-01", "2024-03-31") == (12, 15)
+    assert table.window(("NL", "4"), None, None) == (0, 24)
+
+
+def test_summary_matches_the_raw_series(table):
+    values = np.array([40.0 + i for i in range(12, 24)])
+    summary = summarize(table, ("NL", "4"), "2024-01-01", "2024-12-31")
+
+    assert summary["points"] == 12
+    assert summary["start"] == {"date": "2024-01-01", "value": 52.0}
+    assert summary["end"] == {"date": "2024-12-01", "value": 63.0}
+    assert summary["change"] == 11.0
+    assert summary["min"]["date"] == "2024-01-01" and summary["max"]["date"] == "2024-12-01"
+    assert summary["mean"] == pytest.approx(values.mean())
+    # The trailing 3 months (91.3 days) reach back to September 1st.
+    assert summary["moving_average"]["latest"] == pytest.approx(values[-4:].mean())
+    # One point a month is about twelve points a year.
+    assert summary["slope_per_year"] == pytest.approx(12.0, rel=0.01)
+    assert summary["yoy_change"] is None  # the window is shorter than a year
+
+    whole = summarize(table, ("NL", "4"))
+    assert whole["yoy_change"] == {
+        "from": {"date": "2023-12-01", "value": 51.0},
+        "to": {"date": "2024-12-01", "value": 63.0},
+        "delta": 12.0,
+    }
+    years = (np.datetime64("2024-12-01") - np.datetime64("2023-01-01")).astype(int) / 365.25
+    assert whole["cagr_pct"] == pytest.approx(((63 / 40) ** (1 / years) - 1) * 100, abs=1e-3)
+
+
+def test_flat_and_single_point_series(table):
+    flat = summarize(table, ("NL", "6"))
+    assert (flat["change"], flat["slope_per_year"], flat["cagr_pct"]) == (0.0, 0.0, 0.0)
+
+    single = summarize(table, ("SE", "4"))
+    assert single["points"] == 1
+    assert single["slope_per_year"] is None and single["cagr_pct"] is None
+
+
+def test_empty_window_has_no_summary(table):
+    assert summarize(table, ("NL", "4"), "1990-01-01", "1990-12-31") is None
+
+
+def test_series_is_only_included_on_request(table):
+    assert "series" not in summarize(table, ("NL", "4"))
+    series = summarize(table, ("NL", "4"), "2024-10-01", None, window_months=2, include_series=True)["series"]
+    assert series == {
+        "date": ["2024-10-01", "2024-11-01", "2024-12-01"],
+        "value": [61.0, 62.0, 63.0],
+        "moving_average": [61.0, 61.5, 62.5],
+    }
+
+
+def test_trailing_moving_average_on_irregular_days():
+    days = np.array([0, 1, 2, 10, 11])
+    values = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    assert trailing_moving_average(days, values, 2).tolist() == [1.0, 1.5, 2.5, 4.0, 4.5]
+
+
+@pytest.fixture
+def daily_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "insights.db")
+    generate(path, countries=2, years=4, sources=3, ipv6_interval_days=1)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(payload, "ROW_BUDGET", 60)
+
+
+def test_trend_series_are_downsampled_to_the_row_budget(daily_db):
+    result = get_ipv6_adoption_trend("AD", include_series=True)
+    trends = result["trends"]
+    assert len(trends) == 3
+    assert result["downsampled"]["points"] == sum(trend["points"] for trend in trends.values())
+    assert result["downsampled"]["returned"] <= 60
+    for trend in trends.values():
+        series = trend["series"]
+        assert len(series["date"]) == len(series["value"]) == len(series["moving_average"]) <= 20
+        # LTTB keeps the endpoints of every series.
+        assert (series["date"][0], series["value"][0]) == (trend["start"]["date"], trend["start"]["value"])
+        assert (series["date"][-1], series["value"][-1]) == (trend["end"]["date"], trend["end"]["value"])
+
+    assert "downsampled" not in get_ipv6_adoption_trend("AD")
+
+
+def test_short_trend_series_are_returned_whole(daily_db):
+    result = get_roa_coverage_trend("AD", "4", start_date="2024-01-01", end_date="2024-12-31", include_series=True)
+    assert "downsampled" not in result
+    assert len(result["trend"]["series"]["date"]) == result["trend"]["points"] == 12